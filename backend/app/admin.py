@@ -1,15 +1,21 @@
-from typing import Any
+from typing import Any, Optional
 import logging
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import PlainTextResponse
 from sqlalchemy import func
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
 
-from .auth import get_current_user
+from .auth import get_current_user, require_role
 from .database import get_db
 from .models import User, Region, AlertHistory, FloodPrediction
-from .schemas import RegionSummary, DashboardStats
+from .schemas import RegionSummary, DashboardStats, StateRiskSummary
+from .services.geometry_cache import map_cache
+from .services.json_fragments import join_array, region_fragments
+from .services.state_rollup import state_rollups
+from .profiler import PROFILE_SCOPE, ProfilerBusy, profile_for, stored_profile
+from .utils import accepts_encoding
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -25,29 +31,46 @@ def list_regions(
     List all regions with their latest risk predictions.
     
     Returns up to 200 regions (default) with their most recent flood prediction data.
+    A row is cached as JSON per (region, latest prediction) and reused until either changes.
     """
     try:
         if limit > 500:
             limit = 500  # Cap at 500
-        regions = db.query(Region).limit(limit).all()
-        items: list[RegionSummary] = []
-        for r in regions:
-            latest = (
-                db.query(FloodPrediction)
-                .filter(FloodPrediction.region_id == r.id)
-                .order_by(FloodPrediction.created_at.desc())
-                .first()
-            )
-            items.append(
-                RegionSummary(
-                    id=r.id,
-                    name=r.name,
-                    state=r.state,
-                    latest_risk_level=latest.risk_level if latest else None,
-                    latest_risk_score=latest.risk_score if latest else None,
-                )
-            )
-        return items
+        latest = (
+            db.query(FloodPrediction.region_id, func.max(FloodPrediction.id).label("latest_id"))
+            .group_by(FloodPrediction.region_id)
+            .subquery()
+        )
+        keys = [
+            (region_id, latest_id)
+            for region_id, latest_id in db.query(Region.id, latest.c.latest_id)
+            .outerjoin(latest, latest.c.region_id == Region.id)
+            .order_by(Region.id)
+            .limit(limit)
+        ]
+        fragments = region_fragments.get_many(keys)
+        missing = [key for key in keys if key not in fragments]
+        if missing:
+            regions = {
+                r.id: r for r in db.query(Region.id, Region.name, Region.state).filter(Region.id.in_([k[0] for k in missing]))
+            }
+            prediction_ids = [k[1] for k in missing if k[1] is not None]
+            predictions = {
+                p.id: p for p in db.query(FloodPrediction.id, FloodPrediction.risk_level, FloodPrediction.risk_score)
+                .filter(FloodPrediction.id.in_(prediction_ids))
+            } if prediction_ids else {}
+            for key in missing:
+                region, prediction = regions.get(key[0]), predictions.get(key[1])
+                if region is None:
+                    continue
+                fragments[key] = region_fragments.put(key, RegionSummary(
+                    id=region.id,
+                    name=region.name,
+                    state=region.state,
+                    latest_risk_level=prediction.risk_level if prediction else None,
+                    latest_risk_score=prediction.risk_score if prediction else None,
+                ).model_dump())
+        return Response(content=join_array(fragments[k] for k in keys if k in fragments), media_type="application/json")
     except SQLAlchemyError as e:
         logger.error("Database error listing regions: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail="Failed to fetch regions")
@@ -90,5 +113,94 @@ def basic_stats(
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
+@router.get("/states", response_model=list[StateRiskSummary])
+def state_summaries(
+    db: Session = Depends(get_db),
+    current_user: Any = Depends(get_current_user),
+):
+    """
+    Risk rollup per state: regions by risk level, population at high/critical risk and max score.
+    
+    Served from incrementally maintained in-memory rollups.
+    """
+    if not state_rollups.loaded:
+        try:
+            state_rollups.load(db)
+        except SQLAlchemyError as e:
+            logger.error("Database error loading state rollups: %s", e, exc_info=True)
+            raise HTTPException(status_code=500, detail="Failed to fetch state summaries")
+    return Response(content=state_rollups.render(), media_type="application/json")
 
 
+@router.get("/map")
+def risk_map(
+    request: Request,
+    zoom: int = Query(default=5, ge=0, le=22),
+    bbox: Optional[str] = Query(default=None, description="minLon,minLat,maxLon,maxLat"),
+    db: Session = Depends(get_db),
+    current_user: Any = Depends(get_current_user),
+):
+    """
+    Region risk map as a GeoJSON FeatureCollection.
+    
+    Geometry is simplified for the zoom level and limited to regions whose
+    bounding box intersects the viewport. Responses are served from a
+    pre-serialized (and pre-gzipped) cache until geometry or risk changes.
+    """
+    viewport = None
+    if bbox:
+        try:
+            viewport = tuple(float(v) for v in bbox.split(","))
+        except ValueError:
+            viewport = ()
+        if len(viewport) != 4 or viewport[0] > viewport[2] or viewport[1] > viewport[3]:
+            raise HTTPException(status_code=400, detail="bbox must be minLon,minLat,maxLon,maxLat")
+    try:
+        body, body_gzip = map_cache.render(db, zoom, viewport)
+    except SQLAlchemyError as e:
+        logger.error("Database error building risk map: %s", e, exc_info=True)
+        raise HTTPException(status_code=500, detail="Failed to build risk map")
+    headers = {"Vary": "Accept-Encoding"}
+    if accepts_encoding(request, "gzip"):
+        headers["Content-Encoding"] = "gzip"
+        return Response(content=body_gzip, media_type="application/geo+json", headers=headers)
+    return Response(content=body, media_type="application/geo+json", headers=headers)
+
+
+@router.get("/debug/profile", response_class=PlainTextResponse)
+def debug_profile(
+    seconds: float = Query(default=10, gt=0, le=60),
+    interval_ms: float = Query(default=5, ge=1, le=100),
+    include_idle: bool = False,
+    current_user: Any = Depends(require_role("authority")),
+):
+    """
+    Sample every thread of this worker for `seconds` and return collapsed stacks.
+    
+    Output is flamegraph-ready (flamegraph.pl, speedscope, inferno). Only one
+    profile runs at a time per worker.
+    """
+    try:
+        profiler = profile_for(seconds, interval_ms / 1000, include_idle)
+    except ProfilerBusy:
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    logger.info("Profile by %s: %.1fs, %d samples", current_user.get("phone_number"), seconds, profiler.samples)
+    return PlainTextResponse(
+        profiler.collapsed(), headers={"X-Profile-Samples": str(profiler.samples), "X-Profile-Scope": PROFILE_SCOPE}
+    )
+
+
+@router.get("/debug/profile/{profile_id}", response_class=PlainTextResponse)
+def debug_request_profile(
+    profile_id: str,
+    current_user: Any = Depends(require_role("authority")),
+):
+    """
+    Collapsed stacks recorded while a request sent with the X-Profile header
+    was in flight. Every thread of the worker is sampled, not only the one
+    serving that request.
+    """
+    collapsed = stored_profile(profile_id)
+    if collapsed is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return PlainTextResponse(collapsed, headers={"X-Profile-Scope": PROFILE_SCOPE})
@@ -0,0 +1,208 @@
+"""
+Priority-aware admission control.
+
+Requests are classified by path into alerts > auth > dashboard > public >
+exports. Only authority alert creation is in the alerts class; citizen
+confirmations count as public, and export streams, which hold their slot
+until the last byte, get a small class of their own.
+Each class has its own concurrency limit and a bounded wait queue, and all
+classes share a global limit sized to the worker threadpool. When a slot
+frees up it goes to the highest-priority waiter, so a flood of public reads
+cannot starve authority alert writes. A request whose class queue is full,
+or that waits past its class timeout, is rejected with 503 and Retry-After
+before it reaches a route handler or the DB pool.
+
+Limits are configured as class=concurrency:queue:timeout_seconds, e.g.
+ADMISSION_LIMITS="public=16:32:1,auth=8:32:2".
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+
+from .metrics import ADMISSION_IN_FLIGHT, ADMISSION_QUEUE_DEPTH, ADMISSION_SHED, ADMISSION_WAIT_SECONDS
+
+logger = logging.getLogger(__name__)
+
+ADMISSION_ENABLED = os.getenv('ADMISSION_ENABLED', 'true').lower() == 'true'
+# Matches the default AnyIO threadpool that runs sync endpoints
+ADMISSION_MAX_CONCURRENCY = int(os.getenv('ADMISSION_MAX_CONCURRENCY', '40'))
+
+# Highest priority first
+CLASSES = ('alerts', 'auth', 'dashboard', 'public', 'exports')
+
+# class -> (concurrency, queue size, queue timeout seconds, Retry-After seconds)
+DEFAULT_LIMITS: Dict[str, Tuple[int, int, float, int]] = {
+    'alerts': (40, 200, 10.0, 1),
+    'auth': (16, 64, 3.0, 2),
+    'dashboard': (16, 32, 3.0, 2),
+    'public': (24, 48, 1.0, 5),
+    'exports': (4, 8, 2.0, 30),
+}
+
+# Never queued: health checks, scrapes, long-lived streams and provider callbacks
+EXEMPT_PATHS = ('/health', '/metrics', '/alerts/stream', '/alerts/delivery-status', '/docs', '/redoc', '/openapi.json')
+
+# Authority alert creation; the only requests in the top class
+ALERT_WRITE_PATHS = ('/alerts', '/alerts/', '/alerts/multi-region')
+
+
+def parse_limits(spec: Optional[str]) -> Dict[str, Tuple[int, int, float, int]]:
+    limits = dict(DEFAULT_LIMITS)
+    for part in (spec or '').split(','):
+        if '=' not in part:
+            continue
+        name, values = part.split('=', 1)
+        name = name.strip()
+        if name not in limits:
+            logger.warning("Unknown admission class %r in ADMISSION_LIMITS", name)
+            continue
+        concurrency, queue, timeout, retry_after = limits[name]
+        fields = values.split(':')
+        try:
+            concurrency = int(fields[0])
+            if len(fields) > 1:
+                queue = int(fields[1])
+            if len(fields) > 2:
+                timeout = float(fields[2])
+        except ValueError:
+            logger.warning("Invalid admission limit %r", part)
+            continue
+        limits[name] = (concurrency, queue, timeout, retry_after)
+    return limits
+
+
+def classify(method: str, path: str) -> Optional[str]:
+    """Admission class for a request, or None if it bypasses admission control."""
+    if path.startswith(EXEMPT_PATHS):
+        return None
+    if path.startswith('/alerts'):
+        if method == 'POST' and path in ALERT_WRITE_PATHS:
+            return 'alerts'
+        if path.endswith('/confirm'):
+            return 'public'  # citizen acknowledgements must not compete with alert writes
+        return 'dashboard'
+    if path == '/auth/me/location':
+        return 'public'  # background pings; shed before logins
+    if path.startswith('/auth'):
+        return 'auth'
+    if path.startswith('/exports'):
+        return 'exports'
+    if path.startswith('/dashboard'):
+        return 'dashboard'
+    return 'public'
+
+
+class AdmissionController:
+    """Slot accounting; runs on the event loop only, so no locking is needed."""
+    def __init__(self, limits: Dict[str, Tuple[int, int, float, int]], max_concurrency: int = ADMISSION_MAX_CONCURRENCY):
+        self.limits = limits
+        self.max_concurrency = max_concurrency
+        self.in_flight = 0
+        self.in_flight_by_class = {name: 0 for name in CLASSES}
+        self.waiters: Dict[str, Deque[asyncio.Future]] = {name: deque() for name in CLASSES}
+
+    def _can_run(self, name: str) -> bool:
+        return self.in_flight < self.max_concurrency and self.in_flight_by_class[name] < self.limits[name][0]
+
+    def _blocked_by_higher(self, name: str) -> bool:
+        # A queued higher-priority request that only lacks a global slot gets the next one
+        for higher in CLASSES[:CLASSES.index(name)]:
+            if self.waiters[higher] and self.in_flight_by_class[higher] < self.limits[higher][0]:
+                return True
+        return False
+
+    def _take(self, name: str) -> None:
+        self.in_flight += 1
+        self.in_flight_by_class[name] += 1
+        ADMISSION_IN_FLIGHT.set(self.in_flight_by_class[name], (name,))
+
+    async def acquire(self, name: str) -> Optional[str]:
+        """Take a slot for class `name`; returns None on success or the shed reason."""
+        if not self.waiters[name] and self._can_run(name) and not self._blocked_by_higher(name):
+            self._take(name)
+            return None
+        _, queue_size, timeout, _ = self.limits[name]
+        queue = self.waiters[name]
+        if len(queue) >= queue_size:
+            return 'queue_full'
+        future = asyncio.get_running_loop().create_future()
+        queue.append(future)
+        ADMISSION_QUEUE_DEPTH.set(len(queue), (name,))
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout)
+            return None
+        except asyncio.TimeoutError:
+            if future.done() and not future.cancelled():
+                return None  # granted just as the timeout fired; the slot is already ours
+            future.cancel()
+            return 'timeout'
+        except asyncio.CancelledError:
+            # Client went away; give back a slot granted while we were being cancelled
+            if future.done() and not future.cancelled():
+                self.release(name)
+            future.cancel()
+            raise
+        finally:
+            if future in queue:
+                queue.remove(future)
+            ADMISSION_QUEUE_DEPTH.set(len(queue), (name,))
+            ADMISSION_WAIT_SECONDS.observe(time.perf_counter() - start, (name,))
+
+    def release(self, name: str) -> None:
+        self.in_flight -= 1
+        self.in_flight_by_class[name] -= 1
+        ADMISSION_IN_FLIGHT.set(self.in_flight_by_class[name], (name,))
+        self._grant()
+
+    def _grant(self) -> None:
+        # Hand freed slots to the highest-priority waiters that fit their class limit
+        for name in CLASSES:
+            queue = self.waiters[name]
+            while queue and self._can_run(name) and not self._blocked_by_higher(name):
+                future = queue.popleft()
+                if future.done():
+                    continue
+                self._take(name)
+                future.set_result(True)
+            if self.in_flight >= self.max_concurrency:
+                return
+
+
+class AdmissionMiddleware:
+    """Pure ASGI middleware applying AdmissionController per request."""
+    def __init__(self, app, limits: Optional[Dict[str, Tuple[int, int, float, int]]] = None):
+        self.app = app
+        self.controller = AdmissionController(limits or parse_limits(os.getenv('ADMISSION_LIMITS')))
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not ADMISSION_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        name = classify(scope["method"], scope["path"])
+        if name is None:
+            await self.app(scope, receive, send)
+            return
+
+        reason = await self.controller.acquire(name)
+        if reason is not None:
+            ADMISSION_SHED.inc((name, reason))
+            retry_after = self.controller.limits[name][3]
+            logger.debug("Shed %s %s (%s, %s)", scope["method"], scope["path"], name, reason)
+            await send({
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"retry-after", str(retry_after).encode()),
+                ],
+            })
+            await send({"type": "http.response.body", "body": b'{"detail":"Server busy, retry later"}'})
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(name)
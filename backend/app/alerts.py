@@ -1,38 +1,254 @@
-from fastapi import APIRouter, Depends, HTTPException
+from datetime import datetime, timedelta
+import time
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy.orm import Session
-from sqlalchemy.exc import SQLAlchemyError
-from typing import List, Any
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy import func, or_, select, update
+from typing import Dict, List, Any, Optional
 
 from .database import get_db
-from .models import Alert, User, AlertHistory, Region
-from .schemas import AlertCreate, AlertResponse
+from .models import Alert, AlertRegion, User, AlertHistory, Region, AlertDelivery
+from .schemas import AlertCreate, AlertResponse, DeliverySummary, DeliveryRecordItem, MultiRegionAlertCreate
 from .auth import get_current_user
+from .metrics import ALERTS_CREATED, ALERT_FANOUT_SECONDS
 from .services.sms_service import sms_service, whatsapp_service
+from .services.alert_fanout import (
+    RECIPIENT_CHUNK_SIZE,
+    FanoutIncomplete,
+    active_citizens,
+    citizen_partitions,
+    fan_out,
+    fanout_pool,
+    id_partitions,
+)
+from .services.alert_broadcaster import alert_broadcaster, stream_events
+from .services.alert_coalescer import RISK_RANK, AnySuperseded, CoalesceSlot, alert_coalescer, region_key
+from .services.delivery_service import (
+    DELIVERY_STATUSES,
+    DeliveryRecorder,
+    delivery_summary,
+    normalize_provider_status,
+    receipt_buffer,
+)
+from .services.invalidation_bus import invalidation_bus
+from .services.json_fragments import alert_fragments, join_array
+from .services.region_index import region_index
+from .services.snapshot_publisher import snapshot_publisher
+from .services.recipients import IdBitmap, chunked, difference_sorted, region_member_ids, union_sorted
 import logging
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
 
+def _alert_snapshot(db_alert: Alert) -> dict:
+    return {
+        "id": db_alert.id,
+        "region": db_alert.region,
+        "message": db_alert.message,
+        "risk_level": db_alert.risk_level,
+        "created_by": db_alert.created_by,
+        "created_at": db_alert.created_at,
+    }
+
+
+def _replay(db: Session, idempotency_key: Optional[str], response: Response) -> Optional[Alert]:
+    """The alert an earlier request with this Idempotency-Key created, if any."""
+    if not idempotency_key:
+        return None
+    replay = db.query(Alert).filter(Alert.idempotency_key == idempotency_key).one_or_none()
+    if replay is not None:
+        ALERTS_CREATED.inc(("replayed",))
+        response.headers["X-Alert-Coalesced"] = "true"
+    return replay
+
+
+def _abandon(reserved: Dict[str, CoalesceSlot], idempotency_key: Optional[str]) -> None:
+    for key, slot in reserved.items():
+        alert_coalescer.abandon(key, slot, idempotency_key)
+
+
+def _commit_new_alert(
+    db: Session,
+    db_alert: Alert,
+    region_ids: List[int],
+    reserved: Dict[str, CoalesceSlot],
+    idempotency_key: Optional[str],
+    response: Response,
+):
+    """
+    Commit a new alert row and its region links before any fan-out, then hand
+    it to merged requests.
+
+    Returns the existing alert instead when another worker committed the same
+    Idempotency-Key first (the unique constraint rejects ours).
+    """
+    try:
+        db.flush()
+        db.add_all([AlertRegion(alert_id=db_alert.id, region_id=region_id) for region_id in region_ids])
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        replay = _replay(db, idempotency_key, response)
+        if replay is None:
+            raise
+        _abandon(reserved, idempotency_key)
+        logger.info("Idempotency-Key %s was committed concurrently as alert %s", idempotency_key, replay.id)
+        return replay
+    db.refresh(db_alert)
+    snapshot = _alert_snapshot(db_alert)
+    for slot in reserved.values():
+        alert_coalescer.publish(slot, snapshot)
+    return None
+
+
+def _merged_alert(merged_into: CoalesceSlot, label: str, risk_level: str, response: Response):
+    """
+    Snapshot of the alert a request was coalesced into.
+
+    The wait for an in-flight owner is bounded by ALERT_MERGE_WAIT_SECONDS;
+    past that the request gets 202 and a retry (ideally with the same
+    Idempotency-Key) returns the committed alert. 409 if the owner failed.
+    """
+    snapshot = merged_into.wait()
+    if snapshot is None:
+        if merged_into.abandoned:
+            raise HTTPException(status_code=409, detail="A matching alert failed to dispatch, retry")
+        return JSONResponse(
+            status_code=202,
+            content={"detail": "A matching alert is still being dispatched, retry shortly"},
+            headers={"Retry-After": "1", "X-Alert-Coalesced": "true"},
+        )
+    ALERTS_CREATED.inc(("coalesced",))
+    logger.info("Alert for %s (%s) coalesced into alert %s", label, risk_level, snapshot["id"])
+    response.headers["X-Alert-Coalesced"] = "true"
+    return snapshot
+
+
+def _publish(db_alert: Alert, region_ids: List[int]) -> None:
+    """Push a committed alert to /alerts/stream subscribers, the list cache and the static snapshots."""
+    payload = AlertResponse.model_validate(db_alert).model_dump()
+    alert_fragments.put(db_alert.id, payload)
+    alert_broadcaster.publish(db_alert.id, payload, region_ids)
+    snapshot_publisher.mark_dirty()
+    # Streams held open by other workers get the alert through the bus
+    invalidation_bus.publish('alert', db_alert.id, {'alert': payload, 'region_ids': region_ids})
+
+
+def _record_progress(db: Session, history_id: Optional[int], sent: int) -> None:
+    """Commit the running reached count while sender processes are still working."""
+    if history_id is not None:
+        db.execute(update(AlertHistory).where(AlertHistory.id == history_id).values(sent_to_count=sent))
+        db.commit()
+
+
+def _incomplete_error(alert_id: int, error: FanoutIncomplete) -> HTTPException:
+    """The alert exists and reached some recipients, but not all of them."""
+    return HTTPException(
+        status_code=500,
+        detail=f"Alert {alert_id} was created but could not be sent to every recipient "
+               f"({error.sent} reached, {error.failed_partitions} partitions failed)",
+    )
+
+
+def _recent_region_alert(db: Session, key: str, rank: int, region_id: Optional[int] = None) -> Optional[Alert]:
+    """
+    Highest-risk committed alert for the region inside its window at or above
+    `rank` (other workers, restarts). Matches the region's name and, when it
+    resolved to a region, any alert linked to it, multi-region ones included.
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=alert_coalescer.window_for(key))
+    levels = [level for level, r in RISK_RANK.items() if r >= rank]
+    same_region = func.lower(Alert.region) == key
+    if region_id is not None:
+        same_region = or_(same_region, Alert.id.in_(select(AlertRegion.alert_id).where(AlertRegion.region_id == region_id)))
+    recent = (
+        db.query(Alert)
+        .filter(same_region, Alert.created_at >= cutoff, Alert.risk_level.in_(levels))
+        .order_by(Alert.created_at.desc())
+        .all()
+    )
+    return max(recent, key=lambda a: RISK_RANK.get(a.risk_level, 0), default=None)
+
+
+def _recent_region_alerts(db: Session, keys: Dict[int, str], rank: int) -> Dict[int, Alert]:
+    """_recent_region_alert() for several regions in one query, by region link only."""
+    if not keys:
+        return {}
+    now = datetime.utcnow()
+    cutoffs = {region_id: now - timedelta(seconds=alert_coalescer.window_for(key)) for region_id, key in keys.items()}
+    levels = [level for level, r in RISK_RANK.items() if r >= rank]
+    rows = (
+        db.query(AlertRegion.region_id, Alert)
+        .join(Alert, Alert.id == AlertRegion.alert_id)
+        .filter(
+            AlertRegion.region_id.in_(list(keys)),
+            Alert.created_at >= min(cutoffs.values()),
+            Alert.risk_level.in_(levels),
+        )
+        .all()
+    )
+    best: Dict[int, Alert] = {}
+    for region_id, recent in rows:
+        if recent.created_at < cutoffs[region_id]:
+            continue
+        current = best.get(region_id)
+        if current is None or (RISK_RANK[recent.risk_level], recent.created_at) > (RISK_RANK[current.risk_level], current.created_at):
+            best[region_id] = recent
+    return best
+
+
+def _coalesced_into(existing: Alert, slot: CoalesceSlot, rank: int) -> None:
+    """Point a freshly reserved slot at an alert another worker already committed."""
+    slot.rank = RISK_RANK.get(existing.risk_level, rank)
+    alert_coalescer.publish(slot, _alert_snapshot(existing))
+
+
 @router.post("/", response_model=AlertResponse)
 def create_alert(
     alert: AlertCreate,
+    response: Response,
     db: Session = Depends(get_db),
     current_user: Any = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(default=None, alias="Idempotency-Key", max_length=64),
 ):
     """
     Create a new alert and send notifications to users.
     
     Requires authority role. Creates Alert record and AlertHistory entry,
     then sends SMS/WhatsApp to all citizens based on their preferences.
+    A repeated Idempotency-Key, or a same-or-lower risk alert for the same
+    region inside its coalescing window, returns the existing alert instead
+    of fanning out again (X-Alert-Coalesced: true).
     """
     if current_user.get("role") != "authority":
         raise HTTPException(status_code=403, detail="Only authorities can create alerts")
 
+    replay = _replay(db, idempotency_key, response)
+    if replay is not None:
+        return replay
+
+    # Resolve region for AlertHistory and coalescing (optional); ambiguous names are not guessed
+    region = region_index.resolve(alert.region)
+    region_id = region.id if region else None
+    # Keyed like multi-region alerts when the name resolves, so the two coalesce with each other
+    key = region_key(region.name if region else alert.region)
+    rank = RISK_RANK[alert.risk_level]
+    merged_into, slot = alert_coalescer.reserve(key, rank, idempotency_key)
+    if merged_into is not None:
+        return _merged_alert(merged_into, alert.region, alert.risk_level, response)
+
+    committed = False
     try:
-        # Find region by name for AlertHistory (optional)
-        region = db.query(Region).filter(Region.name.ilike(f"%{alert.region}%")).first()
-        region_id = region.id if region else None
+        existing = _recent_region_alert(db, key, rank, region_id)
+        if existing is not None:
+            _coalesced_into(existing, slot, rank)
+            ALERTS_CREATED.inc(("coalesced",))
+            logger.info("Alert for %s (%s) coalesced into alert %s", alert.region, alert.risk_level, existing.id)
+            response.headers["X-Alert-Coalesced"] = "true"
+            return existing
 
         # Create alert record
         data = alert.model_dump()
@@ -41,55 +257,264 @@ def create_alert(
             message=data["message"],
             risk_level=data["risk_level"],
             created_by=current_user.get("phone_number"),
+            idempotency_key=idempotency_key,
         )
         db.add(db_alert)
-        db.flush()  # Get alert ID without committing
 
-        # Track notification sending
-        sent_count = 0
-        users = db.query(User).filter(User.role == "citizen", User.is_active == True).all()
-        message = f"FLOOD ALERT: {alert.message} - Risk Level: {alert.risk_level}"
-        
-        for user in users:
-            try:
-                sent = False
-                if user.sms_alerts:
-                    if sms_service.send_sms(user.phone_number, message):
-                        sent = True
-                if user.whatsapp_alerts:
-                    if whatsapp_service.send_whatsapp(user.phone_number, message):
-                        sent = True
-                if sent:
-                    sent_count += 1
-            except Exception as e:
-                logger.error("Failed to send alert to user %s: %s", user.id, e, exc_info=True)
-
-        # Create AlertHistory entry
+        # AlertHistory entry; sent_to_count is filled in as recipients are reached
+        alert_history = None
         if region_id:
             alert_history = AlertHistory(
                 region_id=region_id,
                 message=alert.message,
                 risk_level=alert.risk_level,
-                sent_to_count=sent_count,
+                sent_to_count=0,
                 created_by=current_user.get("phone_number"),
             )
             db.add(alert_history)
+        replay = _commit_new_alert(db, db_alert, [region_id] if region_id else [], {key: slot}, idempotency_key, response)
+        if replay is not None:
+            return replay
+        committed = True
+
+        # Send notifications, recording one delivery row per (user, channel)
+        message = f"FLOOD ALERT: {alert.message} - Risk Level: {alert.risk_level}"
+        recipients, partitions = citizen_partitions(db, fanout_pool.partition_size) if fanout_pool.enabled else (0, [])
+        incomplete = None
+        with ALERT_FANOUT_SECONDS.time():
+            if fanout_pool.use_for(recipients):
+                # Sender processes write deliveries on their own connections
+                alert_id, history_id = db_alert.id, alert_history.id if alert_history is not None else None
+                try:
+                    sent_count = fanout_pool.run(
+                        alert_id, message, partitions,
+                        cancelled=slot.superseded,
+                        on_progress=lambda sent: _record_progress(db, history_id, sent),
+                    )
+                except FanoutIncomplete as e:
+                    sent_count, incomplete = e.sent, e
+            else:
+                users = active_citizens(db).all()
+                sent_count = fan_out(users, message, DeliveryRecorder(db_alert.id), cancelled=slot.superseded)
 
+        if alert_history is not None:
+            alert_history.sent_to_count = sent_count
+            alert_history.fanout_complete = incomplete is None
         db.commit()
         db.refresh(db_alert)
+        _publish(db_alert, [region_id] if region_id else [])
+        ALERTS_CREATED.inc(("single",))
         logger.info("Alert %s created by %s, sent to %d users", db_alert.id, current_user.get("phone_number"), sent_count)
+        if incomplete is not None:
+            raise _incomplete_error(db_alert.id, incomplete)
         return db_alert
 
+    except HTTPException:
+        raise
     except SQLAlchemyError as e:
         db.rollback()
+        if not committed:
+            alert_coalescer.abandon(key, slot, idempotency_key)
         logger.error("Database error creating alert: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail="Failed to create alert")
     except Exception as e:
         db.rollback()
+        if not committed:
+            alert_coalescer.abandon(key, slot, idempotency_key)
         logger.error("Unexpected error creating alert: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
+@router.post("/multi-region", response_model=AlertResponse)
+def create_multi_region_alert(
+    alert: MultiRegionAlertCreate,
+    response: Response,
+    db: Session = Depends(get_db),
+    current_user: Any = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(default=None, alias="Idempotency-Key", max_length=64),
+):
+    """
+    Create one alert targeting several regions (e.g. a river basin).
+    
+    Requires authority role. Recipients are the union of citizens following
+    any of the regions, deduplicated so each is notified once; one
+    AlertHistory row is written per region with that region's reached count.
+    Coalescing is per region: regions that already have a same-or-higher
+    risk alert inside their window (single- or multi-region) are left out and
+    listed in X-Alert-Coalesced-Regions, and their citizens are not re-sent.
+    If every region is covered the covering alert is returned instead.
+    """
+    if current_user.get("role") != "authority":
+        raise HTTPException(status_code=403, detail="Only authorities can create alerts")
+
+    replay = _replay(db, idempotency_key, response)
+    if replay is not None:
+        return replay
+
+    region_ids = sorted(set(alert.region_ids))
+    regions = db.query(Region).filter(Region.id.in_(region_ids)).order_by(Region.id).all()
+    if len(regions) != len(region_ids):
+        missing = sorted(set(region_ids) - {r.id for r in regions})
+        raise HTTPException(status_code=404, detail=f"Region not found: {missing}")
+
+    keys = {region.id: region_key(region.name) for region in regions}
+    rank = RISK_RANK[alert.risk_level]
+    label = "regions " + ",".join(str(region_id) for region_id in region_ids)
+    # One slot per region, so overlapping multi- and single-region alerts coalesce region by region
+    replayed, covered, reserved = alert_coalescer.reserve_many(
+        list(dict.fromkeys(keys[region_id] for region_id in region_ids)), rank, idempotency_key,
+    )
+    if replayed is not None:
+        return _merged_alert(replayed, label, alert.risk_level, response)
+
+    committed = False
+    try:
+        recent = _recent_region_alerts(db, {r: keys[r] for r in region_ids if keys[r] in reserved}, rank)
+        for region_id, existing in recent.items():
+            if keys[region_id] in reserved:
+                _coalesced_into(existing, reserved.pop(keys[region_id]), rank)
+        targets = [region_id for region_id in region_ids if keys[region_id] in reserved]
+        covered_ids = [region_id for region_id in region_ids if keys[region_id] not in reserved]
+
+        if not targets:
+            # Every region already has a same-or-higher risk alert in its window
+            if recent:
+                existing = max(recent.values(), key=lambda a: (RISK_RANK[a.risk_level], a.created_at))
+                ALERTS_CREATED.inc(("coalesced",))
+                logger.info("Alert for %s (%s) coalesced into alert %s", label, alert.risk_level, existing.id)
+                response.headers["X-Alert-Coalesced"] = "true"
+                return existing
+            return _merged_alert(max(covered.values(), key=lambda slot: slot.rank), label, alert.risk_level, response)
+        if covered_ids:
+            # Those regions' citizens already got an alert at least this severe; only the rest are sent this one
+            response.headers["X-Alert-Coalesced-Regions"] = ",".join(str(region_id) for region_id in covered_ids)
+            logger.info("Multi-region alert for %s skips regions %s, already alerted", label, covered_ids)
+
+        db_alert = Alert(
+            region=", ".join(r.name for r in regions if keys[r.id] in reserved)[:255],
+            message=alert.message,
+            risk_level=alert.risk_level,
+            created_by=current_user.get("phone_number"),
+            idempotency_key=idempotency_key,
+        )
+        db.add(db_alert)
+        # One AlertHistory row per target region; reached counts are filled in after fan-out
+        histories = {
+            region_id: AlertHistory(
+                region_id=region_id,
+                message=alert.message,
+                risk_level=alert.risk_level,
+                sent_to_count=0,
+                created_by=current_user.get("phone_number"),
+            )
+            for region_id in targets
+        }
+        db.add_all(histories.values())
+        db.flush()
+        history_ids = {region_id: history.id for region_id, history in histories.items()}
+        replay = _commit_new_alert(db, db_alert, targets, reserved, idempotency_key, response)
+        if replay is not None:
+            return replay
+        committed = True
+
+        members = {region_id: region_member_ids(db, region_id) for region_id in targets}
+        recipients = union_sorted(members.values())
+        if covered_ids:
+            recipients = difference_sorted(recipients, union_sorted(region_member_ids(db, r) for r in covered_ids))
+        reached = IdBitmap(recipients[-1] if recipients else 0)
+        recorder = DeliveryRecorder(db_alert.id)
+        message = f"FLOOD ALERT: {alert.message} - Risk Level: {alert.risk_level}"
+        cancelled = AnySuperseded(reserved.values())
+
+        sent_count = 0
+        fanout_start = time.perf_counter()
+        incomplete = None
+        if fanout_pool.use_for(len(recipients)):
+            try:
+                sent_count = fanout_pool.run(
+                    db_alert.id, message, id_partitions(recipients, fanout_pool.partition_size),
+                    cancelled=cancelled, reached=reached,
+                )
+            except FanoutIncomplete as e:
+                sent_count, incomplete = e.sent, e
+        else:
+            for chunk in chunked(recipients, RECIPIENT_CHUNK_SIZE):
+                if cancelled.is_set():
+                    break
+                users = active_citizens(db).filter(User.id.in_(chunk)).order_by(User.id).all()
+                sent_count += fan_out(users, message, recorder, cancelled=cancelled, reached=reached)
+        ALERT_FANOUT_SECONDS.observe(time.perf_counter() - fanout_start)
+
+        db.execute(update(AlertHistory), [
+            {"id": history_id, "sent_to_count": reached.count_in(members[region_id]), "fanout_complete": incomplete is None}
+            for region_id, history_id in history_ids.items()
+        ])
+
+        db.commit()
+        db.refresh(db_alert)
+        _publish(db_alert, targets)
+        ALERTS_CREATED.inc(("multi_region",))
+        logger.info(
+            "Alert %s created by %s for %d regions, sent to %d of %d unique recipients",
+            db_alert.id, current_user.get("phone_number"), len(targets), sent_count, len(recipients),
+        )
+        if incomplete is not None:
+            raise _incomplete_error(db_alert.id, incomplete)
+        return db_alert
+
+    except HTTPException:
+        raise
+    except SQLAlchemyError as e:
+        db.rollback()
+        if not committed:
+            _abandon(reserved, idempotency_key)
+        logger.error("Database error creating multi-region alert: %s", e, exc_info=True)
+        raise HTTPException(status_code=500, detail="Failed to create alert")
+    except Exception as e:
+        db.rollback()
+        if not committed:
+            _abandon(reserved, idempotency_key)
+        logger.error("Unexpected error creating multi-region alert: %s", e, exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@router.get("/stream")
+async def alert_stream(
+    request: Request,
+    token: Optional[str] = None,
+    region_ids: Optional[str] = None,
+    last_event_id: Optional[int] = Header(default=None, alias="Last-Event-ID"),
+):
+    """
+    Server-Sent Events stream of new alerts.
+    
+    EventSource cannot send headers, so the JWT may be passed as ?token=.
+    region_ids=1,2 limits the stream to alerts targeting those regions.
+    Events come from the in-process broadcaster; no DB access per client.
+    """
+    if token is None:
+        scheme, _, token = request.headers.get("authorization", "").partition(" ")
+        if scheme.lower() != "bearer":
+            token = None
+    if not token:
+        raise HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+    get_current_user(token)
+
+    regions = None
+    if region_ids:
+        try:
+            regions = {int(v) for v in region_ids.split(",") if v.strip()}
+        except ValueError:
+            raise HTTPException(status_code=400, detail="region_ids must be comma-separated integers")
+
+    sub = alert_broadcaster.subscribe(regions, last_event_id)
+    return StreamingResponse(
+        stream_events(alert_broadcaster, sub),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.get("/", response_model=List[AlertResponse])
 def get_alerts(
     db: Session = Depends(get_db),
@@ -99,17 +524,112 @@ def get_alerts(
     """
     List recent alerts (MVP: last 50 for any authenticated user).
     
-    Returns alerts ordered by creation date (newest first).
+    Returns alerts ordered by creation date (newest first). Alerts never
+    change once written, so each one is served from its cached JSON fragment.
     """
     try:
         if limit > 100:
             limit = 100  # Cap at 100
-        alerts = db.query(Alert).order_by(Alert.created_at.desc()).limit(limit).all()
-        return alerts
+        ids = [alert_id for (alert_id,) in db.query(Alert.id).order_by(Alert.created_at.desc()).limit(limit)]
+        fragments = alert_fragments.get_many(ids)
+        missing = [alert_id for alert_id in ids if alert_id not in fragments]
+        if missing:
+            rows = db.query(
+                Alert.id, Alert.region, Alert.message, Alert.risk_level, Alert.created_by, Alert.created_at
+            ).filter(Alert.id.in_(missing))
+            for row in rows:
+                fragments[row.id] = alert_fragments.put(row.id, AlertResponse.model_validate(row).model_dump())
+        body = join_array(fragments[alert_id] for alert_id in ids if alert_id in fragments)
+        return Response(content=body, media_type="application/json")
     except Exception as e:
         logger.error("Error fetching alerts: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail="Failed to fetch alerts")
 
+
+@router.get("/{alert_id}/deliveries/summary", response_model=DeliverySummary)
+def get_delivery_summary(
+    alert_id: int,
+    db: Session = Depends(get_db),
+    current_user: Any = Depends(get_current_user),
+):
+    """Per-status delivery counts for an alert (authority only)."""
+    if current_user.get("role") != "authority":
+        raise HTTPException(status_code=403, detail="Only authorities can view deliveries")
+    try:
+        counts = delivery_summary(db, alert_id)
+        return DeliverySummary(alert_id=alert_id, total=sum(counts.values()), **counts)
+    except SQLAlchemyError as e:
+        logger.error("Database error fetching delivery summary: %s", e, exc_info=True)
+        raise HTTPException(status_code=500, detail="Failed to fetch delivery summary")
+
+
+@router.get("/{alert_id}/deliveries", response_model=List[DeliveryRecordItem])
+def list_deliveries(
+    alert_id: int,
+    status: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: Any = Depends(get_current_user),
+    limit: int = 100,
+    after_id: int = 0,
+):
+    """
+    List delivery records for an alert (authority only).
+    
+    Filter by status (e.g. failed) to see who did not receive it; page with after_id.
+    """
+    if current_user.get("role") != "authority":
+        raise HTTPException(status_code=403, detail="Only authorities can view deliveries")
+    if status is not None and status not in DELIVERY_STATUSES:
+        raise HTTPException(status_code=400, detail="Invalid delivery status")
+    try:
+        if limit > 500:
+            limit = 500  # Cap at 500
+        query = (
+            db.query(AlertDelivery, User.phone_number)
+            .join(User, User.id == AlertDelivery.user_id)
+            .filter(AlertDelivery.alert_id == alert_id, AlertDelivery.id > after_id)
+        )
+        if status is not None:
+            query = query.filter(AlertDelivery.status == status)
+        rows = query.order_by(AlertDelivery.id).limit(limit).all()
+        return [
+            DeliveryRecordItem(
+                user_id=d.user_id,
+                phone_number=phone,
+                channel=d.channel,
+                status=d.status,
+                provider_message_id=d.provider_message_id,
+            )
+            for d, phone in rows
+        ]
+    except SQLAlchemyError as e:
+        logger.error("Database error listing deliveries: %s", e, exc_info=True)
+        raise HTTPException(status_code=500, detail="Failed to fetch deliveries")
+
+
+@router.post("/delivery-status")
+async def delivery_status_callback(request: Request):
+    """
+    Provider (Twilio) message status callback.
+    
+    Receipts are coalesced in memory and applied to alert_deliveries in batches.
+    """
+    form = await request.form()
+    params = {k: v for k, v in form.items()}
+    if not sms_service.mock_enabled and sms_service.auth_token:
+        from twilio.request_validator import RequestValidator
+        validator = RequestValidator(sms_service.auth_token)
+        signature = request.headers.get("X-Twilio-Signature", "")
+        if not validator.validate(str(request.url), params, signature):
+            raise HTTPException(status_code=403, detail="Invalid callback signature")
+
+    sid = params.get("MessageSid") or params.get("SmsSid")
+    status = normalize_provider_status(params.get("MessageStatus") or params.get("SmsStatus"))
+    if sid and status:
+        receipt_buffer.add(sid, status)
+    return {"accepted": bool(sid and status)}
+
+
 @router.post("/{alert_id}/confirm")
 def confirm_alert(
     alert_id: int,
@@ -2,14 +2,16 @@ import os
 from datetime import datetime, timedelta
 from typing import Optional, Any
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt, JWTError
 from sqlalchemy.orm import Session
 
 from .database import get_db
-from .models import User
-from .schemas import RegisterRequest, VerifyRequest, TokenResponse, AdminLoginRequest, UserMeResponse, UserMeUpdate
+from .models import User, Region, UserRegion
+from .services.location_buffer import location_buffer
+from .services.otp_service import EXPIRED, LOCKED, VERIFIED, otp_service
+from .schemas import RegisterRequest, VerifyRequest, TokenResponse, AdminLoginRequest, UserMeResponse, UserMeUpdate, LocationUpdate
 
 
 router = APIRouter()
@@ -21,9 +23,12 @@ JWT_ALG = "HS256"
 JWT_EXPIRE_HOURS = int(os.getenv("JWT_EXPIRE_HOURS", "24"))
 
 
-def create_access_token(subject: str, role: str, expires_delta: Optional[timedelta] = None) -> str:
+def create_access_token(subject: str, role: str, expires_delta: Optional[timedelta] = None, user_id: Optional[int] = None) -> str:
     expire = datetime.utcnow() + (expires_delta or timedelta(hours=JWT_EXPIRE_HOURS))
     to_encode = {"sub": subject, "role": role, "exp": expire}
+    if user_id is not None:
+        # Lets hot paths such as location pings identify the user without a DB read
+        to_encode["uid"] = user_id
     return jwt.encode(to_encode, JWT_SECRET, algorithm=JWT_ALG)
 
 
@@ -39,7 +44,7 @@ def get_current_user(token: str = Depends(oauth2_scheme)):
         role = payload.get("role")
         if phone is None or role is None:
             raise credentials_exception
-        return {"phone_number": phone, "role": role}
+        return {"phone_number": phone, "role": role, "user_id": payload.get("uid")}
     except JWTError:
         raise credentials_exception
 
@@ -65,17 +70,22 @@ def get_current_user_db(
     return user
 
 
+def _user_region_ids(db: Session, user_id: int) -> list[int]:
+    rows = db.query(UserRegion.region_id).filter(UserRegion.user_id == user_id).order_by(UserRegion.region_id).all()
+    return [region_id for (region_id,) in rows]
+
+
 @router.post("/register")
-def register(req: RegisterRequest, db: Session = Depends(get_db)):
+def register(req: RegisterRequest, request: Request, db: Session = Depends(get_db)):
     """
     Register a new user or update existing user preferences.
     
-    Creates user if phone doesn't exist, otherwise updates preferences.
-    Returns OTP sent confirmation (MVP: always returns success).
+    Creates user if phone doesn't exist, otherwise updates preferences, then
+    sends a one-time code by SMS. Throttled per phone and per client IP (429).
     """
     from sqlalchemy.exc import SQLAlchemyError
     import logging
-    from .utils import sanitize_phone, sanitize_string, validate_language_code
+    from .utils import client_ip, sanitize_phone, sanitize_string, validate_language_code
     
     logger = logging.getLogger(__name__)
     
@@ -89,6 +99,15 @@ def register(req: RegisterRequest, db: Session = Depends(get_db)):
         if req.language and not validate_language_code(req.language):
             raise HTTPException(status_code=400, detail="Invalid language code")
         
+        # Throttle before touching the DB so abusive retries cost nothing during a surge
+        retry_after = otp_service.check_rate(phone, client_ip(request))
+        if retry_after:
+            raise HTTPException(
+                status_code=429,
+                detail="Too many code requests, retry later",
+                headers={"Retry-After": str(max(1, int(retry_after + 0.999)))},
+            )
+        
         existing = db.query(User).filter(User.phone_number == phone).one_or_none()
         if existing is None:
             # Sanitize name/location
@@ -116,6 +135,8 @@ def register(req: RegisterRequest, db: Session = Depends(get_db)):
                 existing.whatsapp_alerts = req.whatsapp_alerts
             db.commit()
             logger.info("User preferences updated: %s", phone)
+        # Only once the user row is committed, so a failed write never sends a code
+        otp_service.issue_code(phone)
         return {"otp_sent": True}
     except SQLAlchemyError as e:
         db.rollback()
@@ -134,8 +155,8 @@ def verify(req: VerifyRequest, db: Session = Depends(get_db)):
     """
     Verify OTP and return JWT token.
     
-    MVP: accepts OTP "0000" for demo purposes.
-    In production, this would verify against stored OTP with expiration.
+    Codes come from /auth/register, expire after OTP_TTL_SECONDS and are
+    single use; too many wrong guesses invalidate the code (429).
     """
     import logging
     from sqlalchemy.exc import SQLAlchemyError
@@ -149,10 +170,12 @@ def verify(req: VerifyRequest, db: Session = Depends(get_db)):
             raise HTTPException(status_code=400, detail="Invalid phone number format")
         otp = req.otp.strip()
         
-        # MVP: accept any OTP == "0000"
-        if otp != "0000":
-            logger.warning("Invalid OTP attempt for phone: %s", phone)
-            raise HTTPException(status_code=400, detail="Invalid OTP")
+        result = otp_service.verify(phone, otp)
+        if result != VERIFIED:
+            logger.warning("OTP %s for phone: %s", result, phone)
+            if result == LOCKED:
+                raise HTTPException(status_code=429, detail="Too many attempts, request a new code")
+            raise HTTPException(status_code=400, detail="OTP expired, request a new code" if result == EXPIRED else "Invalid OTP")
         
         user = db.query(User).filter(User.phone_number == phone).one_or_none()
         if user is None:
@@ -162,7 +185,7 @@ def verify(req: VerifyRequest, db: Session = Depends(get_db)):
         if not user.is_active:
             raise HTTPException(status_code=403, detail="User account is inactive")
         
-        token = create_access_token(subject=user.phone_number, role=user.role)
+        token = create_access_token(subject=user.phone_number, role=user.role, user_id=user.id)
         logger.info("User verified successfully: %s (role: %s)", phone, user.role)
         return TokenResponse(access_token=token, role=user.role)
     except HTTPException:
@@ -189,6 +212,7 @@ def admin_login(req: AdminLoginRequest):
 def get_me(
     payload: dict = Depends(get_current_user),
     user_db: Optional[User] = Depends(get_current_user_db),
+    db: Session = Depends(get_db),
 ):
     """Current user profile (from JWT + DB for citizens)."""
     if user_db is not None:
@@ -199,6 +223,7 @@ def get_me(
             language=user_db.language or "en",
             sms_alerts=user_db.sms_alerts,
             whatsapp_alerts=user_db.whatsapp_alerts,
+            region_ids=_user_region_ids(db, user_db.id),
         )
     sub = payload.get("phone_number", "")
     return UserMeResponse(
@@ -221,8 +246,9 @@ def update_me(
     """
     Update current user profile (citizens only).
     
-    Allows updating name, language, and alert preferences.
-    Authority users cannot update via this endpoint.
+    Allows updating name, language, alert preferences and followed regions
+    (region_ids replaces the whole set). Authority users cannot update via
+    this endpoint.
     """
     import logging
     from sqlalchemy.exc import SQLAlchemyError
@@ -241,6 +267,13 @@ def update_me(
             user_db.sms_alerts = body.sms_alerts
         if body.whatsapp_alerts is not None:
             user_db.whatsapp_alerts = body.whatsapp_alerts
+        if body.region_ids is not None:
+            region_ids = sorted(set(body.region_ids))
+            found = db.query(Region.id).filter(Region.id.in_(region_ids)).count() if region_ids else 0
+            if found != len(region_ids):
+                raise HTTPException(status_code=400, detail="Unknown region id")
+            db.query(UserRegion).filter(UserRegion.user_id == user_db.id).delete(synchronize_session=False)
+            db.add_all([UserRegion(user_id=user_db.id, region_id=region_id) for region_id in region_ids])
         
         db.commit()
         db.refresh(user_db)
@@ -252,7 +285,11 @@ def update_me(
             language=user_db.language or "en",
             sms_alerts=user_db.sms_alerts,
             whatsapp_alerts=user_db.whatsapp_alerts,
+            region_ids=_user_region_ids(db, user_db.id),
         )
+    except HTTPException:
+        db.rollback()
+        raise
     except SQLAlchemyError as e:
         db.rollback()
         logger.error("Database error updating profile: %s", e, exc_info=True)
@@ -263,5 +300,21 @@ def update_me(
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
-
-
+@router.post("/me/location", status_code=202)
+def update_my_location(body: LocationUpdate, payload: dict = Depends(get_current_user), db: Session = Depends(get_db)):
+    """
+    Report the current user's position (citizens only).
+    
+    Buffered in memory and written in bulk every few seconds; only the latest
+    point per user is kept, and the user's location region follows it.
+    """
+    if payload["role"] != "citizen":
+        raise HTTPException(status_code=403, detail="Only citizens can report a location")
+    user_id = payload.get("user_id")
+    if user_id is None:
+        # Tokens issued before the uid claim existed
+        user_id = db.query(User.id).filter(User.phone_number == payload["phone_number"]).scalar()
+        if user_id is None:
+            raise HTTPException(status_code=404, detail="User not found")
+    location_buffer.add(user_id, body.lat, body.lon)
+    return {"accepted": True}
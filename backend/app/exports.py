@@ -0,0 +1,41 @@
+from datetime import datetime
+from typing import Any, Optional
+import logging
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+
+from .auth import require_role
+from .services.export_service import DATASETS, MEDIA_TYPES, export_rows, supports_region_filter
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+
+@router.get("/{dataset}")
+def export_dataset(
+    dataset: str,
+    format: str = Query(default="ndjson", pattern=r"^(ndjson|csv)$"),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    region_id: Optional[int] = None,
+    current_user: Any = Depends(require_role("authority")),
+):
+    """
+    Stream a full export of predictions, alerts or alert_history (authority only).
+    
+    Rows are read with a server-side cursor and written as NDJSON or CSV in
+    chunks; start/end filter on the row timestamp, region_id on the region.
+    """
+    if dataset not in DATASETS:
+        raise HTTPException(status_code=404, detail="Unknown dataset")
+    if region_id is not None and not supports_region_filter(dataset):
+        raise HTTPException(status_code=400, detail=f"region_id filter is not supported for {dataset}")
+
+    logger.info("Export of %s (%s) started by %s", dataset, format, current_user.get("phone_number"))
+    filename = f"{dataset}-{datetime.utcnow():%Y%m%dT%H%M%S}.{format}"
+    return StreamingResponse(
+        export_rows(dataset, format, start=start, end=end, region_id=region_id),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
@@ -29,14 +29,91 @@ from .auth import router as auth_router
 from .prediction import router as prediction_router
 from .alerts import router as alerts_router
 from .admin import router as admin_router
+from .regions import router as regions_router
+from .exports import router as exports_router
+from .metrics import MetricsMiddleware, router as metrics_router
+from .query_stats import QueryStatsMiddleware
+from .profiler import ProfileRequestMiddleware
+from .admission import AdmissionMiddleware
+from .database import SessionLocal
+from .services.alert_broadcaster import alert_broadcaster
+from .services.alert_fanout import fanout_pool
+from .services.delivery_service import receipt_buffer
+from .services.geometry_cache import map_cache
+from .services.invalidation_bus import invalidation_bus
+from .services.json_fragments import alert_fragments, region_fragments
+from .services.location_buffer import location_buffer
+from .services.otp_service import OTP_BACKEND, otp_sender, otp_service
+from .services.region_index import region_index
+from .services.region_locator import region_locator
+from .services.prediction_retention import retention_scheduler
+from .services.prediction_engine import model_registry
+from .services.river_network import river_network
+from .services.state_rollup import state_rollups
+from .services.snapshot_publisher import snapshot_publisher
+
+
+def _load_region_caches() -> None:
+    db = SessionLocal()
+    try:
+        region_index.load(db)
+        region_locator.load(db)
+        river_network.load(db)
+        state_rollups.load(db)
+    except SQLAlchemyError as e:
+        logger.warning("Region caches not loaded: %s", e)
+    finally:
+        db.close()
+
+
+def _on_risk(region_id, payload) -> None:
+    map_cache.update_risk(region_id, payload['level'], payload['score'])
+    state_rollups.update(region_id, payload['level'], payload['score'])
+    if 'local' in payload:
+        # Downstream effects arrive as their own events; this only keeps our upstream state current
+        river_network.update({region_id: payload['local']})
+
+
+def _on_regions(_id, _payload) -> None:
+    _load_region_caches()
+    map_cache.invalidate()
+    region_fragments.clear()
+
+
+def _on_alert(alert_id, payload) -> None:
+    alert_fragments.put(alert_id, payload['alert'])
+    alert_broadcaster.publish(alert_id, payload['alert'], payload['region_ids'])
+
+
+invalidation_bus.subscribe('risk', _on_risk)
+invalidation_bus.subscribe('regions', _on_regions)
+invalidation_bus.subscribe('alert', _on_alert)
+if OTP_BACKEND == 'bus':
+    invalidation_bus.subscribe('otp', otp_service.apply_remote)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Startup and shutdown events."""
     logger.info("Starting AegisFlood API...")
+    _load_region_caches()
+    model_registry.load()
+    receipt_buffer.start()
+    retention_scheduler.start()
+    snapshot_publisher.start()
+    otp_sender.start()
+    location_buffer.start()
+    fanout_pool.start()
+    invalidation_bus.start()
     yield
     logger.info("Shutting down AegisFlood API...")
+    invalidation_bus.stop()
+    fanout_pool.stop()
+    location_buffer.stop()
+    otp_sender.stop()
+    snapshot_publisher.stop()
+    retention_scheduler.stop()
+    receipt_buffer.stop()
 
 
 def create_app() -> FastAPI:
@@ -47,6 +124,13 @@ def create_app() -> FastAPI:
         lifespan=lifespan,
     )
 
+    # Middleware added later wraps the earlier ones
+    app.add_middleware(QueryStatsMiddleware)
+    app.add_middleware(ProfileRequestMiddleware)
+    app.add_middleware(AdmissionMiddleware)
+    # Outside admission control so shed 503s are counted with their route class
+    app.add_middleware(MetricsMiddleware)
+    # Outermost so shed 503s still carry CORS headers and the frontend can read them
     frontend_origin = os.getenv("FRONTEND_ORIGIN", "http://localhost:5173")
     app.add_middleware(
         CORSMiddleware,
@@ -85,6 +169,9 @@ def create_app() -> FastAPI:
     app.include_router(prediction_router, prefix="/predictions", tags=["predictions"])
     app.include_router(alerts_router, prefix="/alerts", tags=["alerts"])
     app.include_router(admin_router, prefix="/dashboard", tags=["dashboard"])
+    app.include_router(regions_router, prefix="/regions", tags=["regions"])
+    app.include_router(exports_router, prefix="/exports", tags=["exports"])
+    app.include_router(metrics_router)
 
     @app.get("/health")
     def health():
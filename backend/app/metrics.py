@@ -0,0 +1,249 @@
+"""
+Lightweight Prometheus-style metrics.
+
+Counters, gauges and histograms keyed by label tuples, rendered in the
+Prometheus text exposition format at /metrics. A pure ASGI middleware
+records per-route latency and status counts; it avoids BaseHTTPMiddleware
+so the per-request overhead stays in the low microseconds
+(see benchmarks/bench_metrics.py).
+"""
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Sequence, Tuple
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import PlainTextResponse
+
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_str(names: Sequence[str], values: Labels, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _fmt(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, labels: Labels = (), amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, labels: Labels = ()) -> float:
+        return self._values.get(labels, 0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return self._header() + [f"{self.name}{_label_str(self.labelnames, k)} {_fmt(v)}" for k, v in items]
+
+
+class Gauge(Counter):
+    type_name = "gauge"
+
+    def dec(self, labels: Labels = (), amount: float = 1) -> None:
+        self.inc(labels, -amount)
+
+    def set(self, value: float, labels: Labels = ()) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts (+Inf last), sum, count]
+        self._values: Dict[Labels, list] = {}
+
+    def observe(self, value: float, labels: Labels = ()) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, labels: Labels = ()):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, labels)
+
+    def count(self, labels: Labels = ()) -> int:
+        state = self._values.get(labels)
+        return state[2] if state else 0
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = [(k, (list(v[0]), v[1], v[2])) for k, v in self._values.items()]
+        lines = self._header()
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = f'le="{_fmt(bound)}"'
+                lines.append(f"{self.name}_bucket{_label_str(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_label_str(self.labelnames, labels)} {_fmt(total)}")
+            lines.append(f"{self.name}_count{_label_str(self.labelnames, labels)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.counter("http_requests_total", "HTTP requests by route and status", ("method", "route", "status"))
+HTTP_LATENCY = REGISTRY.histogram("http_request_duration_seconds", "HTTP request latency by route", ("method", "route"))
+HTTP_IN_PROGRESS = REGISTRY.gauge("http_requests_in_progress", "HTTP requests currently being served")
+
+ALERTS_CREATED = REGISTRY.counter("alerts_created_total", "Alerts accepted by POST /alerts", ("kind",))
+ALERT_FANOUT_SECONDS = REGISTRY.histogram(
+    "alert_fanout_duration_seconds", "Time to fan one alert out to all recipients",
+    buckets=(0.1, 0.5, 1, 5, 10, 30, 60, 300, 900, 1800),
+)
+ALERT_FANOUT_RECIPIENTS = REGISTRY.counter("alert_fanout_recipients_total", "Recipients processed by alert fan-out", ("result",))
+ALERT_FANOUT_PARTITIONS = REGISTRY.counter("alert_fanout_partitions_total", "Fan-out partitions run on the sender process pool", ("result",))
+NOTIFICATIONS_SENT = REGISTRY.counter("notifications_sent_total", "Provider send attempts", ("channel", "result"))
+NOTIFICATION_SEND_SECONDS = REGISTRY.histogram(
+    "notification_send_duration_seconds", "Provider send latency", ("channel",),
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+PREDICTIONS = REGISTRY.counter("predictions_total", "Predictions generated by risk level", ("risk_level",))
+PREDICTION_SECONDS = REGISTRY.histogram("prediction_duration_seconds", "get_prediction time including the DB write")
+MODEL_INFERENCE_SECONDS = REGISTRY.histogram(
+    "model_inference_duration_seconds", "Batch inference time per model", ("model",),
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0),
+)
+
+ADMISSION_IN_FLIGHT = REGISTRY.gauge("admission_in_flight", "Admitted requests in progress by priority class", ("class",))
+ADMISSION_QUEUE_DEPTH = REGISTRY.gauge("admission_queue_depth", "Requests waiting for admission by priority class", ("class",))
+ADMISSION_SHED = REGISTRY.counter("admission_shed_total", "Requests rejected with 503 by admission control", ("class", "reason"))
+ADMISSION_WAIT_SECONDS = REGISTRY.histogram(
+    "admission_wait_seconds", "Time queued before admission or shedding", ("class",),
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+
+INVALIDATION_EVENTS = REGISTRY.counter("invalidation_events_total", "Cache invalidation events by direction (published, received, rejected)", ("direction",))
+INVALIDATION_LAG_SECONDS = REGISTRY.histogram(
+    "invalidation_lag_seconds", "Delay from publishing an invalidation to another worker receiving it",
+    buckets=(0.0005, 0.001, 0.002, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1.0),
+)
+
+OTP_EVENTS = REGISTRY.counter("otp_events_total", "OTP issue and verification outcomes", ("event",))
+OTP_SEND_BATCH = REGISTRY.histogram(
+    "otp_send_batch_size", "OTP messages handed to the SMS provider per sender pass",
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500),
+)
+
+LOCATION_PINGS = REGISTRY.counter("location_pings_total", "Location pings accepted, by whether they replaced a pending one", ("result",))
+LOCATION_REGION_CHANGES = REGISTRY.counter("location_region_changes_total", "Users whose reported location moved to another region")
+
+JSON_FRAGMENTS = REGISTRY.counter("json_fragment_lookups_total", "Pre-serialized row lookups by list endpoints", ("cache", "result"))
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording latency and status per route template."""
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        HTTP_IN_PROGRESS.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            HTTP_IN_PROGRESS.dec()
+            # Route template (e.g. /predictions/{region_id}) keeps label cardinality bounded
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            method = scope["method"]
+            HTTP_REQUESTS.inc((method, path, str(status[0])))
+            HTTP_LATENCY.observe(elapsed, (method, path))
+
+
+router = APIRouter()
+
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def metrics(request: Request):
+    """Prometheus text exposition of all registered metrics."""
+    if METRICS_TOKEN and request.headers.get("authorization") != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
@@ -1,7 +1,7 @@
 from sqlalchemy import Column, Integer, String, Date, DateTime, ForeignKey, Boolean, JSON, Text
-from sqlalchemy import Float
+from sqlalchemy import Float, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func, true
 
 from .database import Base
 
@@ -14,6 +14,8 @@ class User(Base):
     name = Column(String(255), nullable=True)
     location_lat = Column(Float, nullable=True)
     location_lon = Column(Float, nullable=True)
+    # Region containing the last reported location; kept current by the location buffer
+    location_region_id = Column(Integer, ForeignKey("regions.id"), nullable=True, index=True)
     language = Column(String(10), nullable=False, default='en')
     role = Column(String(20), nullable=False, default='citizen')  # citizen, authority
     sms_alerts = Column(Boolean, nullable=False, default=True)
@@ -22,6 +24,17 @@ class User(Base):
     created_at = Column(DateTime, server_default=func.now(), nullable=False)
 
 
+class UserRegion(Base):
+    """Regions a citizen lives in or follows; used to target multi-region alerts."""
+    __tablename__ = "user_regions"
+    __table_args__ = (
+        Index("ix_user_regions_region_user", "region_id", "user_id"),
+    )
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    region_id = Column(Integer, ForeignKey("regions.id"), primary_key=True)
+
+
 class Region(Base):
     __tablename__ = "regions"
 
@@ -35,8 +48,24 @@ class Region(Base):
     predictions = relationship("FloodPrediction", back_populates="region")
 
 
+class RiverLink(Base):
+    """Directed river-basin edge: flood risk flows from upstream to downstream region."""
+    __tablename__ = "river_links"
+    __table_args__ = (
+        Index("ix_river_links_downstream", "downstream_region_id"),
+    )
+
+    upstream_region_id = Column(Integer, ForeignKey("regions.id"), primary_key=True)
+    downstream_region_id = Column(Integer, ForeignKey("regions.id"), primary_key=True)
+    travel_hours = Column(Float, nullable=False)
+
+
 class FloodPrediction(Base):
     __tablename__ = "flood_predictions"
+    __table_args__ = (
+        Index("ix_flood_predictions_region_created", "region_id", "created_at"),
+        Index("ix_flood_predictions_created", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     region_id = Column(Integer, ForeignKey("regions.id"), nullable=False)
@@ -49,28 +78,89 @@ class FloodPrediction(Base):
     region = relationship("Region", back_populates="predictions")
 
 
+class PredictionRollup(Base):
+    """Per-region hourly/daily aggregates of flood_predictions, kept after raw rows are pruned."""
+    __tablename__ = "prediction_rollups"
+    __table_args__ = (
+        UniqueConstraint("region_id", "granularity", "bucket_start", name="uq_prediction_rollup_bucket"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    region_id = Column(Integer, ForeignKey("regions.id"), nullable=False)
+    granularity = Column(String(10), nullable=False)  # hour, day
+    bucket_start = Column(DateTime, nullable=False)
+    count = Column(Integer, nullable=False, default=0)
+    min_score = Column(Integer, nullable=False)
+    max_score = Column(Integer, nullable=False)
+    sum_score = Column(Integer, nullable=False, default=0)
+    peak_level = Column(String(20), nullable=False)
+
+
+class MaintenanceState(Base):
+    """Checkpoints for background maintenance jobs (e.g. the rollup watermark)."""
+    __tablename__ = "maintenance_state"
+
+    key = Column(String(64), primary_key=True)
+    value = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now(), nullable=False)
+
+
 class Alert(Base):
     __tablename__ = "alerts"
+    __table_args__ = (
+        Index("ix_alerts_created", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     region = Column(String(255), nullable=False)
     message = Column(Text, nullable=False)
     risk_level = Column(String(20), nullable=False)  # low, medium, high, critical
     created_by = Column(String(100), nullable=True)
+    idempotency_key = Column(String(64), nullable=True, unique=True)
     created_at = Column(DateTime, server_default=func.now(), nullable=False)
 
 
+class AlertRegion(Base):
+    """Regions an alert targets; lets coalescing find recent alerts per region across workers."""
+    __tablename__ = "alert_regions"
+    __table_args__ = (
+        Index("ix_alert_regions_region_alert", "region_id", "alert_id"),
+    )
+
+    alert_id = Column(Integer, ForeignKey("alerts.id"), primary_key=True)
+    region_id = Column(Integer, ForeignKey("regions.id"), primary_key=True)
+
+
 class AlertHistory(Base):
     __tablename__ = "alert_history"
+    __table_args__ = (
+        Index("ix_alert_history_region_sent", "region_id", "sent_at"),
+        Index("ix_alert_history_sent", "sent_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     region_id = Column(Integer, ForeignKey("regions.id"), nullable=False)
     message = Column(String, nullable=False)
     risk_level = Column(String(20), nullable=True)
     sent_to_count = Column(Integer, nullable=False, default=0)
+    # False when fan-out partitions still failed after their retries
+    fanout_complete = Column(Boolean, nullable=False, default=True, server_default=true())
     sent_at = Column(DateTime, server_default=func.now(), nullable=False)
     created_by = Column(String(100), nullable=True)
 
 
+class AlertDelivery(Base):
+    __tablename__ = "alert_deliveries"
+    __table_args__ = (
+        UniqueConstraint("alert_id", "user_id", "channel", name="uq_alert_delivery_recipient"),
+        Index("ix_alert_deliveries_alert_status", "alert_id", "status"),
+    )
 
-
+    id = Column(Integer, primary_key=True, index=True)
+    alert_id = Column(Integer, ForeignKey("alerts.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    channel = Column(String(20), nullable=False)  # sms, whatsapp
+    status = Column(String(20), nullable=False, default='queued')  # queued, sent, delivered, failed
+    provider_message_id = Column(String(64), nullable=True, index=True)
+    created_at = Column(DateTime, server_default=func.now(), nullable=False)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now(), nullable=False)
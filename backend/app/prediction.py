@@ -1,50 +1,161 @@
-import random
+import time
 import logging
-from datetime import date, timedelta
-from typing import Dict
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import func, insert
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
 
 from .database import get_db
-from .models import FloodPrediction, Region
-from .schemas import PredictionResponse
+from .models import FloodPrediction, PredictionRollup, Region
+from .schemas import PredictionBatchRequest, PredictionResponse, PredictionHistoryResponse, PredictionTrendPoint
+from .services.geometry_cache import map_cache
+from .services.invalidation_bus import invalidation_bus
+from .services.alert_coalescer import RISK_RANK
+from .services.prediction_engine import feature_cache, model_registry, risk_level_for
+from .services.prediction_retention import merge_bucket, pending_buckets
+from .services.river_network import river_network
+from .services.snapshot_publisher import snapshot_publisher
+from .services.state_rollup import state_rollups
+from .metrics import PREDICTIONS, PREDICTION_SECONDS
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
 
-class SimplePredictionEngine:
+def _publish_risk(region_id: int, risk_level: str, risk_score: int) -> None:
+    """Push a region's new latest risk into the in-memory dashboard views."""
+    map_cache.update_risk(region_id, risk_level, risk_score)
+    state_rollups.update(region_id, risk_level, risk_score)
+    snapshot_publisher.mark_dirty()
+
+
+def _with_upstream(local_level: str, local_score: int, upstream_score: int):
+    """Stored (level, score): the upstream score wins when larger, and never lowers the model's level."""
+    if upstream_score <= local_score:
+        return local_level, local_score
+    propagated_level = risk_level_for(upstream_score)
+    if RISK_RANK[propagated_level] > RISK_RANK[local_level]:
+        return propagated_level, upstream_score
+    return local_level, upstream_score
+
+
+def _downstream_rows(db: Session, changed: Dict[int, float]) -> List[Dict]:
+    """
+    New prediction rows for regions whose upstream risk changed without being scored.
+
+    The model's own level and score are taken from the region's latest stored
+    prediction and recombined with the new upstream score. Regions whose
+    stored result would not change get no row.
     """
-    Simple rule-based flood prediction engine (MVP).
+    latest = (
+        db.query(FloodPrediction.region_id, func.max(FloodPrediction.id).label("latest_id"))
+        .filter(FloodPrediction.region_id.in_(list(changed)))
+        .group_by(FloodPrediction.region_id)
+        .subquery()
+    )
+    previous = {
+        region_id: (level, score, weather or {})
+        for region_id, level, score, weather in db.query(
+            FloodPrediction.region_id, FloodPrediction.risk_level, FloodPrediction.risk_score, FloodPrediction.weather_data
+        ).join(latest, FloodPrediction.id == latest.c.latest_id)
+    }
+    rows = []
+    for region_id, effective in changed.items():
+        level, score, weather = previous.get(region_id, (None, None, {}))
+        local_score = weather.get('local_score', score if score is not None else 0)
+        # Rows written before local_level was recorded hold the model's level when no upstream risk was added
+        local_level = weather.get('local_level') or (level if score == local_score else risk_level_for(local_score))
+        upstream_score = int(round(effective))
+        risk_level, risk_score = _with_upstream(local_level, local_score, upstream_score)
+        if (risk_level, risk_score) == (level, score):
+            continue
+        rows.append({
+            'region_id': region_id,
+            'risk_level': risk_level,
+            'risk_score': risk_score,
+            'weather_data': {
+                **{k: v for k, v in weather.items() if k != 'inference_ms'},
+                'local_score': local_score,
+                'local_level': local_level,
+                'upstream_score': upstream_score,
+                'propagated': True,
+            },
+        })
+    return rows
+
+
+def predict_regions(db: Session, region_ids: List[int]) -> List[Dict]:
+    """
+    Score regions in one batch per serving model and store the predictions.
     
-    Uses rainfall data to calculate risk levels:
-    - High: >100mm rainfall
-    - Medium: 50-100mm rainfall
-    - Low: <50mm rainfall
+    Model scores are propagated down the river network; a region's stored
+    score is the larger of its own and its attenuated upstream risk. Regions
+    downstream of the batch whose upstream risk changed get a stored
+    prediction too, so every view reads the same latest risk.
+    Callers must have checked that the regions exist. Commits the session.
     """
-    def predict_flood_risk(self, region_id: int, weather_data: Dict) -> Dict:
-        rainfall_24h = weather_data.get('rainfall_24h', random.uniform(0, 150))
-        if rainfall_24h > 100:
-            risk_level = 'high'
-            risk_score = min(90, 60 + int(rainfall_24h - 100))
-        elif rainfall_24h > 50:
-            risk_level = 'medium'
-            risk_score = 30 + int(rainfall_24h - 50)
-        else:
-            risk_level = 'low'
-            risk_score = max(10, int(rainfall_24h))
-        return {
+    features = feature_cache.get_many(region_ids)
+    scored = model_registry.predict(features)
+    local_scores = {r: scored[r]['risk_score'] for r in region_ids}
+    # Applied to the in-memory network only after the commit, so a failed write leaves it untouched
+    changed = river_network.preview(local_scores)
+    predictions = []
+    rows = []
+    for region_id in region_ids:
+        result = scored[region_id]
+        local_score = result['risk_score']
+        upstream_score = int(round(changed.get(region_id, river_network.effective(region_id, local_score))))
+        risk_level, risk_score = _with_upstream(result['risk_level'], local_score, upstream_score)
+        weather_data = {
+            **features[region_id],
+            'model': result['model'],
+            'inference_ms': result['inference_ms'],
+            'local_score': local_score,
+            'local_level': result['risk_level'],
+        }
+        rows.append({
+            'region_id': region_id,
+            'risk_level': risk_level,
+            'risk_score': risk_score,
+            'weather_data': weather_data,
+        })
+        predictions.append({
             'region_id': region_id,
             'risk_level': risk_level,
             'risk_score': risk_score,
             'factors': {
-                'rainfall_24h': rainfall_24h,
-                'prediction_method': 'simple_rules'
+                **features[region_id],
+                'local_score': local_score,
+                'upstream_score': upstream_score,
+                'prediction_method': result['model'],
             },
-            'valid_until': date.today() + timedelta(days=1)
-        }
+            'valid_until': date.today() + timedelta(days=1),
+        })
+    batch = set(region_ids)
+    downstream = {r: score for r, score in changed.items() if r not in batch}
+    propagated = _downstream_rows(db, downstream) if downstream else []
+    # One executemany for the whole batch instead of a flush per ORM object
+    db.execute(insert(FloodPrediction), rows + propagated)
+    db.commit()
+    river_network.update(local_scores)
+    events = []
+    for p in predictions:
+        _publish_risk(p['region_id'], p['risk_level'], p['risk_score'])
+        PREDICTIONS.inc((p['risk_level'],))
+        events.append(('risk', p['region_id'], {
+            'level': p['risk_level'],
+            'score': p['risk_score'],
+            'local': p['factors']['local_score'],
+        }))
+    # Downstream regions are published only once their new risk is stored
+    for row in propagated:
+        _publish_risk(row['region_id'], row['risk_level'], row['risk_score'])
+        events.append(('risk', row['region_id'], {'level': row['risk_level'], 'score': row['risk_score']}))
+    invalidation_bus.publish_many(events)
+    return predictions
 
 
 @router.get("/{region_id}", response_model=PredictionResponse)
@@ -52,28 +163,16 @@ def get_prediction(region_id: int, db: Session = Depends(get_db)):
     """
     Get flood prediction for a specific region.
     
-    Generates a new prediction using simple rule-based engine and stores it.
+    Scores the region with the serving model from the registry and stores it.
     """
+    start = time.perf_counter()
     try:
-        region = db.query(Region).filter(Region.id == region_id).one_or_none()
+        region = db.query(Region.id).filter(Region.id == region_id).one_or_none()
         if region is None:
             raise HTTPException(status_code=404, detail="Region not found")
 
-        engine = SimplePredictionEngine()
-        weather_data = {
-            'rainfall_24h': random.uniform(0, 150),
-            'temperature': random.uniform(20, 35)
-        }
-        prediction = engine.predict_flood_risk(region_id, weather_data)
-
-        db_prediction = FloodPrediction(
-            region_id=region_id,
-            risk_level=prediction['risk_level'],
-            risk_score=prediction['risk_score'],
-            weather_data=weather_data,
-        )
-        db.add(db_prediction)
-        db.commit()
+        prediction = predict_regions(db, [region_id])[0]
+        PREDICTION_SECONDS.observe(time.perf_counter() - start)
         logger.info("Prediction created for region %s: %s (score: %d)", region_id, prediction['risk_level'], prediction['risk_score'])
         return prediction
     except HTTPException:
@@ -88,6 +187,80 @@ def get_prediction(region_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
+@router.post("/batch", response_model=List[PredictionResponse])
+def get_predictions_batch(req: PredictionBatchRequest, db: Session = Depends(get_db)):
+    """
+    Score several regions in one batched inference call.
+    
+    Unknown region ids are skipped; results follow the order of the request.
+    """
+    try:
+        wanted = list(dict.fromkeys(req.region_ids))
+        known = {r for (r,) in db.query(Region.id).filter(Region.id.in_(wanted))}
+        region_ids = [r for r in wanted if r in known]
+        if not region_ids:
+            return []
+        return predict_regions(db, region_ids)
+    except SQLAlchemyError as e:
+        db.rollback()
+        logger.error("Database error creating batch predictions: %s", e, exc_info=True)
+        raise HTTPException(status_code=500, detail="Failed to create predictions")
+
+
+@router.get("/{region_id}/history", response_model=PredictionHistoryResponse)
+def get_prediction_history(
+    region_id: int,
+    granularity: str = Query(default="day", pattern=r"^(hour|day)$"),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    db: Session = Depends(get_db),
+):
+    """
+    Risk trend for a region from the hourly/daily rollups.
+    
+    Defaults to the last 48 hours (hour) or 90 days (day). Predictions the
+    retention job has not folded in yet are aggregated from the raw rows
+    above its watermark, so the latest buckets are current.
+    """
+    try:
+        end = end or datetime.utcnow()
+        if start is None:
+            start = end - (timedelta(hours=48) if granularity == "hour" else timedelta(days=90))
+        rows = (
+            db.query(PredictionRollup)
+            .filter(
+                PredictionRollup.region_id == region_id,
+                PredictionRollup.granularity == granularity,
+                PredictionRollup.bucket_start >= start,
+                PredictionRollup.bucket_start < end,
+            )
+            .order_by(PredictionRollup.bucket_start)
+            .limit(5000)
+            .all()
+        )
+        buckets = {r.bucket_start: [r.count, r.min_score, r.max_score, r.sum_score, r.peak_level] for r in rows}
+        for key, pending in pending_buckets(db, region_id, granularity, start, end).items():
+            buckets[key] = merge_bucket(buckets[key], pending) if key in buckets else pending
+        return PredictionHistoryResponse(
+            region_id=region_id,
+            granularity=granularity,
+            points=[
+                PredictionTrendPoint(
+                    bucket_start=key,
+                    count=count,
+                    min_score=low,
+                    max_score=high,
+                    mean_score=round(total / count, 2) if count else 0.0,
+                    peak_level=peak,
+                )
+                for key, (count, low, high, total, peak) in sorted(buckets.items())
+            ],
+        )
+    except SQLAlchemyError as e:
+        logger.error("Database error fetching prediction history: %s", e, exc_info=True)
+        raise HTTPException(status_code=500, detail="Failed to fetch prediction history")
+
+
 @router.get("/location")
 def get_prediction_by_location(lat: float, lon: float, db: Session = Depends(get_db)):
     """
@@ -0,0 +1,201 @@
+"""
+Sampling profiler for live workers.
+
+A daemon thread snapshots every thread's stack via sys._current_frames()
+at a fixed interval and folds the samples into collapsed stacks
+("thread;module:func;module:func count"), the input format of
+flamegraph.pl, speedscope and inferno. Nothing is hooked into the
+interpreter, so the cost is one stack walk per thread per sample and is
+paid only while a profile is running.
+
+Two entry points: GET /dashboard/debug/profile?seconds=N profiles the whole
+process for a window, and a request carrying the X-Profile header (set to
+PROFILE_REQUEST_TOKEN) starts a profile that lasts as long as that request,
+up to PROFILE_MAX_SECONDS; the result is kept in memory and its id returned
+in the X-Profile-Id response header.
+
+Both profiles are worker-wide. Handlers run on the event loop or hop to a
+threadpool thread, so a request is not pinned to one thread id and stacks
+from concurrent requests on the same worker land in the same profile. Each
+stack is rooted at its thread name, and responses carry X-Profile-Scope:
+worker so the output is not mistaken for a single request's cost; profile
+an otherwise idle worker when the numbers matter.
+"""
+import asyncio
+import hmac
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PROFILE_MAX_SECONDS = float(os.getenv('PROFILE_MAX_SECONDS', '60'))
+PROFILE_INTERVAL_MS = float(os.getenv('PROFILE_INTERVAL_MS', '5'))
+# Unset: per-request profiling is disabled
+PROFILE_REQUEST_TOKEN = os.getenv('PROFILE_REQUEST_TOKEN')
+_MAX_STORED_PROFILES = 32
+PROFILE_SCOPE = "worker"
+
+# Leaf frames that mean a thread is parked rather than doing work
+_IDLE_FILES = ('threading.py', 'selectors.py', 'queue.py')
+_IDLE_FUNCTIONS = frozenset({'wait', 'select', 'poll', 'accept'})
+
+
+class ProfilerBusy(RuntimeError):
+    """Raised when a profile is requested while another one is running."""
+
+
+def _frame_label(code) -> str:
+    module = os.path.splitext(os.path.basename(code.co_filename))[0]
+    return f"{module}:{code.co_name}"
+
+
+def _is_idle(frame) -> bool:
+    code = frame.f_code
+    return code.co_filename.endswith(_IDLE_FILES) or code.co_name in _IDLE_FUNCTIONS
+
+
+class SamplingProfiler:
+    def __init__(self, interval: float = PROFILE_INTERVAL_MS / 1000, include_idle: bool = False):
+        self.interval = interval
+        self.include_idle = include_idle
+        self.samples = 0
+        # Thread ids never sampled (e.g. the thread sleeping in profile_for)
+        self.exclude = set()
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own or ident in self.exclude or (not self.include_idle and _is_idle(frame)):
+                    continue
+                labels = []
+                while frame is not None:
+                    labels.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                labels.append(names.get(ident, f"thread-{ident}"))
+                self.stacks[";".join(reversed(labels))] += 1
+            self.samples += 1
+
+    def collapsed(self) -> str:
+        """Collapsed-stack text, heaviest stacks first."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+# One profile at a time: concurrent samplers would double the overhead and skew each other
+_active = threading.Lock()
+_stored: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+_stored_lock = threading.Lock()
+
+
+def profile_for(seconds: float, interval: float = PROFILE_INTERVAL_MS / 1000, include_idle: bool = False) -> SamplingProfiler:
+    """Sample all threads for `seconds` and return the finished profiler."""
+    if not _active.acquire(blocking=False):
+        raise ProfilerBusy("A profile is already running")
+    try:
+        profiler = SamplingProfiler(interval, include_idle)
+        profiler.exclude.add(threading.get_ident())
+        profiler.start()
+        time.sleep(min(seconds, PROFILE_MAX_SECONDS))
+        profiler.stop()
+        return profiler
+    finally:
+        _active.release()
+
+
+def stored_profile(profile_id: str) -> Optional[str]:
+    with _stored_lock:
+        entry = _stored.get(profile_id)
+    return entry[1] if entry else None
+
+
+def _store(collapsed: str, profile_id: Optional[str] = None) -> str:
+    """Store (or replace) a profile, keeping at most _MAX_STORED_PROFILES."""
+    profile_id = profile_id or uuid.uuid4().hex
+    with _stored_lock:
+        _stored[profile_id] = (time.time(), collapsed)
+        _stored.move_to_end(profile_id)
+        while len(_stored) > _MAX_STORED_PROFILES:
+            _stored.popitem(last=False)
+    return profile_id
+
+
+class ProfileRequestMiddleware:
+    """
+    Pure ASGI middleware profiling the worker for the lifetime of a request
+    that carries a valid X-Profile header.
+
+    Sampling stops after PROFILE_MAX_SECONDS even if the response is still
+    streaming (SSE, exports), so a long-lived stream cannot hold the
+    profiler and block every other profile until the client disconnects.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not PROFILE_REQUEST_TOKEN:
+            await self.app(scope, receive, send)
+            return
+        headers: Dict[bytes, bytes] = dict(scope.get("headers", []))
+        if not hmac.compare_digest(headers.get(b"x-profile", b""), PROFILE_REQUEST_TOKEN.encode()):
+            await self.app(scope, receive, send)
+            return
+        if not _active.acquire(blocking=False):
+            logger.info("Per-request profile skipped: another profile is running")
+            await self.app(scope, receive, send)
+            return
+
+        profiler = SamplingProfiler()
+        profile_id = _store("")
+        profiler.start()
+        finished = False
+
+        def finish(capped: bool) -> None:
+            nonlocal finished
+            if finished:
+                return
+            finished = True
+            profiler.stop()
+            _active.release()
+            _store(profiler.collapsed(), profile_id)
+            logger.info(
+                "Profiled worker during %s %s: %d samples (id %s)%s", scope["method"], scope["path"],
+                profiler.samples, profile_id, f", capped at {PROFILE_MAX_SECONDS:g}s" if capped else "",
+            )
+
+        timer = asyncio.get_running_loop().call_later(PROFILE_MAX_SECONDS, finish, True)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": list(message.get("headers", [])) + [
+                    (b"x-profile-id", profile_id.encode()),
+                    (b"x-profile-scope", PROFILE_SCOPE.encode()),
+                ]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            timer.cancel()
+            finish(False)
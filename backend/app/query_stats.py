@@ -0,0 +1,184 @@
+"""
+Per-request SQL instrumentation.
+
+Engine event hooks time every statement and attribute it to the request
+being served (via a context variable, which Starlette copies into the
+threadpool that runs sync endpoints). Each response carries a
+Server-Timing header with the statement count and DB time; slow statements
+are logged, and a statement shape repeated N times within one request is
+logged as a likely N+1 pattern. INSERTs are left out of that check: a
+flush of several new objects issues one per row (or one executemany) by
+design, which is not a lookup loop.
+
+Tests can pin an endpoint's query budget with:
+
+    with assert_max_queries(2):
+        client.get("/dashboard/regions", headers=headers)
+"""
+import logging
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+SQL_INSTRUMENTATION_ENABLED = os.getenv('SQL_INSTRUMENTATION_ENABLED', 'true').lower() == 'true'
+SQL_SLOW_QUERY_MS = float(os.getenv('SQL_SLOW_QUERY_MS', '200'))
+SQL_SLOW_REQUEST_MS = float(os.getenv('SQL_SLOW_REQUEST_MS', '1000'))
+SQL_N_PLUS_ONE_THRESHOLD = int(os.getenv('SQL_N_PLUS_ONE_THRESHOLD', '5'))
+
+# Expanded IN lists and multi-row VALUES differ only in placeholder count
+_PLACEHOLDER_LIST = re.compile(r"\((?:\s*(?:\?|%\(\w+\)s|%s|:\w+)\s*,)+\s*(?:\?|%\(\w+\)s|%s|:\w+)\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def _is_insert(statement: str) -> bool:
+    return statement.lstrip()[:6].upper() == 'INSERT'
+
+
+def statement_shape(statement: str) -> str:
+    """Normalize a statement so repeats differing only in bound values compare equal."""
+    return _PLACEHOLDER_LIST.sub("(?)", _WHITESPACE.sub(" ", statement).strip())
+
+
+class QueryStats:
+    """Statements executed on behalf of one request (or one capture block)."""
+    __slots__ = ('count', 'duration', 'shapes', 'statements', 'keep_statements')
+
+    def __init__(self, keep_statements: bool = False):
+        self.count = 0
+        self.duration = 0.0
+        self.shapes: Dict[str, int] = {}
+        self.statements: List[str] = []
+        self.keep_statements = keep_statements
+
+    def record(self, statement: str, elapsed: float, executemany: bool = False) -> None:
+        self.count += 1
+        self.duration += elapsed
+        if not executemany and not _is_insert(statement):
+            shape = statement_shape(statement)
+            self.shapes[shape] = self.shapes.get(shape, 0) + 1
+        if self.keep_statements:
+            self.statements.append(statement)
+
+    def repeated(self, threshold: int = SQL_N_PLUS_ONE_THRESHOLD) -> Dict[str, int]:
+        return {shape: n for shape, n in self.shapes.items() if n >= threshold}
+
+    def server_timing(self) -> str:
+        return f'db;dur={self.duration * 1000:.1f};desc="{self.count} queries"'
+
+
+_current: ContextVar[Optional[QueryStats]] = ContextVar('query_stats', default=None)
+# Active assert_max_queries()/capture_queries() blocks; they see statements from every thread
+_captures: List[QueryStats] = []
+_captures_lock = threading.Lock()
+
+
+def current_stats() -> Optional[QueryStats]:
+    return _current.get()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('query_start')
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    stats = _current.get()
+    if stats is not None:
+        stats.record(statement, elapsed, executemany)
+    if _captures:
+        with _captures_lock:
+            for capture in _captures:
+                capture.record(statement, elapsed, executemany)
+    if elapsed * 1000 >= SQL_SLOW_QUERY_MS:
+        logger.warning("Slow query (%.1f ms): %s", elapsed * 1000, _WHITESPACE.sub(" ", statement)[:500])
+
+
+def _handle_error(exception_context):
+    starts = exception_context.connection.info.get('query_start') if exception_context.connection else None
+    if starts:
+        starts.pop()
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Attach the timing hooks to `engine` (idempotent)."""
+    if event.contains(engine, 'before_cursor_execute', _before_cursor_execute):
+        return
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(engine, 'handle_error', _handle_error)
+
+
+class QueryStatsMiddleware:
+    """Pure ASGI middleware that collects QueryStats per request and adds a Server-Timing header."""
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not SQL_INSTRUMENTATION_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                total = (time.perf_counter() - start) * 1000
+                headers = list(message.get("headers", []))
+                timing = f'{stats.server_timing()}, app;dur={total:.1f}'
+                headers.append((b"server-timing", timing.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            self._report(scope, stats, (time.perf_counter() - start) * 1000)
+
+    @staticmethod
+    def _report(scope, stats: QueryStats, total_ms: float) -> None:
+        route = getattr(scope.get("route"), "path", None) or scope.get("path", "")
+        for shape, n in stats.repeated().items():
+            logger.warning("Possible N+1 on %s %s: %d x %s", scope["method"], route, n, shape[:300])
+        if stats.duration * 1000 >= SQL_SLOW_REQUEST_MS:
+            logger.warning(
+                "Slow DB time on %s %s: %d queries, %.1f ms (request %.1f ms)",
+                scope["method"], route, stats.count, stats.duration * 1000, total_ms,
+            )
+
+
+@contextmanager
+def capture_queries():
+    """Collect every statement executed (from any thread) while the block runs."""
+    stats = QueryStats(keep_statements=True)
+    with _captures_lock:
+        _captures.append(stats)
+    try:
+        yield stats
+    finally:
+        with _captures_lock:
+            _captures.remove(stats)
+
+
+@contextmanager
+def assert_max_queries(expected: int):
+    """Fail if the block executes more than `expected` statements."""
+    with capture_queries() as stats:
+        yield stats
+    if stats.count > expected:
+        listing = "\n".join(f"  {i + 1}. {s}" for i, s in enumerate(stats.statements))
+        raise AssertionError(f"Expected at most {expected} queries, got {stats.count}:\n{listing}")
@@ -0,0 +1,29 @@
+import logging
+
+from fastapi import APIRouter, Query
+
+from .schemas import RegionSearchResult
+from .services.region_index import region_index
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+
+@router.get("/search", response_model=list[RegionSearchResult])
+def search_regions(
+    q: str = Query(..., min_length=1, max_length=100),
+    state: str | None = Query(default=None, max_length=100),
+    limit: int = 10,
+):
+    """
+    Typeahead search over region names.
+    
+    Served from the in-memory region index (no DB access). Accepts
+    "Name, State" or a separate state filter to disambiguate.
+    """
+    if limit > 50:
+        limit = 50  # Cap at 50
+    return [
+        RegionSearchResult(id=e.id, name=e.name, state=e.state, population=e.population)
+        for e in region_index.search(q, state=state, limit=limit)
+    ]
@@ -1,6 +1,6 @@
 from datetime import date, datetime
 from typing import Optional, List, Dict
-from pydantic import BaseModel, Field, constr, conint, model_serializer
+from pydantic import BaseModel, Field, confloat, constr, conint, model_serializer
 
 
 PhoneNumberStr = constr(min_length=8, max_length=15)
@@ -38,6 +38,7 @@ class UserMeResponse(BaseModel):
     language: str = "en"
     sms_alerts: bool = True
     whatsapp_alerts: bool = False
+    region_ids: List[int] = []
 
 
 class UserMeUpdate(BaseModel):
@@ -45,6 +46,12 @@ class UserMeUpdate(BaseModel):
     language: Optional[str] = Field(default=None, pattern=r"^[a-z]{2}(-[A-Z]{2})?$")
     sms_alerts: Optional[bool] = None
     whatsapp_alerts: Optional[bool] = None
+    region_ids: Optional[List[int]] = Field(default=None, max_length=20)
+
+
+class LocationUpdate(BaseModel):
+    lat: confloat(ge=-90, le=90)
+    lon: confloat(ge=-180, le=180)
 
 
 class PredictionResponse(BaseModel):
@@ -55,12 +62,37 @@ class PredictionResponse(BaseModel):
     valid_until: date
 
 
+class PredictionBatchRequest(BaseModel):
+    region_ids: List[int] = Field(..., min_length=1, max_length=500)
+
+
+class PredictionTrendPoint(BaseModel):
+    bucket_start: datetime
+    count: int
+    min_score: int
+    max_score: int
+    mean_score: float
+    peak_level: str
+
+
+class PredictionHistoryResponse(BaseModel):
+    region_id: int
+    granularity: str
+    points: List[PredictionTrendPoint]
+
+
 class AlertCreate(BaseModel):
     region: str
     message: constr(min_length=1, max_length=500)
     risk_level: str = Field(..., pattern=r"^(low|medium|high|critical)$")
 
 
+class MultiRegionAlertCreate(BaseModel):
+    region_ids: List[int] = Field(..., min_length=1, max_length=200)
+    message: constr(min_length=1, max_length=500)
+    risk_level: str = Field(..., pattern=r"^(low|medium|high|critical)$")
+
+
 class AlertResponse(BaseModel):
     id: int
     region: str
@@ -112,11 +144,43 @@ class RegionSummary(BaseModel):
     latest_risk_score: Optional[int] = None
 
 
+class RegionSearchResult(BaseModel):
+    id: int
+    name: str
+    state: Optional[str] = None
+    population: Optional[int] = None
+
+
 class DashboardStats(BaseModel):
     total_users: int
     total_regions: int
     alerts_sent_24h: int
 
 
+class StateRiskSummary(BaseModel):
+    state: str
+    region_count: int
+    low: int = 0
+    medium: int = 0
+    high: int = 0
+    critical: int = 0
+    unscored: int = 0
+    population_at_risk: int = 0
+    max_score: Optional[int] = None
+
 
+class DeliverySummary(BaseModel):
+    alert_id: int
+    queued: int = 0
+    sent: int = 0
+    delivered: int = 0
+    failed: int = 0
+    total: int = 0
 
+
+class DeliveryRecordItem(BaseModel):
+    user_id: int
+    phone_number: str
+    channel: str
+    status: str
+    provider_message_id: Optional[str] = None
@@ -0,0 +1,122 @@
+"""
+In-process pub/sub for pushing new alerts to connected clients (SSE).
+
+create_alert publishes from a threadpool worker; the event is serialized
+once into an SSE frame and handed to the event loop in a single
+call_soon_threadsafe, which then enqueues the same bytes for every matching
+subscriber. Subscribers are indexed by region so a region-scoped client
+costs nothing for other regions' alerts, and a short replay buffer serves
+Last-Event-ID reconnects without touching the database.
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+from collections import deque
+from typing import Deque, Dict, Iterable, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+ALERT_STREAM_QUEUE_SIZE = int(os.getenv('ALERT_STREAM_QUEUE_SIZE', '32'))
+ALERT_STREAM_REPLAY_SIZE = int(os.getenv('ALERT_STREAM_REPLAY_SIZE', '256'))
+ALERT_STREAM_KEEPALIVE_SECONDS = float(os.getenv('ALERT_STREAM_KEEPALIVE_SECONDS', '15'))
+
+KEEPALIVE_FRAME = b': keepalive\n\n'
+
+
+class Subscription:
+    __slots__ = ('queue', 'region_ids', 'dropped')
+
+    def __init__(self, region_ids: Optional[Set[int]], maxsize: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.region_ids = region_ids
+        self.dropped = False
+
+
+class AlertBroadcaster:
+    def __init__(self, queue_size: int = ALERT_STREAM_QUEUE_SIZE, replay_size: int = ALERT_STREAM_REPLAY_SIZE):
+        self.queue_size = queue_size
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._all: Set[Subscription] = set()
+        self._by_region: Dict[int, Set[Subscription]] = {}
+        # (event id, region ids, frame) for Last-Event-ID replay
+        self._recent: Deque[Tuple[int, Tuple[int, ...], bytes]] = deque(maxlen=replay_size)
+        self._lock = threading.Lock()
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._all) + sum(len(s) for s in self._by_region.values())
+
+    def subscribe(self, region_ids: Optional[Iterable[int]] = None, last_event_id: Optional[int] = None) -> Subscription:
+        """Register a subscriber on the running event loop (call from async code)."""
+        self._loop = asyncio.get_running_loop()
+        regions = set(region_ids) if region_ids else None
+        sub = Subscription(regions, self.queue_size)
+        if last_event_id is not None:
+            with self._lock:
+                backlog = [(eid, rids, frame) for eid, rids, frame in self._recent if eid > last_event_id]
+            for _, rids, frame in backlog[-self.queue_size:]:
+                if regions is None or regions.intersection(rids):
+                    sub.queue.put_nowait(frame)
+        if regions is None:
+            self._all.add(sub)
+        else:
+            for region_id in regions:
+                self._by_region.setdefault(region_id, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        if sub.region_ids is None:
+            self._all.discard(sub)
+            return
+        for region_id in sub.region_ids:
+            subs = self._by_region.get(region_id)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self._by_region[region_id]
+
+    def publish(self, event_id: int, payload: dict, region_ids: Iterable[int] = ()) -> None:
+        """Serialize once and fan out to matching subscribers; safe to call from any thread."""
+        rids = tuple(sorted(set(region_ids)))
+        frame = f"id: {event_id}\nevent: alert\ndata: {json.dumps(payload, separators=(',', ':'), default=str)}\n\n".encode()
+        with self._lock:
+            self._recent.append((event_id, rids, frame))
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        loop.call_soon_threadsafe(self._dispatch, rids, frame)
+
+    def _dispatch(self, region_ids: Tuple[int, ...], frame: bytes) -> None:
+        # Runs on the event loop thread, so the subscriber sets are not mutated concurrently
+        targets = set(self._all)
+        for region_id in region_ids:
+            targets.update(self._by_region.get(region_id, ()))
+        for sub in targets:
+            try:
+                sub.queue.put_nowait(frame)
+            except asyncio.QueueFull:
+                # Slow consumer: drop it rather than buffer unboundedly; the client reconnects with Last-Event-ID
+                sub.dropped = True
+                self.unsubscribe(sub)
+        if targets:
+            logger.debug("Alert event fanned out to %d subscribers", len(targets))
+
+
+async def stream_events(broadcaster: AlertBroadcaster, sub: Subscription, keepalive: float = ALERT_STREAM_KEEPALIVE_SECONDS):
+    """Async generator of SSE frames for one subscriber."""
+    try:
+        yield b'retry: 5000\n\n'
+        while not sub.dropped:
+            try:
+                frame = await asyncio.wait_for(sub.queue.get(), timeout=keepalive)
+            except asyncio.TimeoutError:
+                frame = KEEPALIVE_FRAME
+            yield frame
+    finally:
+        broadcaster.unsubscribe(sub)
+
+
+# Global instance
+alert_broadcaster = AlertBroadcaster()
@@ -0,0 +1,209 @@
+"""
+Per-region alert coalescing and idempotency window.
+
+Keeps a short-lived in-memory record of the alert most recently dispatched
+for each region. A same-or-lower risk alert for that region inside the
+window is merged into it instead of starting another fan-out, and a repeated
+Idempotency-Key returns the alert it originally created. A multi-region
+alert reserves one slot per region, so it coalesces with single-region
+alerts and with other multi-region alerts that share any of its regions.
+"""
+import os
+import time
+import logging
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+ALERT_COALESCE_WINDOW_SECONDS = float(os.getenv('ALERT_COALESCE_WINDOW_SECONDS', '300'))
+ALERT_IDEMPOTENCY_TTL_SECONDS = float(os.getenv('ALERT_IDEMPOTENCY_TTL_SECONDS', '86400'))
+# Per-region overrides, e.g. "guwahati=600,patna=120"
+ALERT_COALESCE_WINDOW_OVERRIDES = os.getenv('ALERT_COALESCE_WINDOW_OVERRIDES', '')
+
+RISK_RANK = {'low': 0, 'medium': 1, 'high': 2, 'critical': 3}
+
+# How long a merged request waits for the in-flight alert row to be committed before
+# it gets 202 and retries; kept short so merged requests don't park threadpool threads
+ALERT_MERGE_WAIT_SECONDS = float(os.getenv('ALERT_MERGE_WAIT_SECONDS', '0.5'))
+
+
+def region_key(region: str) -> str:
+    """Normalize a free-text region into a coalescing key."""
+    return " ".join(region.split()).lower()
+
+
+def _parse_overrides(raw: str) -> Dict[str, float]:
+    overrides: Dict[str, float] = {}
+    for part in raw.split(','):
+        if '=' not in part:
+            continue
+        name, _, seconds = part.partition('=')
+        try:
+            overrides[region_key(name)] = float(seconds)
+        except ValueError:
+            logger.warning("Ignoring invalid coalescing window override: %s", part)
+    return overrides
+
+
+class CoalesceSlot:
+    """One dispatched (or in-flight) alert that later requests can merge into."""
+    def __init__(self, rank: int, expires_at: float, previous: Optional["CoalesceSlot"] = None):
+        self.rank = rank
+        self.expires_at = expires_at
+        self.previous = previous
+        self.alert: Optional[dict] = None
+        self.abandoned = False
+        self.ready = threading.Event()
+        # Set once a higher-risk alert for the region has been committed; the
+        # in-flight fan-out stops so remaining recipients only get the escalated message.
+        self.superseded = threading.Event()
+
+    def wait(self, timeout: float = ALERT_MERGE_WAIT_SECONDS) -> Optional[dict]:
+        """Alert snapshot once the owner has committed it (None if not within `timeout`)."""
+        self.ready.wait(timeout)
+        return self.alert
+
+
+class AnySuperseded:
+    """Event-like view that is set once any of a multi-region alert's slots is superseded."""
+    def __init__(self, slots: Iterable[CoalesceSlot]):
+        self.slots = list(slots)
+
+    def is_set(self) -> bool:
+        return any(slot.superseded.is_set() for slot in self.slots)
+
+
+class AlertCoalescer:
+    def __init__(
+        self,
+        window_seconds: float = ALERT_COALESCE_WINDOW_SECONDS,
+        idempotency_ttl: float = ALERT_IDEMPOTENCY_TTL_SECONDS,
+        overrides: Optional[Dict[str, float]] = None,
+    ):
+        self.window_seconds = window_seconds
+        self.idempotency_ttl = idempotency_ttl
+        self.overrides = overrides if overrides is not None else _parse_overrides(ALERT_COALESCE_WINDOW_OVERRIDES)
+        self._windows: Dict[str, CoalesceSlot] = {}
+        self._idempotency: Dict[str, Tuple[CoalesceSlot, float]] = {}
+        self._lock = threading.Lock()
+
+    def window_for(self, key: str) -> float:
+        return self.overrides.get(key, self.window_seconds)
+
+    def reserve(
+        self, key: str, rank: int, idempotency_key: Optional[str] = None
+    ) -> Tuple[Optional[CoalesceSlot], Optional[CoalesceSlot]]:
+        """
+        Decide whether a new alert should dispatch.
+
+        Returns (existing, None) when the request must be merged into an
+        existing slot, or (None, own) after reserving a new slot that the
+        caller must publish() or abandon().
+        """
+        now = time.monotonic()
+        with self._lock:
+            if idempotency_key:
+                entry = self._idempotency.get(idempotency_key)
+                if entry is not None:
+                    if entry[1] > now:
+                        return entry[0], None
+                    del self._idempotency[idempotency_key]
+
+            covering, own = self._reserve_key(key, rank, now)
+            if covering is not None:
+                return covering, None
+            if idempotency_key:
+                self._idempotency[idempotency_key] = (own, now + self.idempotency_ttl)
+            self._purge(now)
+            return None, own
+
+    def reserve_many(
+        self, keys: List[str], rank: int, idempotency_key: Optional[str] = None
+    ) -> Tuple[Optional[CoalesceSlot], Dict[str, CoalesceSlot], Dict[str, CoalesceSlot]]:
+        """
+        reserve() for an alert covering several regions, in one step.
+
+        Returns (replayed, covered, own). `replayed` is the slot of an earlier
+        request with the same Idempotency-Key, and then nothing is reserved.
+        Otherwise `covered` maps the keys that already have a same-or-higher
+        risk slot to it, and `own` maps every other key to a newly reserved
+        slot that the caller must publish() or abandon().
+        """
+        now = time.monotonic()
+        covered: Dict[str, CoalesceSlot] = {}
+        own: Dict[str, CoalesceSlot] = {}
+        with self._lock:
+            if idempotency_key:
+                entry = self._idempotency.get(idempotency_key)
+                if entry is not None:
+                    if entry[1] > now:
+                        return entry[0], covered, own
+                    del self._idempotency[idempotency_key]
+            for key in keys:
+                covering, slot = self._reserve_key(key, rank, now)
+                if covering is not None:
+                    covered[key] = covering
+                else:
+                    own[key] = slot
+            if idempotency_key and own:
+                self._idempotency[idempotency_key] = (next(iter(own.values())), now + self.idempotency_ttl)
+            self._purge(now)
+        return None, covered, own
+
+    def _reserve_key(self, key: str, rank: int, now: float) -> Tuple[Optional[CoalesceSlot], Optional[CoalesceSlot]]:
+        # Called with the lock held
+        current = self._windows.get(key)
+        if current is not None and current.expires_at <= now:
+            current = None
+        if current is not None and rank <= current.rank:
+            return current, None
+        # The slot being escalated keeps sending until publish(); abandon() restores it
+        own = CoalesceSlot(rank, now + self.window_for(key), previous=current)
+        self._windows[key] = own
+        return None, own
+
+    def publish(self, slot: CoalesceSlot, alert: dict) -> None:
+        """
+        Attach the committed alert to a reserved slot so merged requests can return it.
+
+        Lower-risk alerts this slot escalated are superseded only now, so their
+        fan-outs keep going if the escalation fails before it is committed.
+        """
+        with self._lock:
+            previous, slot.previous = slot.previous, None
+        while previous is not None:
+            previous.superseded.set()
+            previous = previous.previous
+        slot.alert = alert
+        slot.ready.set()
+
+    def abandon(self, key: str, slot: CoalesceSlot, idempotency_key: Optional[str] = None) -> None:
+        """Drop a reserved slot whose dispatch failed, restoring the previous window."""
+        with self._lock:
+            slot.abandoned = True
+            if self._windows.get(key) is slot:
+                now = time.monotonic()
+                previous = slot.previous
+                while previous is not None and (previous.abandoned or previous.expires_at <= now):
+                    previous = previous.previous
+                if previous is not None:
+                    self._windows[key] = previous
+                else:
+                    del self._windows[key]
+            if idempotency_key:
+                entry = self._idempotency.get(idempotency_key)
+                if entry is not None and entry[0] is slot:
+                    del self._idempotency[idempotency_key]
+        slot.ready.set()
+
+    def _purge(self, now: float) -> None:
+        # Called with the lock held; keeps both maps bounded by the active window
+        for k in [k for k, s in self._windows.items() if s.expires_at <= now]:
+            del self._windows[k]
+        for k in [k for k, (_, exp) in self._idempotency.items() if exp <= now]:
+            del self._idempotency[k]
+
+
+# Global instance
+alert_coalescer = AlertCoalescer()
@@ -0,0 +1,386 @@
+"""
+Alert fan-out to citizens, in the request thread or across sender processes.
+
+fan_out() sends one message to a list of users on their enabled channels
+and records a delivery row per (user, channel). With ALERT_FANOUT_PROCESSES
+set, alerts with at least ALERT_FANOUT_MIN_RECIPIENTS recipients are split
+into partitions over User.id and sent by a pool of worker processes, so
+message building, phone formatting and provider I/O no longer share one GIL.
+All-citizen alerts are split into contiguous ID ranges. Multi-region alerts
+are split into slices of the sorted recipient array.
+
+Each worker streams its partition in keyset pages on its own DB session and
+commits deliveries as it goes. Per-partition counts (and, for multi-region
+alerts, the IDs reached) are sent back to the request, which merges them
+into metrics and AlertHistory as partitions finish. Because the workers
+write on their own connections, the alert row must be committed before the
+hand-off.
+
+A partition whose worker fails (including a crashed process, which breaks
+the whole pool) is resumed after the last user its committed deliveries
+reach, up to ALERT_FANOUT_RETRIES times; a broken pool is replaced first.
+If recipients are still left after that, run() raises FanoutIncomplete so
+the caller can report the alert as partially sent.
+"""
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from array import array
+from concurrent.futures import FIRST_COMPLETED, CancelledError, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Query, Session
+
+from ..database import SessionLocal
+from ..metrics import ALERT_FANOUT_PARTITIONS, ALERT_FANOUT_RECIPIENTS, NOTIFICATIONS_SENT
+from ..models import AlertDelivery, User
+from .delivery_service import DeliveryRecorder
+from .recipients import IdBitmap
+from .sms_service import sms_service, whatsapp_service
+
+logger = logging.getLogger(__name__)
+
+RECIPIENT_CHUNK_SIZE = int(os.getenv("ALERT_RECIPIENT_CHUNK_SIZE", "1000"))
+# 0 keeps every fan-out in the request thread
+ALERT_FANOUT_PROCESSES = int(os.getenv('ALERT_FANOUT_PROCESSES', '0'))
+ALERT_FANOUT_PARTITION_SIZE = int(os.getenv('ALERT_FANOUT_PARTITION_SIZE', '20000'))
+ALERT_FANOUT_MIN_RECIPIENTS = int(os.getenv('ALERT_FANOUT_MIN_RECIPIENTS', '20000'))
+ALERT_FANOUT_RETRIES = int(os.getenv('ALERT_FANOUT_RETRIES', '2'))
+
+# (lowest id, id bound exclusive, explicit sorted ids as array('q') bytes or None)
+Partition = Tuple[int, int, Optional[bytes]]
+
+# Provider counters are bumped inside the workers; deltas are shipped back to the parent's registry
+_NOTIFICATION_KEYS = tuple((channel, result) for channel in ('sms', 'whatsapp') for result in ('sent', 'failed'))
+
+
+class FanoutIncomplete(Exception):
+    """Some partitions still failed after their retries; `sent` users were reached."""
+    def __init__(self, sent: int, failed_partitions: int):
+        super().__init__(f"{failed_partitions} fan-out partitions failed; {sent} recipients reached")
+        self.sent = sent
+        self.failed_partitions = failed_partitions
+
+
+def fan_out(
+    users: List[User],
+    message: str,
+    recorder: DeliveryRecorder,
+    cancelled: Optional[threading.Event] = None,
+    reached=None,
+) -> int:
+    """Send `message` to each user on their enabled channels; returns users reached."""
+    sent_count = 0
+    for index, user in enumerate(users):
+        if cancelled is not None and cancelled.is_set():
+            logger.info("Fan-out superseded by an escalation; %d recipients left to the new alert", len(users) - index)
+            break
+        try:
+            sent = False
+            if user.sms_alerts:
+                sid = sms_service.send_sms_tracked(user.phone_number, message)
+                recorder.record(user.id, "sms", sid, sms_service.reports_status)
+                sent = sent or sid is not None
+            if user.whatsapp_alerts:
+                sid = whatsapp_service.send_whatsapp_tracked(user.phone_number, message)
+                recorder.record(user.id, "whatsapp", sid, whatsapp_service.reports_status)
+                sent = sent or sid is not None
+            ALERT_FANOUT_RECIPIENTS.inc(("sent" if sent else "failed",))
+            if sent:
+                sent_count += 1
+                if reached is not None:
+                    reached.add(user.id)
+        except SQLAlchemyError:
+            raise
+        except Exception as e:
+            logger.error("Failed to send alert to user %s: %s", user.id, e, exc_info=True)
+    recorder.flush()
+    return sent_count
+
+
+def active_citizens(db: Session) -> Query:
+    return db.query(User).filter(User.role == "citizen", User.is_active == True)
+
+
+def citizen_partitions(db: Session, size: int = ALERT_FANOUT_PARTITION_SIZE) -> Tuple[int, List[Partition]]:
+    """Recipient count and equal-width User.id ranges holding about `size` active citizens each."""
+    count, low, high = (
+        db.query(func.count(User.id), func.min(User.id), func.max(User.id))
+        .filter(User.role == "citizen", User.is_active == True)
+        .one()
+    )
+    if not count:
+        return 0, []
+    parts = -(-count // max(1, size))
+    width = -(-(high - low + 1) // parts)
+    return count, [(start, min(start + width, high + 1), None) for start in range(low, high + 1, width)]
+
+
+def id_partitions(ids: array, size: int = ALERT_FANOUT_PARTITION_SIZE) -> List[Partition]:
+    """Slices of a sorted recipient array."""
+    size = max(1, size)
+    return [
+        (ids[start], ids[min(start + size, len(ids)) - 1] + 1, ids[start:start + size].tobytes())
+        for start in range(0, len(ids), size)
+    ]
+
+
+def _pages(db: Session, partition: Partition) -> Iterator[List[User]]:
+    low, high, raw_ids = partition
+    if raw_ids is not None:
+        ids = array('q')
+        ids.frombytes(raw_ids)
+        for start in range(0, len(ids), RECIPIENT_CHUNK_SIZE):
+            chunk = ids[start:start + RECIPIENT_CHUNK_SIZE].tolist()
+            yield active_citizens(db).filter(User.id.in_(chunk)).order_by(User.id).all()
+        return
+    last = low - 1
+    while True:
+        users = (
+            active_citizens(db)
+            .filter(User.id > last, User.id < high)
+            .order_by(User.id)
+            .limit(RECIPIENT_CHUNK_SIZE)
+            .all()
+        )
+        if not users:
+            return
+        yield users
+        last = users[-1].id
+
+
+def send_partition(alert_id: int, message: str, partition: Partition, track_reached: bool) -> Dict:
+    """Worker entry point: send one partition; the recorder commits deliveries batch by batch."""
+    before = {key: NOTIFICATIONS_SENT.value(key) for key in _NOTIFICATION_KEYS}
+    reached = set() if track_reached else None
+    processed = sent = 0
+    db = SessionLocal()
+    try:
+        recorder = DeliveryRecorder(alert_id)
+        for users in _pages(db, partition):
+            sent += fan_out(users, message, recorder, reached=reached)
+            processed += len(users)
+    finally:
+        db.close()
+    return {
+        'processed': processed,
+        'sent': sent,
+        'reached': array('q', sorted(reached)).tobytes() if reached else b'',
+        'notifications': {key: NOTIFICATIONS_SENT.value(key) - before[key] for key in _NOTIFICATION_KEYS},
+    }
+
+
+def resume_partition(alert_id: int, partition: Partition) -> Tuple[Optional[Partition], List[int]]:
+    """
+    What is left of a failed partition, and the users its committed batches reached.
+
+    Delivery batches are committed in user id order and end on a user
+    boundary, so everything up to the highest user with a committed delivery
+    row is done. Returns (None, reached) when
+    nothing is left.
+    """
+    low, high, raw_ids = partition
+    db = SessionLocal()
+    try:
+        rows = (
+            db.query(AlertDelivery.user_id, AlertDelivery.status)
+            .filter(AlertDelivery.alert_id == alert_id, AlertDelivery.user_id >= low, AlertDelivery.user_id < high)
+            .all()
+        )
+    finally:
+        db.close()
+    if not rows:
+        return partition, []
+    last = max(user_id for user_id, _ in rows)
+    reached = sorted({user_id for user_id, status in rows if status != 'failed'})
+    if raw_ids is None:
+        rest = (last + 1, high, None) if last + 1 < high else None
+    else:
+        ids = array('q')
+        ids.frombytes(raw_ids)
+        left = array('q', (user_id for user_id in ids if user_id > last))
+        rest = (left[0], high, left.tobytes()) if left else None
+    return rest, reached
+
+
+def _noop() -> None:
+    return None
+
+
+class FanoutPool:
+    def __init__(
+        self,
+        processes: int = ALERT_FANOUT_PROCESSES,
+        partition_size: int = ALERT_FANOUT_PARTITION_SIZE,
+        min_recipients: int = ALERT_FANOUT_MIN_RECIPIENTS,
+    ):
+        self.processes = processes
+        self.partition_size = partition_size
+        self.min_recipients = min_recipients
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.processes > 0
+
+    def use_for(self, recipients: int) -> bool:
+        return self.enabled and recipients >= self.min_recipients
+
+    def start(self, wait_ready: bool = False) -> None:
+        """Create the pool and start its workers now rather than on the first alert."""
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._executor is not None:
+                return
+            # spawn: forking a process that runs server threads can copy held locks
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.processes, mp_context=multiprocessing.get_context('spawn')
+            )
+            warmup = [self._executor.submit(_noop) for _ in range(self.processes)]
+        if wait_ready:
+            wait(warmup)
+        logger.info("Alert fan-out pool started with %d processes", self.processes)
+
+    def stop(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def run(
+        self,
+        alert_id: int,
+        message: str,
+        partitions: List[Partition],
+        cancelled: Optional[threading.Event] = None,
+        reached: Optional[IdBitmap] = None,
+        on_progress: Optional[Callable[[int], None]] = None,
+        progress_interval: float = 1.0,
+        retries: int = ALERT_FANOUT_RETRIES,
+    ) -> int:
+        """
+        Send all partitions on the pool and return the users reached.
+
+        Blocks until every partition has finished. `on_progress(sent_so_far)`
+        is called in this thread as partitions finish, at most once per
+        `progress_interval` seconds. Once `cancelled` is set, partitions that
+        have not started are dropped. Failed partitions are resumed up to
+        `retries` times; raises FanoutIncomplete if any still fail.
+        """
+        self.start()
+        total = len(partitions)
+        sent = processed = 0
+        last_progress = time.monotonic()
+        attempt = 0
+        while True:
+            executor, pending = self._submit(alert_id, message, partitions, reached is not None)
+            failed: List[Partition] = []
+            broken = False
+            while pending:
+                done, _ = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+                if cancelled is not None and cancelled.is_set():
+                    for future in pending:
+                        future.cancel()
+                for future in done:
+                    partition = pending.pop(future)
+                    result = self._result(future)
+                    if result is None:
+                        if not future.cancelled():
+                            failed.append(partition)
+                            broken = broken or isinstance(future.exception(), BrokenProcessPool)
+                        continue
+                    sent += result['sent']
+                    processed += result['processed']
+                    self._merge(result, reached)
+                if on_progress is not None and done and pending and time.monotonic() - last_progress >= progress_interval:
+                    on_progress(sent)
+                    last_progress = time.monotonic()
+
+            # Resume failed partitions after what their workers committed before failing
+            partitions = []
+            for partition in failed:
+                rest, done_ids = resume_partition(alert_id, partition)
+                sent += len(done_ids)
+                processed += len(done_ids)
+                ALERT_FANOUT_RECIPIENTS.inc(("sent",), len(done_ids))
+                if reached is not None:
+                    for user_id in done_ids:
+                        reached.add(user_id)
+                if rest is not None:
+                    partitions.append(rest)
+            if not partitions or (cancelled is not None and cancelled.is_set()):
+                break
+            if attempt >= retries:
+                logger.error(
+                    "Alert %s fan-out gave up on %d partitions after %d retries; %d recipients reached",
+                    alert_id, len(partitions), retries, sent,
+                )
+                raise FanoutIncomplete(sent, len(partitions))
+            attempt += 1
+            if broken:
+                self._replace(executor)
+            ALERT_FANOUT_PARTITIONS.inc(("retried",), len(partitions))
+            logger.warning("Alert %s fan-out retrying %d partitions (attempt %d)", alert_id, len(partitions), attempt)
+
+        logger.info("Alert %s fan-out over %d partitions: %d of %d recipients reached", alert_id, total, sent, processed)
+        return sent
+
+    def _submit(
+        self, alert_id: int, message: str, partitions: List[Partition], track_reached: bool
+    ) -> Tuple[ProcessPoolExecutor, Dict[Future, Partition]]:
+        executor = self._executor
+        try:
+            return executor, {executor.submit(send_partition, alert_id, message, p, track_reached): p for p in partitions}
+        except BrokenProcessPool:
+            # A worker died between alerts; nothing of this alert has run yet
+            self._replace(executor)
+            executor = self._executor
+            return executor, {executor.submit(send_partition, alert_id, message, p, track_reached): p for p in partitions}
+
+    def _replace(self, broken: ProcessPoolExecutor) -> None:
+        """Swap a pool broken by a dead worker for a fresh one (once, however many callers notice)."""
+        with self._lock:
+            if self._executor is not broken:
+                return
+            self._executor = None
+        broken.shutdown(wait=False, cancel_futures=True)
+        logger.warning("Alert fan-out pool broken by a dead worker; starting a new one")
+        self.start()
+
+    @staticmethod
+    def _merge(result: Dict, reached: Optional[IdBitmap]) -> None:
+        ALERT_FANOUT_RECIPIENTS.inc(("sent",), result['sent'])
+        ALERT_FANOUT_RECIPIENTS.inc(("failed",), result['processed'] - result['sent'])
+        for key, count in result['notifications'].items():
+            if count:
+                NOTIFICATIONS_SENT.inc(key, count)
+        if reached is not None and result['reached']:
+            ids = array('q')
+            ids.frombytes(result['reached'])
+            for user_id in ids:
+                reached.add(user_id)
+
+    @staticmethod
+    def _result(future: Future) -> Optional[Dict]:
+        try:
+            result = future.result()
+        except CancelledError:
+            ALERT_FANOUT_PARTITIONS.inc(("cancelled",))
+            return None
+        except Exception as e:
+            ALERT_FANOUT_PARTITIONS.inc(("failed",))
+            logger.error("Alert fan-out partition failed: %s", e, exc_info=True)
+            return None
+        ALERT_FANOUT_PARTITIONS.inc(("done",))
+        return result
+
+
+# Global instance
+fanout_pool = FanoutPool()
@@ -0,0 +1,280 @@
+"""
+Per-recipient delivery tracking for alert fan-out.
+
+Delivery rows are bulk-inserted and committed in batches while an alert is
+being sent, and provider status callbacks are coalesced in memory and
+applied as grouped UPDATEs instead of one write per receipt. A callback can
+still beat its row's commit; such receipts stay buffered and are retried
+until DELIVERY_RECEIPT_RETRY_SECONDS pass.
+"""
+import os
+import logging
+import threading
+import time
+from typing import Dict, List, Optional
+
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.orm import Session
+
+from ..database import SessionLocal
+from ..models import AlertDelivery
+
+logger = logging.getLogger(__name__)
+
+DELIVERY_BATCH_SIZE = int(os.getenv('DELIVERY_BATCH_SIZE', '1000'))
+RECEIPT_FLUSH_SIZE = int(os.getenv('DELIVERY_RECEIPT_FLUSH_SIZE', '500'))
+RECEIPT_FLUSH_INTERVAL = float(os.getenv('DELIVERY_RECEIPT_FLUSH_INTERVAL', '2.0'))
+# Receipts whose delivery row is not there yet are retried this long, keeping at most RECEIPT_RETRY_MAX
+RECEIPT_RETRY_SECONDS = float(os.getenv('DELIVERY_RECEIPT_RETRY_SECONDS', '300'))
+RECEIPT_RETRY_MAX = int(os.getenv('DELIVERY_RECEIPT_RETRY_MAX', '10000'))
+
+DELIVERY_STATUSES = ('queued', 'sent', 'delivered', 'failed')
+
+# Twilio MessageStatus values -> our delivery statuses
+_PROVIDER_STATUS_MAP = {
+    'accepted': 'queued',
+    'scheduled': 'queued',
+    'queued': 'queued',
+    'sending': 'queued',
+    'sent': 'sent',
+    'delivered': 'delivered',
+    'read': 'delivered',
+    'undelivered': 'failed',
+    'failed': 'failed',
+    'canceled': 'failed',
+}
+
+# Statuses only move forward; delivered/failed are terminal.
+_STATUS_RANK = {'queued': 0, 'sent': 1, 'delivered': 2, 'failed': 2}
+
+
+def normalize_provider_status(provider_status: Optional[str]) -> Optional[str]:
+    """Map a provider MessageStatus to one of DELIVERY_STATUSES (None if unknown)."""
+    if not provider_status:
+        return None
+    return _PROVIDER_STATUS_MAP.get(provider_status.strip().lower())
+
+
+class DeliveryRecorder:
+    """
+    Collects delivery rows for one alert and writes them with executemany
+    INSERTs of about `batch_size` rows, each committed on its own short-lived
+    session. Status callbacks can match a row as soon as its batch is
+    written, the caller's session and loaded users are never expired, and no
+    transaction stays open across the whole send. Batches end on a user
+    boundary, so a committed batch holds every channel of its users.
+    """
+    def __init__(self, alert_id: int, batch_size: int = DELIVERY_BATCH_SIZE):
+        self.alert_id = alert_id
+        self.batch_size = max(1, batch_size)
+        self._rows: List[Dict] = []
+        self.written = 0
+
+    def record(
+        self, user_id: int, channel: str, provider_message_id: Optional[str], awaiting_receipt: bool = False
+    ) -> None:
+        """
+        Add one delivery row. A message the provider accepted is 'queued' when
+        status callbacks will move it on, and 'sent' when acceptance is all we
+        will ever learn (mock mode, no callback URL).
+        """
+        if provider_message_id is None:
+            status = 'failed'
+        else:
+            status = 'queued' if awaiting_receipt else 'sent'
+        if len(self._rows) >= self.batch_size and self._rows[-1]['user_id'] != user_id:
+            self.flush()
+        self._rows.append({
+            'alert_id': self.alert_id,
+            'user_id': user_id,
+            'channel': channel,
+            'status': status,
+            'provider_message_id': provider_message_id,
+        })
+
+    def flush(self) -> None:
+        if not self._rows:
+            return
+        db = SessionLocal()
+        try:
+            db.execute(insert(AlertDelivery), self._rows)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        self.written += len(self._rows)
+        self._rows = []
+
+
+class DeliveryReceiptBuffer:
+    """
+    In-memory coalescing buffer for provider status callbacks.
+
+    Only the most advanced status per message SID is kept, so a burst of
+    sending/sent/delivered callbacks for one message becomes a single update.
+    Pending receipts are flushed periodically by the background thread
+    started from the app lifespan, which add() wakes early once the buffer
+    fills up. add() never touches the database, so the async callback route
+    can call it on the event loop.
+
+    A receipt whose SID matches no delivery row yet (its batch is still being
+    written) is kept for later flushes until `retry_seconds` have passed;
+    at most `retry_max` such receipts are kept, oldest dropped first.
+    """
+    def __init__(
+        self,
+        flush_size: int = RECEIPT_FLUSH_SIZE,
+        flush_interval: float = RECEIPT_FLUSH_INTERVAL,
+        retry_seconds: float = RECEIPT_RETRY_SECONDS,
+        retry_max: int = RECEIPT_RETRY_MAX,
+    ):
+        self.flush_size = max(1, flush_size)
+        self.flush_interval = flush_interval
+        self.retry_seconds = retry_seconds
+        self.retry_max = max(0, retry_max)
+        self._pending: Dict[str, str] = {}
+        # SID -> monotonic time it first matched no row; insertion order is oldest first
+        self._unmatched_since: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, provider_message_id: str, status: str) -> None:
+        """Buffer a receipt and wake the flusher once `flush_size` are pending."""
+        self.add_nowait(provider_message_id, status)
+        if self.pending_count() >= self.flush_size:
+            self._wake.set()
+
+    def add_nowait(self, provider_message_id: str, status: str) -> None:
+        """Like add() but never wakes the flusher."""
+        with self._lock:
+            current = self._pending.get(provider_message_id)
+            if current is None or _STATUS_RANK[status] > _STATUS_RANK[current]:
+                self._pending[provider_message_id] = status
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self) -> int:
+        """Apply pending receipts as one UPDATE per status; returns rows updated."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return 0
+
+            by_status: Dict[str, List[str]] = {}
+            for sid, status in pending.items():
+                by_status.setdefault(status, []).append(sid)
+
+            updated = 0
+            unmatched: Dict[str, str] = {}
+            db = SessionLocal()
+            try:
+                for status, sids in by_status.items():
+                    # Never move a record backwards (e.g. a late "sent" after "delivered")
+                    earlier = [s for s, rank in _STATUS_RANK.items() if rank < _STATUS_RANK[status]]
+                    if not earlier:
+                        continue
+                    for start in range(0, len(sids), DELIVERY_BATCH_SIZE):
+                        chunk = sids[start:start + DELIVERY_BATCH_SIZE]
+                        result = db.execute(
+                            update(AlertDelivery)
+                            .where(AlertDelivery.provider_message_id.in_(chunk))
+                            .where(AlertDelivery.status.in_(earlier))
+                            .values(status=status, updated_at=func.now())
+                            .execution_options(synchronize_session=False)
+                        )
+                        updated += result.rowcount or 0
+                        if (result.rowcount or 0) < len(chunk):
+                            # Some SIDs were already at or past this status, or have no row yet
+                            found = set(db.scalars(
+                                select(AlertDelivery.provider_message_id)
+                                .where(AlertDelivery.provider_message_id.in_(chunk))
+                            ))
+                            unmatched.update((sid, status) for sid in chunk if sid not in found)
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                logger.error("Failed to apply %d delivery receipts: %s", len(pending), e, exc_info=True)
+                # Put the receipts back so the next flush retries them
+                for sid, status in pending.items():
+                    self.add_nowait(sid, status)
+                return 0
+            finally:
+                db.close()
+            self._retry_unmatched(pending, unmatched)
+            logger.info(
+                "Applied %d delivery receipts (%d rows updated, %d awaiting their row)",
+                len(pending), updated, len(unmatched),
+            )
+            return updated
+
+    def _retry_unmatched(self, flushed: Dict[str, str], unmatched: Dict[str, str]) -> None:
+        now = time.monotonic()
+        expired = 0
+        with self._lock:
+            for sid in flushed:
+                if sid not in unmatched:
+                    self._unmatched_since.pop(sid, None)
+            for sid, status in unmatched.items():
+                since = self._unmatched_since.setdefault(sid, now)
+                if now - since >= self.retry_seconds:
+                    del self._unmatched_since[sid]
+                    expired += 1
+                    continue
+                current = self._pending.get(sid)
+                if current is None or _STATUS_RANK[status] > _STATUS_RANK[current]:
+                    self._pending[sid] = status
+            overflow = len(self._unmatched_since) - self.retry_max
+            for sid in list(self._unmatched_since)[:max(0, overflow)]:
+                del self._unmatched_since[sid]
+                self._pending.pop(sid, None)
+                expired += 1
+        if expired:
+            logger.warning("Dropped %d delivery receipts that never matched a delivery row", expired)
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="delivery-receipts", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._wake.set()
+        self._thread.join(timeout=self.flush_interval * 2)
+        self._thread = None
+        self.flush()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+
+def delivery_summary(db: Session, alert_id: int) -> Dict[str, int]:
+    """Per-status delivery counts for one alert, as a single GROUP BY on the (alert_id, status) index."""
+    rows = (
+        db.query(AlertDelivery.status, func.count(AlertDelivery.id))
+        .filter(AlertDelivery.alert_id == alert_id)
+        .group_by(AlertDelivery.status)
+        .all()
+    )
+    counts = {status: 0 for status in DELIVERY_STATUSES}
+    for status, count in rows:
+        counts[status] = counts.get(status, 0) + count
+    return counts
+
+
+# Global instance
+receipt_buffer = DeliveryReceiptBuffer()
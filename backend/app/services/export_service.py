@@ -0,0 +1,110 @@
+"""
+Streaming exports of predictions, alerts and alert history.
+
+Rows are read through a server-side cursor in fixed-size partitions and
+encoded chunk by chunk as NDJSON or CSV, so memory stays flat no matter how
+many rows an export covers. Used by the /exports endpoints and by
+scripts/export_data.py.
+"""
+import csv
+import io
+import json
+import os
+from datetime import date, datetime
+from typing import Iterator, Optional
+
+from sqlalchemy import select
+
+from ..database import SessionLocal
+from ..models import Alert, AlertHistory, FloodPrediction
+
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', '2000'))
+
+EXPORT_FORMATS = ('ndjson', 'csv')
+
+# dataset -> (model, timestamp column used for date filters, exported columns)
+DATASETS = {
+    'predictions': (
+        FloodPrediction,
+        FloodPrediction.created_at,
+        ('id', 'region_id', 'prediction_date', 'risk_level', 'risk_score', 'weather_data', 'created_at'),
+    ),
+    'alerts': (
+        Alert,
+        Alert.created_at,
+        ('id', 'region', 'message', 'risk_level', 'created_by', 'created_at'),
+    ),
+    'alert_history': (
+        AlertHistory,
+        AlertHistory.sent_at,
+        ('id', 'region_id', 'message', 'risk_level', 'sent_to_count', 'sent_at', 'created_by'),
+    ),
+}
+
+MEDIA_TYPES = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+
+
+def supports_region_filter(dataset: str) -> bool:
+    return 'region_id' in DATASETS[dataset][2]
+
+
+def _json_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, separators=(',', ':'))
+    return value
+
+
+def export_rows(
+    dataset: str,
+    fmt: str = 'ndjson',
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    region_id: Optional[int] = None,
+    chunk_size: int = EXPORT_CHUNK_SIZE,
+) -> Iterator[bytes]:
+    """
+    Yield encoded export chunks. Opens its own session so it can outlive the
+    request that created the StreamingResponse.
+    """
+    model, ts_column, columns = DATASETS[dataset]
+    stmt = select(*(getattr(model, c) for c in columns))
+    if start is not None:
+        stmt = stmt.where(ts_column >= start)
+    if end is not None:
+        stmt = stmt.where(ts_column < end)
+    if region_id is not None:
+        stmt = stmt.where(model.region_id == region_id)
+    stmt = stmt.order_by(ts_column, model.id).execution_options(stream_results=True, yield_per=chunk_size)
+
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        yield buffer.getvalue().encode('utf-8')
+
+    db = SessionLocal()
+    try:
+        result = db.execute(stmt)
+        for partition in result.partitions():
+            if fmt == 'csv':
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                writer.writerows([_csv_value(v) for v in row] for row in partition)
+                yield buffer.getvalue().encode('utf-8')
+            else:
+                yield ''.join(
+                    json.dumps({c: _json_value(v) for c, v in zip(columns, row)}, separators=(',', ':')) + '\n'
+                    for row in partition
+                ).encode('utf-8')
+    finally:
+        db.close()
@@ -0,0 +1,330 @@
+"""
+Region geometry cache for the dashboard risk map.
+
+Each region's GeoJSON geometry (Region.geometry) is parsed once, its
+bounding box cached, and simplified versions are built lazily per zoom band
+with Douglas-Peucker. Map responses are assembled from pre-serialized
+per-feature fragments and kept, together with their gzip encoding, until a
+region's geometry or latest risk changes.
+
+The lock only guards the cache dicts. A miss is built outside it, once per
+response key: concurrent requests for the same key wait on the first one's
+result, and other keys and cache hits are never blocked by a build.
+"""
+import gzip
+import json
+import logging
+import math
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from ..models import FloodPrediction, Region
+
+logger = logging.getLogger(__name__)
+
+# (max zoom, tolerance in degrees, coordinate decimals) per simplification level
+ZOOM_LEVELS = (
+    (4, 0.05, 2),
+    (7, 0.01, 3),
+    (10, 0.002, 4),
+    (22, 0.0, 5),
+)
+
+_MAX_CACHED_RESPONSES = 256
+
+BBox = Tuple[float, float, float, float]
+
+
+def level_for_zoom(zoom: int) -> int:
+    for level, (max_zoom, _, _) in enumerate(ZOOM_LEVELS):
+        if zoom <= max_zoom:
+            return level
+    return len(ZOOM_LEVELS) - 1
+
+
+def snap_bbox(bbox: BBox, zoom: int) -> BBox:
+    """Round a viewport outward to the tile grid of `zoom` so nearby viewports share a cache entry."""
+    step = 360.0 / (2 ** max(0, min(zoom, 22)))
+    return (
+        math.floor(bbox[0] / step) * step,
+        math.floor(bbox[1] / step) * step,
+        math.ceil(bbox[2] / step) * step,
+        math.ceil(bbox[3] / step) * step,
+    )
+
+
+def _perpendicular_distance(p, a, b) -> float:
+    (x, y), (x1, y1), (x2, y2) = p, a, b
+    dx, dy = x2 - x1, y2 - y1
+    if dx == 0 and dy == 0:
+        return math.hypot(x - x1, y - y1)
+    return abs(dy * x - dx * y + x2 * y1 - y2 * x1) / math.hypot(dx, dy)
+
+
+def douglas_peucker(points: List, tolerance: float) -> List:
+    """Iterative Douglas-Peucker line simplification."""
+    if tolerance <= 0 or len(points) < 3:
+        return points
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        start, end = stack.pop()
+        max_dist, index = 0.0, start
+        for i in range(start + 1, end):
+            dist = _perpendicular_distance(points[i], points[start], points[end])
+            if dist > max_dist:
+                max_dist, index = dist, i
+        if max_dist > tolerance:
+            keep[index] = True
+            stack.append((start, index))
+            stack.append((index, end))
+    return [p for p, k in zip(points, keep) if k]
+
+
+def _simplify_ring(ring: List, tolerance: float, decimals: int) -> Optional[List]:
+    simplified = douglas_peucker(ring, tolerance)
+    if len(simplified) < 4:
+        return None  # collapsed below a valid closed ring
+    return [[round(x, decimals), round(y, decimals)] for x, y, *_ in simplified]
+
+
+def _simplify_polygon(rings: List, tolerance: float, decimals: int) -> Optional[List]:
+    if not rings or not rings[0]:
+        return None
+    outer = _simplify_ring(rings[0], tolerance, decimals)
+    if outer is None:
+        # Keep tiny regions visible at low zoom as their bounding rectangle
+        xs = [p[0] for p in rings[0]]
+        ys = [p[1] for p in rings[0]]
+        x1, y1, x2, y2 = (round(v, decimals) for v in (min(xs), min(ys), max(xs), max(ys)))
+        return [[[x1, y1], [x2, y1], [x2, y2], [x1, y2], [x1, y1]]]
+    holes = [h for h in (_simplify_ring(r, tolerance, decimals) for r in rings[1:]) if h is not None]
+    return [outer] + holes
+
+
+def _simplify(geometry: dict, tolerance: float, decimals: int) -> Optional[dict]:
+    if geometry['type'] == 'Polygon':
+        polygon = _simplify_polygon(geometry['coordinates'], tolerance, decimals)
+        return {'type': 'Polygon', 'coordinates': polygon} if polygon else None
+    polygons = [p for p in (_simplify_polygon(c, tolerance, decimals) for c in geometry['coordinates']) if p]
+    return {'type': 'MultiPolygon', 'coordinates': polygons} if polygons else None
+
+
+def _bbox(geometry: dict) -> BBox:
+    polygons = [geometry['coordinates']] if geometry['type'] == 'Polygon' else geometry['coordinates']
+    xs, ys = [], []
+    for polygon in polygons:
+        for ring in polygon:
+            for x, y, *_ in ring:
+                xs.append(x)
+                ys.append(y)
+    return (min(xs), min(ys), max(xs), max(ys))
+
+
+def parse_geometry(raw: Optional[str]) -> Optional[dict]:
+    """Parse a stored GeoJSON Polygon/MultiPolygon (or a Feature wrapping one)."""
+    if not raw:
+        return None
+    data = json.loads(raw)
+    if data.get('type') == 'Feature':
+        data = data.get('geometry') or {}
+    if data.get('type') not in ('Polygon', 'MultiPolygon') or not data.get('coordinates'):
+        raise ValueError(f"unsupported geometry type {data.get('type')!r}")
+    return data
+
+
+class RegionShape:
+    __slots__ = ('id', 'name', 'state', 'geometry', 'bbox', 'simplified')
+
+    def __init__(self, id: int, name: str, state: Optional[str], geometry: dict):
+        self.id = id
+        self.name = name
+        self.state = state
+        self.geometry = geometry
+        self.bbox = _bbox(geometry)
+        self.simplified: Dict[int, Optional[dict]] = {}
+
+    def at_level(self, level: int) -> Optional[dict]:
+        if level not in self.simplified:
+            _, tolerance, decimals = ZOOM_LEVELS[level]
+            self.simplified[level] = _simplify(self.geometry, tolerance, decimals)
+        return self.simplified[level]
+
+
+class MapCache:
+    def __init__(self, max_responses: int = _MAX_CACHED_RESPONSES):
+        self.max_responses = max_responses
+        # Guards the dicts below only; loading, building and gzip run outside it
+        self._lock = threading.RLock()
+        self._shapes: Optional[Dict[int, RegionShape]] = None
+        self._risk: Dict[int, Tuple[str, int]] = {}
+        self._fragments: Dict[Tuple[int, int], bytes] = {}
+        self._responses: "OrderedDict[tuple, Tuple[bytes, bytes]]" = OrderedDict()
+        # One build per response key; concurrent requests for the key wait on its future
+        self._building: Dict[tuple, Future] = {}
+        # Bumped on every change so a build that raced one is not cached
+        self._generation = 0
+
+    def _read(self, db: Session) -> Tuple[Dict[int, RegionShape], Dict[int, Tuple[str, int]]]:
+        shapes: Dict[int, RegionShape] = {}
+        rows = db.query(Region.id, Region.name, Region.state, Region.geometry).filter(Region.geometry.isnot(None))
+        for region_id, name, state, raw in rows:
+            try:
+                geometry = parse_geometry(raw)
+            except (ValueError, TypeError, KeyError, IndexError) as e:
+                logger.warning("Skipping invalid geometry for region %s: %s", region_id, e)
+                continue
+            if geometry is not None:
+                shapes[region_id] = RegionShape(region_id, name, state, geometry)
+
+        latest = (
+            db.query(FloodPrediction.region_id, func.max(FloodPrediction.id).label("latest_id"))
+            .group_by(FloodPrediction.region_id)
+            .subquery()
+        )
+        risk_rows = (
+            db.query(FloodPrediction.region_id, FloodPrediction.risk_level, FloodPrediction.risk_score)
+            .join(latest, FloodPrediction.id == latest.c.latest_id)
+            .all()
+        )
+        return shapes, {region_id: (level, score) for region_id, level, score in risk_rows}
+
+    def load(self, db: Session) -> int:
+        """Parse all region geometries and the latest risk per region."""
+        return len(self._load(db, replace=True))
+
+    def _load(self, db: Session, replace: bool) -> Dict[int, RegionShape]:
+        with self._lock:
+            before = dict(self._risk)
+        shapes, risk = self._read(db)
+        with self._lock:
+            if not replace and self._shapes is not None:
+                return self._shapes  # another request loaded meanwhile
+            # Risk updates that arrived during the read are newer than what it saw
+            for region_id, value in self._risk.items():
+                if before.get(region_id) != value:
+                    risk[region_id] = value
+            self._shapes = shapes
+            self._risk = risk
+            self._fragments.clear()
+            if replace:
+                self._changed()
+            else:
+                # Called from a build: leave the in-flight futures, that build's own included, attached
+                self._generation += 1
+        logger.info("Map cache loaded %d region geometries", len(shapes))
+        return shapes
+
+    def _changed(self) -> None:
+        # Caller holds the lock
+        self._generation += 1
+        self._responses.clear()
+        self._building.clear()
+
+    def invalidate(self) -> None:
+        """Drop everything; the next request reloads geometry from the DB."""
+        with self._lock:
+            self._shapes = None
+            self._fragments.clear()
+            self._changed()
+
+    def update_risk(self, region_id: int, risk_level: str, risk_score: int) -> None:
+        with self._lock:
+            if self._risk.get(region_id) == (risk_level, risk_score):
+                return
+            self._risk[region_id] = (risk_level, risk_score)
+            for level in range(len(ZOOM_LEVELS)):
+                self._fragments.pop((region_id, level), None)
+            self._changed()
+
+    def render(self, db: Session, zoom: int, bbox: Optional[BBox] = None) -> Tuple[bytes, bytes]:
+        """FeatureCollection bytes (plain, gzip) for regions intersecting `bbox` at `zoom`."""
+        level = level_for_zoom(zoom)
+        view = snap_bbox(bbox, zoom) if bbox else None
+        key = (level, view)
+        with self._lock:
+            cached = self._responses.get(key)
+            if cached is not None:
+                self._responses.move_to_end(key)
+                return cached
+            future = self._building.get(key)
+            owner = future is None
+            if owner:
+                future = self._building[key] = Future()
+        if not owner:
+            return future.result()
+
+        try:
+            result = self._build(db, key)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                if self._building.get(key) is future:
+                    del self._building[key]
+
+    def _build(self, db: Session, key: tuple) -> Tuple[bytes, bytes]:
+        level, view = key
+        with self._lock:
+            shapes = self._shapes
+        if shapes is None:
+            shapes = self._load(db, replace=False)
+        with self._lock:
+            shapes = self._shapes if self._shapes is not None else shapes
+            generation = self._generation
+
+        parts = []
+        built: Dict[Tuple[int, int], bytes] = {}
+        for shape in shapes.values():
+            if view is not None:
+                x1, y1, x2, y2 = shape.bbox
+                if x2 < view[0] or x1 > view[2] or y2 < view[1] or y1 > view[3]:
+                    continue
+            fragment = self._fragments.get((shape.id, level))
+            if fragment is None:
+                fragment = built[(shape.id, level)] = self._fragment(shape, level)
+            if fragment:
+                parts.append(fragment)
+        body = b'{"type":"FeatureCollection","features":[' + b','.join(parts) + b']}'
+        result = (body, gzip.compress(body, compresslevel=6))
+
+        with self._lock:
+            # A change since the snapshot may have made this result stale: serve it, don't keep it
+            if self._generation == generation:
+                self._fragments.update(built)
+                self._responses[key] = result
+                if len(self._responses) > self.max_responses:
+                    self._responses.popitem(last=False)
+        return result
+
+    def _fragment(self, shape: RegionShape, level: int) -> bytes:
+        geometry = shape.at_level(level)
+        if geometry is None:
+            return b''
+        risk_level, risk_score = self._risk.get(shape.id, (None, None))
+        return json.dumps({
+            'type': 'Feature',
+            'id': shape.id,
+            'bbox': list(shape.bbox),
+            'geometry': geometry,
+            'properties': {
+                'name': shape.name,
+                'state': shape.state,
+                'risk_level': risk_level,
+                'risk_score': risk_score,
+            },
+        }, separators=(',', ':')).encode()
+
+
+# Global instance
+map_cache = MapCache()
@@ -0,0 +1,319 @@
+"""
+Cross-worker cache invalidation bus.
+
+Write paths publish change events (entity type, id, optional payload) after
+they commit. Every worker listens and hands matching events to the handlers
+registered for that entity. The handlers evict or patch exactly the affected
+entries of the worker's in-process caches. A worker ignores its own events,
+since its write path has already updated its local caches.
+
+Transports:
+- postgres: NOTIFY on a shared channel and a dedicated LISTEN connection
+  (psycopg2) per worker.
+- local: for SQLite/dev. Each worker binds a UDP socket on 127.0.0.1 and
+  drops its port into a directory shared by all workers of the same
+  database. Publishing sends one datagram to every registered port.
+
+INVALIDATION_BUS=auto picks postgres when DATABASE_URL is Postgres and
+local otherwise; "off" disables the bus. Each message carries its publish
+time, and receivers record the delay in invalidation_lag_seconds.
+
+Events carry OTP digests and alerts pushed to SSE clients, so every message
+is signed with HMAC-SHA256. Receivers drop unsigned or badly signed
+messages, messages older than INVALIDATION_MAX_AGE_SECONDS, and replays.
+The key is INVALIDATION_SECRET, which postgres mode requires. In local mode
+without it, workers share a random key file in INVALIDATION_BUS_DIR. The bus
+refuses that directory unless the current user owns it and no one else can
+read or write it.
+"""
+import hashlib
+import hmac
+import json
+import logging
+import os
+import select
+import socket
+import tempfile
+import threading
+import time
+import uuid
+from collections import deque
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import text
+
+from ..database import DATABASE_URL, engine
+from ..metrics import INVALIDATION_EVENTS, INVALIDATION_LAG_SECONDS
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_BUS = os.getenv('INVALIDATION_BUS', 'auto').lower()
+INVALIDATION_CHANNEL = os.getenv('INVALIDATION_CHANNEL', 'aegisflood_invalidation')
+INVALIDATION_BUS_DIR = os.getenv('INVALIDATION_BUS_DIR') or os.path.join(
+    tempfile.gettempdir(), 'aegisflood-bus-' + hashlib.sha1(DATABASE_URL.encode()).hexdigest()[:12]
+)
+INVALIDATION_SECRET = os.getenv('INVALIDATION_SECRET')
+INVALIDATION_MAX_AGE_SECONDS = float(os.getenv('INVALIDATION_MAX_AGE_SECONDS', '30'))
+
+# NOTIFY payloads are capped at 8000 bytes; the signature adds 65
+_MAX_MESSAGE_BYTES = 7500
+_KEY_FILE = 'bus.key'
+# Message ids remembered for replay detection
+_MAX_SEEN_MESSAGES = 10000
+
+Event = Tuple[str, Optional[int], Optional[dict]]
+Handler = Callable[[Optional[int], Optional[dict]], None]
+
+
+def _encode(origin: str, events: List[Event]) -> List[str]:
+    """Pack events into as few JSON messages as fit the size cap."""
+    now = time.time()
+    messages, parts = [], []
+
+    def close() -> None:
+        head = f'{{"o":{json.dumps(origin)},"n":"{uuid.uuid4().hex}","t":{now!r},"e":['
+        messages.append(head + ','.join(parts) + ']}')
+
+    size = 80 + len(origin)
+    for event in events:
+        part = json.dumps(list(event), separators=(',', ':'), default=str)
+        if parts and size + len(part) + 1 > _MAX_MESSAGE_BYTES:
+            close()
+            parts, size = [], 80 + len(origin)
+        parts.append(part)
+        size += len(part) + 1
+    if parts:
+        close()
+    return messages
+
+
+def _sign(key: bytes, message: str) -> str:
+    return hmac.new(key, message.encode(), hashlib.sha256).hexdigest() + '.' + message
+
+
+def _verify(key: bytes, raw: str) -> Optional[str]:
+    """The message inside a signed envelope, or None if the signature does not match."""
+    signature, _, message = raw.partition('.')
+    expected = hmac.new(key, message.encode(), hashlib.sha256).hexdigest()
+    return message if hmac.compare_digest(signature, expected) else None
+
+
+def _private_directory(directory: Path) -> bool:
+    """Create `directory` for this user only; False if it exists with an owner or mode others could abuse."""
+    directory.mkdir(mode=0o700, parents=True, exist_ok=True)
+    if not hasattr(os, 'getuid'):
+        return True  # Windows: no POSIX owner/mode to check
+    st = directory.stat()
+    return st.st_uid == os.getuid() and not st.st_mode & 0o077
+
+
+def _local_key(directory: Path) -> bytes:
+    """Random key shared by the workers using `directory`, created by whichever starts first."""
+    path = directory / _KEY_FILE
+    if not path.exists():
+        tmp = directory / f"{_KEY_FILE}.{os.getpid()}.{uuid.uuid4().hex}"
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, 'w') as fh:
+            fh.write(os.urandom(32).hex())
+        try:
+            os.link(tmp, path)  # atomic and fails if another worker won the race
+        except FileExistsError:
+            pass
+        finally:
+            tmp.unlink()
+    return bytes.fromhex(path.read_text().strip())
+
+
+class InvalidationBus:
+    def __init__(self, mode: str = INVALIDATION_BUS):
+        if mode == 'auto':
+            mode = 'postgres' if engine.dialect.name == 'postgresql' else 'local'
+        self.mode = mode
+        self.origin = uuid.uuid4().hex[:12]
+        self._handlers: Dict[str, List[Handler]] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._sock: Optional[socket.socket] = None
+        self._port_file: Optional[Path] = None
+        self._key: Optional[bytes] = INVALIDATION_SECRET.encode() if INVALIDATION_SECRET else None
+        self._seen: set = set()
+        self._seen_order: deque = deque()
+        if self.mode == 'postgres' and self._key is None:
+            logger.error("INVALIDATION_SECRET is not set; the postgres invalidation bus is disabled")
+            self.mode = 'off'
+
+    def _signing_key(self) -> Optional[bytes]:
+        """The HMAC key, loading the local key file on first use; None disables the bus."""
+        if self._key is None and self.mode == 'local':
+            directory = Path(INVALIDATION_BUS_DIR)
+            try:
+                if not _private_directory(directory):
+                    logger.error("Invalidation bus directory %s is not private to this user; bus disabled", directory)
+                    self.mode = 'off'
+                    return None
+                self._key = _local_key(directory)
+            except (OSError, ValueError) as e:
+                logger.error("Invalidation bus key unavailable, bus disabled: %s", e)
+                self.mode = 'off'
+        return self._key
+
+    def subscribe(self, entity: str, handler: Handler) -> None:
+        self._handlers.setdefault(entity, []).append(handler)
+
+    def publish(self, entity: str, entity_id: Optional[int] = None, payload: Optional[dict] = None) -> None:
+        self.publish_many([(entity, entity_id, payload)])
+
+    def publish_many(self, events: Iterable[Event]) -> None:
+        """Broadcast events to the other workers; never raises into the write path."""
+        events = list(events)
+        if self.mode == 'off' or not events:
+            return
+        try:
+            key = self._signing_key()
+            if key is None:
+                return
+            messages = [_sign(key, message) for message in _encode(self.origin, events)]
+            if self.mode == 'postgres':
+                with engine.connect() as conn:
+                    for message in messages:
+                        conn.execute(text("SELECT pg_notify(:channel, :payload)"), {'channel': INVALIDATION_CHANNEL, 'payload': message})
+                    conn.commit()
+            else:
+                self._send_local(messages)
+            INVALIDATION_EVENTS.inc(('published',), len(events))
+        except Exception as e:
+            logger.warning("Invalidation publish failed (%d events): %s", len(events), e)
+
+    def _send_local(self, messages: List[str]) -> None:
+        directory = Path(INVALIDATION_BUS_DIR)
+        if not directory.is_dir():
+            return
+        ports = []
+        for path in directory.glob('*.port'):
+            try:
+                ports.append(int(path.read_text()))
+            except (OSError, ValueError):
+                continue
+        own = self._sock.getsockname()[1] if self._sock is not None else None
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            for message in messages:
+                data = message.encode()
+                for port in ports:
+                    if port == own:
+                        continue
+                    try:
+                        sock.sendto(data, ('127.0.0.1', port))
+                    except OSError:
+                        pass  # worker gone; its port file is removed when it stops
+
+    def _dispatch(self, raw: str) -> None:
+        body = _verify(self._key, raw) if self._key is not None else None
+        if body is None:
+            INVALIDATION_EVENTS.inc(('rejected',))
+            logger.warning("Ignoring unsigned or forged invalidation message")
+            return
+        try:
+            message = json.loads(body)
+            age = time.time() - float(message['t'])
+            message_id = message['n']
+        except (ValueError, KeyError, TypeError):
+            logger.warning("Ignoring malformed invalidation message")
+            return
+        if message.get('o') == self.origin:
+            return
+        if not -INVALIDATION_MAX_AGE_SECONDS <= age <= INVALIDATION_MAX_AGE_SECONDS or message_id in self._seen:
+            INVALIDATION_EVENTS.inc(('rejected',))
+            logger.warning("Ignoring stale or replayed invalidation message (age %.1fs)", age)
+            return
+        self._seen.add(message_id)
+        self._seen_order.append(message_id)
+        if len(self._seen_order) > _MAX_SEEN_MESSAGES:
+            self._seen.discard(self._seen_order.popleft())
+        INVALIDATION_LAG_SECONDS.observe(max(0.0, age))
+        for entity, entity_id, payload in message.get('e', []):
+            INVALIDATION_EVENTS.inc(('received',))
+            for handler in self._handlers.get(entity, ()):
+                try:
+                    handler(entity_id, payload)
+                except Exception as e:
+                    logger.error("Invalidation handler for %s %s failed: %s", entity, entity_id, e, exc_info=True)
+
+    def start(self) -> None:
+        if self._thread is not None or self.mode == 'off' or self._signing_key() is None:
+            return
+        self._stop.clear()
+        if self.mode == 'local':
+            self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self._sock.bind(('127.0.0.1', 0))
+            self._sock.settimeout(1.0)
+            directory = Path(INVALIDATION_BUS_DIR)
+            self._port_file = directory / f"{os.getpid()}-{self.origin}.port"
+            self._port_file.write_text(str(self._sock.getsockname()[1]))
+            target = self._run_local
+        else:
+            target = self._run_postgres
+        self._thread = threading.Thread(target=target, name="invalidation-bus", daemon=True)
+        self._thread.start()
+        logger.info("Invalidation bus started (%s)", self.mode)
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout=5)
+        self._thread = None
+        if self._port_file is not None:
+            try:
+                self._port_file.unlink()
+            except OSError:
+                pass
+            self._port_file = None
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+    def _run_local(self) -> None:
+        while not self._stop.is_set():
+            try:
+                data, _ = self._sock.recvfrom(65536)
+            except socket.timeout:
+                continue
+            except OSError:
+                # Windows reports ICMP port-unreachable from earlier sends as a recv error
+                if self._stop.is_set():
+                    break
+                continue
+            self._dispatch(data.decode('utf-8', 'replace'))
+
+    def _run_postgres(self) -> None:
+        backoff = 1.0
+        while not self._stop.is_set():
+            raw = None
+            try:
+                raw = engine.raw_connection()
+                conn = raw.dbapi_connection
+                conn.autocommit = True
+                with conn.cursor() as cur:
+                    cur.execute(f'LISTEN "{INVALIDATION_CHANNEL}"')
+                backoff = 1.0
+                while not self._stop.is_set():
+                    if select.select([conn], [], [], 1.0) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        self._dispatch(conn.notifies.pop(0).payload)
+            except Exception as e:
+                logger.warning("Invalidation listener error, reconnecting in %.0fs: %s", backoff, e)
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, 30.0)
+            finally:
+                if raw is not None:
+                    try:
+                        raw.invalidate()  # LISTEN state must not return to the pool
+                    except Exception:
+                        pass
+
+
+# Global instance
+invalidation_bus = InvalidationBus()
@@ -0,0 +1,92 @@
+"""
+Pre-serialized JSON for list endpoints.
+
+Rows that never change once written, such as an alert or one specific
+prediction, are encoded to JSON bytes once, either when they are written or
+when they are first read. The bytes are kept in a bounded LRU keyed by the
+row's identity. List responses are assembled by joining cached fragments,
+so a warm GET /alerts or /dashboard/regions runs one narrow ID query and
+does no ORM, Pydantic or per-row encoding work.
+
+Fragments are encoded with orjson when it is installed and with the stdlib
+encoder otherwise. Both produce the compact UTF-8 JSON that FastAPI's
+JSONResponse would.
+"""
+import json
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable
+
+from ..metrics import JSON_FRAGMENTS
+
+try:
+    import orjson
+except ImportError:  # optional speedup
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+
+def dumps(value: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def join_array(fragments: Iterable[bytes]) -> bytes:
+    return b'[' + b','.join(fragments) + b']'
+
+
+class FragmentCache:
+    """Bounded LRU of key -> JSON bytes."""
+    def __init__(self, name: str, max_entries: int):
+        self.name = name
+        self.max_entries = max(1, max_entries)
+        self._items: "OrderedDict[Hashable, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get_many(self, keys: Iterable[Hashable]) -> Dict[Hashable, bytes]:
+        """Cached fragments for the keys that have one."""
+        found: Dict[Hashable, bytes] = {}
+        misses = 0
+        with self._lock:
+            items = self._items
+            for key in keys:
+                fragment = items.get(key)
+                if fragment is None:
+                    misses += 1
+                    continue
+                items.move_to_end(key)
+                found[key] = fragment
+        JSON_FRAGMENTS.inc((self.name, 'hit'), len(found))
+        if misses:
+            JSON_FRAGMENTS.inc((self.name, 'miss'), misses)
+        return found
+
+    def put(self, key: Hashable, value: Any) -> bytes:
+        """Encode `value`, cache it under `key` and return the bytes."""
+        fragment = dumps(value)
+        with self._lock:
+            self._items[key] = fragment
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+        return fragment
+
+    def discard(self, key: Hashable) -> None:
+        with self._lock:
+            self._items.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+
+# Global instances
+# Alerts are keyed by id; region rows by (region id, latest prediction id or None)
+alert_fragments = FragmentCache('alerts', 10000)
+region_fragments = FragmentCache('regions', 20000)
@@ -0,0 +1,125 @@
+"""
+Write coalescing for citizen location pings.
+
+POST /auth/me/location only records the point in memory; a newer ping from
+the same user replaces the pending one. A background thread flushes every
+LOCATION_FLUSH_INTERVAL seconds, or sooner once LOCATION_FLUSH_SIZE users
+are pending. Each chunk costs one SELECT of the users' current regions, one
+bulk UPDATE of positions, and one bulk UPDATE of location_region_id for the
+users whose point crossed a region boundary; only those are counted in
+location_region_changes_total.
+"""
+import logging
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import update
+
+from ..database import SessionLocal
+from ..metrics import LOCATION_PINGS, LOCATION_REGION_CHANGES
+from ..models import User
+from .region_locator import region_locator
+
+logger = logging.getLogger(__name__)
+
+LOCATION_FLUSH_INTERVAL = float(os.getenv('LOCATION_FLUSH_INTERVAL', '5'))
+LOCATION_FLUSH_SIZE = int(os.getenv('LOCATION_FLUSH_SIZE', '50000'))
+LOCATION_BATCH_SIZE = int(os.getenv('LOCATION_BATCH_SIZE', '1000'))
+
+
+class LocationBuffer:
+    def __init__(self, flush_interval: float = LOCATION_FLUSH_INTERVAL, flush_size: int = LOCATION_FLUSH_SIZE):
+        self.flush_interval = flush_interval
+        self.flush_size = max(1, flush_size)
+        self._pending: Dict[int, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, user_id: int, lat: float, lon: float) -> None:
+        """Record a ping; O(1), never touches the database."""
+        with self._lock:
+            coalesced = user_id in self._pending
+            self._pending[user_id] = (lat, lon)
+            full = len(self._pending) >= self.flush_size
+        LOCATION_PINGS.inc(('coalesced' if coalesced else 'buffered',))
+        if full:
+            self._wake.set()
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self) -> int:
+        """Write pending locations; returns the number of users updated."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return 0
+            user_ids = list(pending)
+            moved: List[int] = []
+            db = SessionLocal()
+            try:
+                for start in range(0, len(user_ids), LOCATION_BATCH_SIZE):
+                    chunk = user_ids[start:start + LOCATION_BATCH_SIZE]
+                    current = dict(db.query(User.id, User.location_region_id).filter(User.id.in_(chunk)))
+                    positions, regions = [], []
+                    for user_id in chunk:
+                        if user_id not in current:
+                            continue  # user deleted since the ping
+                        lat, lon = pending[user_id]
+                        positions.append({'id': user_id, 'location_lat': lat, 'location_lon': lon})
+                        old_region = current[user_id]
+                        new_region = region_locator.locate(lat, lon, hint=old_region)
+                        if new_region != old_region:
+                            regions.append({'id': user_id, 'location_region_id': new_region})
+                    if positions:
+                        db.execute(update(User), positions)
+                    if regions:
+                        db.execute(update(User), regions)
+                        moved.extend(r['id'] for r in regions)
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                logger.error("Failed to write %d locations: %s", len(pending), e, exc_info=True)
+                # Keep the points unless a newer ping arrived meanwhile
+                with self._lock:
+                    for user_id, point in pending.items():
+                        self._pending.setdefault(user_id, point)
+                return 0
+            finally:
+                db.close()
+        if moved:
+            LOCATION_REGION_CHANGES.inc(amount=len(moved))
+        logger.debug("Flushed %d locations (%d region changes)", len(pending), len(moved))
+        return len(pending)
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="location-buffer", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._wake.set()
+        self._thread.join(timeout=self.flush_interval * 2)
+        self._thread = None
+        self.flush()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+
+# Global instance
+location_buffer = LocationBuffer()
@@ -0,0 +1,338 @@
+"""
+One-time passcodes for phone login.
+
+Codes are kept only in memory, as HMAC digests keyed by OTP_SECRET, so a
+registration surge costs no DB writes or reads for the codes themselves.
+The TTL is fixed, which means codes expire in the order they were issued. A
+FIFO of (expires_at, phone, serial) therefore works as a single-slot timing
+wheel: each operation pops the expired head in O(1) per entry, and nothing
+ever has to scan the whole store.
+
+Issuing is throttled by token buckets per phone and per client IP
+(OTP_PHONE_RATE / OTP_IP_RATE as count/seconds), and each code accepts at
+most OTP_MAX_ATTEMPTS wrong guesses. Messages are queued and handed to
+sms_service by a background sender in batches, so request threads never
+wait on the provider. A second request for a phone that is still queued
+replaces the pending message.
+
+OTP_BACKEND=bus (the default) replicates issued and consumed codes, and
+every wrong guess, to the other workers over the invalidation bus. A code
+issued by one worker can then be verified on any of them, and the
+OTP_MAX_ATTEMPTS budget is shared rather than multiplied by the worker
+count; guesses racing on several workers inside the bus lag (milliseconds)
+are the only slack. Throttle buckets stay per worker. OTP_BACKEND=memory
+keeps codes in the issuing worker only and is for single-worker deployments.
+"""
+import hashlib
+import hmac
+import itertools
+import logging
+import os
+import secrets
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Deque, Dict, List, Optional, Tuple
+
+from ..metrics import OTP_EVENTS, OTP_SEND_BATCH
+from .invalidation_bus import invalidation_bus
+from .sms_service import sms_service
+
+logger = logging.getLogger(__name__)
+
+OTP_SECRET = (os.getenv('OTP_SECRET') or os.getenv('JWT_SECRET', 'change_me')).encode()
+OTP_LENGTH = int(os.getenv('OTP_LENGTH', '6'))
+OTP_TTL_SECONDS = float(os.getenv('OTP_TTL_SECONDS', '300'))
+OTP_MAX_ATTEMPTS = int(os.getenv('OTP_MAX_ATTEMPTS', '5'))
+OTP_PHONE_RATE = os.getenv('OTP_PHONE_RATE', '3/600')
+OTP_IP_RATE = os.getenv('OTP_IP_RATE', '30/60')
+# bus (replicated through the invalidation bus) or memory (single worker only)
+OTP_BACKEND = os.getenv('OTP_BACKEND', 'bus').lower()
+OTP_SEND_BATCH_SIZE = int(os.getenv('OTP_SEND_BATCH_SIZE', '100'))
+OTP_SEND_CONCURRENCY = int(os.getenv('OTP_SEND_CONCURRENCY', '8'))
+# Development only: issue this code instead of a random one (still hashed, throttled and expiring)
+OTP_FIXED_CODE = os.getenv('OTP_FIXED_CODE')
+
+# verify() results
+VERIFIED, INVALID, EXPIRED, LOCKED = 'verified', 'invalid', 'expired', 'locked'
+
+
+def parse_rate(spec: str) -> Tuple[float, float]:
+    """'count/seconds' -> (bucket capacity, tokens refilled per second)."""
+    count, _, seconds = spec.partition('/')
+    capacity = max(1.0, float(count))
+    return capacity, capacity / max(float(seconds or 1), 1e-9)
+
+
+class TokenBuckets:
+    """One token bucket per key. Not thread-safe; callers hold their own lock."""
+    def __init__(self, capacity: float, rate: float):
+        self.capacity = capacity
+        self.rate = rate
+        self._buckets: Dict[str, Tuple[float, float]] = {}  # key -> (tokens, updated_at)
+        self._next_sweep = 0.0
+
+    def take(self, key: str, now: float) -> float:
+        """Consume one token; returns 0 on success, else seconds until one is available."""
+        tokens, updated = self._buckets.get(key, (self.capacity, now))
+        tokens = min(self.capacity, tokens + (now - updated) * self.rate)
+        if tokens < 1:
+            self._buckets[key] = (tokens, now)
+            return (1 - tokens) / self.rate
+        self._buckets[key] = (tokens - 1, now)
+        return 0.0
+
+    def sweep(self, now: float) -> None:
+        # A bucket that has refilled completely is the same as no bucket; at most one pass per refill period
+        if now < self._next_sweep:
+            return
+        self._next_sweep = now + self.capacity / self.rate
+        self._buckets = {
+            key: (tokens, updated)
+            for key, (tokens, updated) in self._buckets.items()
+            if tokens + (now - updated) * self.rate < self.capacity
+        }
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class _Code:
+    __slots__ = ('digest', 'expires_at', 'attempts', 'serial')
+
+    def __init__(self, digest: bytes, expires_at: float, serial: int):
+        self.digest = digest
+        self.expires_at = expires_at
+        self.attempts = 0
+        self.serial = serial
+
+
+def _digest(phone: str, code: str) -> bytes:
+    return hmac.new(OTP_SECRET, f"{phone}:{code}".encode(), hashlib.sha256).digest()[:16]
+
+
+class OtpSender:
+    """Queues OTP messages and sends them through sms_service in batches."""
+    def __init__(self, batch_size: int = OTP_SEND_BATCH_SIZE, concurrency: int = OTP_SEND_CONCURRENCY):
+        self.batch_size = max(1, batch_size)
+        self.concurrency = max(1, concurrency)
+        self._pending: Dict[str, str] = {}  # phone -> message; newest request wins
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pool: Optional[ThreadPoolExecutor] = None
+
+    def enqueue(self, phone: str, message: str) -> None:
+        if self._thread is None:
+            # Sender not running (scripts, tests without the app lifespan): send inline
+            sms_service.send_sms(phone, message)
+            return
+        with self._lock:
+            self._pending.pop(phone, None)
+            self._pending[phone] = message
+        self._wake.set()
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def _take_batch(self) -> List[Tuple[str, str]]:
+        with self._lock:
+            batch = []
+            while self._pending and len(batch) < self.batch_size:
+                phone = next(iter(self._pending))
+                batch.append((phone, self._pending.pop(phone)))
+            return batch
+
+    def _send(self, item: Tuple[str, str]) -> bool:
+        return sms_service.send_sms(*item)
+
+    def drain(self) -> int:
+        """Send everything queued; returns the number of messages handed to the provider."""
+        sent = 0
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                return sent
+            OTP_SEND_BATCH.observe(len(batch))
+            if self._pool is None or len(batch) == 1:
+                results = [self._send(item) for item in batch]
+            else:
+                results = list(self._pool.map(self._send, batch))
+            failed = results.count(False)
+            if failed:
+                logger.warning("%d of %d OTP messages failed to send", failed, len(batch))
+            sent += len(batch)
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="otp-send")
+        self._thread = threading.Thread(target=self._run, name="otp-sender", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._wake.set()
+        self._thread.join(timeout=10)
+        self._thread = None
+        self.drain()
+        self._pool.shutdown(wait=True)
+        self._pool = None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait()
+            self._wake.clear()
+            try:
+                self.drain()
+            except Exception as e:
+                logger.error("OTP sender pass failed: %s", e, exc_info=True)
+
+
+class OtpService:
+    def __init__(
+        self,
+        sender: OtpSender,
+        ttl: float = OTP_TTL_SECONDS,
+        max_attempts: int = OTP_MAX_ATTEMPTS,
+        phone_rate: str = OTP_PHONE_RATE,
+        ip_rate: str = OTP_IP_RATE,
+        replicate: bool = OTP_BACKEND == 'bus',
+    ):
+        self.sender = sender
+        self.ttl = ttl
+        self.max_attempts = max(1, max_attempts)
+        self.replicate = replicate
+        self._lock = threading.Lock()
+        self._codes: Dict[str, _Code] = {}
+        self._expiry: Deque[Tuple[float, str, int]] = deque()
+        self._serial = itertools.count()
+        self._phone_buckets = TokenBuckets(*parse_rate(phone_rate))
+        self._ip_buckets = TokenBuckets(*parse_rate(ip_rate))
+
+    def _expire(self, now: float) -> None:
+        expiry = self._expiry
+        while expiry and expiry[0][0] <= now:
+            _, phone, serial = expiry.popleft()
+            entry = self._codes.get(phone)
+            # A reissued code has a new serial; its own FIFO entry comes later
+            if entry is not None and entry.serial == serial:
+                del self._codes[phone]
+                OTP_EVENTS.inc(('expired',))
+
+    def _store(self, phone: str, digest: bytes, expires_at: float) -> None:
+        serial = next(self._serial)
+        self._codes[phone] = _Code(digest, expires_at, serial)
+        self._expiry.append((expires_at, phone, serial))
+
+    def request_code(self, phone: str, client_ip: Optional[str] = None) -> float:
+        """
+        Issue a new code for `phone` and queue it for sending.
+
+        Returns 0 when a code was issued, or the number of seconds to wait
+        when the phone or the client IP is over its rate limit. A new code
+        replaces any earlier one for the phone.
+        """
+        wait = self.check_rate(phone, client_ip)
+        if not wait:
+            self.issue_code(phone)
+        return wait
+
+    def check_rate(self, phone: str, client_ip: Optional[str] = None) -> float:
+        """
+        Take a code request from the phone's and the client IP's buckets.
+
+        Returns 0 when the request may go ahead, else the seconds to wait.
+        Callers that must write something first call issue_code() once that
+        write has committed.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._ip_buckets.sweep(now)
+            self._phone_buckets.sweep(now)
+            if client_ip:
+                wait = self._ip_buckets.take(client_ip, now)
+                if wait:
+                    OTP_EVENTS.inc(('throttled_ip',))
+                    return wait
+            wait = self._phone_buckets.take(phone, now)
+            if wait:
+                OTP_EVENTS.inc(('throttled_phone',))
+                return wait
+        return 0.0
+
+    def issue_code(self, phone: str) -> None:
+        """Issue a new code for `phone`, replacing any earlier one, and queue it for sending."""
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            code = OTP_FIXED_CODE or f"{secrets.randbelow(10 ** OTP_LENGTH):0{OTP_LENGTH}d}"
+            digest = _digest(phone, code)
+            self._store(phone, digest, now + self.ttl)
+        OTP_EVENTS.inc(('issued',))
+        if self.replicate:
+            # Peers keep their own monotonic clocks, so send a lifetime rather than a deadline
+            invalidation_bus.publish('otp', None, {'phone': phone, 'digest': digest.hex(), 'ttl': self.ttl})
+        minutes = max(1, int(self.ttl // 60))
+        self.sender.enqueue(phone, f"Your AegisFlood verification code is {code}. It expires in {minutes} minutes.")
+
+    def verify(self, phone: str, code: str) -> str:
+        """Check a code; returns VERIFIED, INVALID, EXPIRED (no live code) or LOCKED."""
+        now = time.monotonic()
+        consumed = missed = None
+        with self._lock:
+            self._expire(now)
+            entry = self._codes.get(phone)
+            if entry is None or entry.expires_at <= now:
+                result = EXPIRED
+            elif hmac.compare_digest(entry.digest, _digest(phone, code)):
+                del self._codes[phone]
+                consumed, result = entry.digest, VERIFIED
+            else:
+                entry.attempts += 1
+                missed, result = entry.digest, INVALID
+                if entry.attempts >= self.max_attempts:
+                    del self._codes[phone]
+                    consumed, missed, result = entry.digest, None, LOCKED
+        OTP_EVENTS.inc((result,))
+        if self.replicate:
+            if consumed is not None:
+                invalidation_bus.publish('otp', None, {'phone': phone, 'consumed': consumed.hex()})
+            elif missed is not None:
+                invalidation_bus.publish('otp', None, {'phone': phone, 'missed': missed.hex()})
+        return result
+
+    def apply_remote(self, _id, payload: dict) -> None:
+        """Invalidation bus handler for codes issued, guessed wrong or consumed on another worker."""
+        phone = payload['phone']
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            if 'consumed' in payload or 'missed' in payload:
+                entry = self._codes.get(phone)
+                if entry is None or entry.digest.hex() != payload.get('consumed', payload.get('missed')):
+                    return
+                if 'missed' in payload:
+                    entry.attempts += 1
+                    if entry.attempts < self.max_attempts:
+                        return
+                del self._codes[phone]
+            else:
+                # Bus lag can put this slightly out of FIFO order; verify() still checks expires_at
+                self._store(phone, bytes.fromhex(payload['digest']), now + float(payload['ttl']))
+
+    def pending_codes(self) -> int:
+        with self._lock:
+            self._expire(time.monotonic())
+            return len(self._codes)
+
+
+# Global instances
+otp_sender = OtpSender()
+otp_service = OtpService(otp_sender)
@@ -0,0 +1,320 @@
+"""
+Flood prediction engines and the model registry.
+
+Engines score a batch of per-region feature dicts at once. Besides the
+original rule-based engine, versioned model artifacts are loaded from
+MODEL_DIR at startup: JSON files holding plain weight arrays for logistic
+regression or gradient-boosted trees (as exported from scikit-learn /
+XGBoost), e.g.
+
+    {"name": "flood-logistic", "version": "1", "type": "logistic",
+     "features": [...], "weights": [...], "bias": 0.0,
+     "means": [...], "scales": [...], "thresholds": {"medium": 30, "high": 60}}
+
+PREDICTION_MODEL picks the serving model ("name:version"); a candidate can
+be rolled out to a share of regions with PREDICTION_CANDIDATE_MODEL and
+PREDICTION_CANDIDATE_PERCENT. Assignment is by region id so a region always
+sees the same model, and every stored prediction records the model key and
+inference time in weather_data for A/B comparison.
+"""
+import json
+import logging
+import math
+import os
+import random
+import threading
+import time
+from abc import ABC, abstractmethod
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from ..metrics import MODEL_INFERENCE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+MODEL_DIR = os.getenv('MODEL_DIR', str(Path(__file__).resolve().parent.parent.parent / 'data' / 'models'))
+PREDICTION_MODEL = os.getenv('PREDICTION_MODEL', 'rules:1')
+PREDICTION_CANDIDATE_MODEL = os.getenv('PREDICTION_CANDIDATE_MODEL')
+PREDICTION_CANDIDATE_PERCENT = int(os.getenv('PREDICTION_CANDIDATE_PERCENT', '0'))
+FEATURE_CACHE_TTL_SECONDS = float(os.getenv('FEATURE_CACHE_TTL_SECONDS', '300'))
+
+FEATURES = ('rainfall_1h', 'rainfall_24h', 'rainfall_72h', 'soil_moisture', 'river_level', 'temperature')
+
+DEFAULT_THRESHOLDS = {'medium': 30, 'high': 60}
+
+
+def risk_level_for(score: int, thresholds: Dict[str, int] = DEFAULT_THRESHOLDS) -> str:
+    if score >= thresholds['high']:
+        return 'high'
+    if score >= thresholds['medium']:
+        return 'medium'
+    return 'low'
+
+
+def _sigmoid(x: float) -> float:
+    if x >= 0:
+        return 1.0 / (1.0 + math.exp(-x))
+    z = math.exp(x)
+    return z / (1.0 + z)
+
+
+class PredictionEngine(ABC):
+    """Scores a batch of feature dicts; returns (risk_level, risk_score) per row."""
+    name = ''
+    version = ''
+
+    @property
+    def key(self) -> str:
+        return f"{self.name}:{self.version}"
+
+    @abstractmethod
+    def predict_batch(self, rows: Sequence[Dict[str, float]]) -> List[Tuple[str, int]]:
+        ...
+
+
+class SimplePredictionEngine(PredictionEngine):
+    """
+    Simple rule-based flood prediction engine (MVP).
+
+    Uses rainfall data to calculate risk levels:
+    - High: >100mm rainfall
+    - Medium: 50-100mm rainfall
+    - Low: <50mm rainfall
+    """
+    name = 'rules'
+    version = '1'
+
+    def _score(self, rainfall_24h: float) -> Tuple[str, int]:
+        if rainfall_24h > 100:
+            return 'high', min(90, 60 + int(rainfall_24h - 100))
+        if rainfall_24h > 50:
+            return 'medium', 30 + int(rainfall_24h - 50)
+        return 'low', max(10, int(rainfall_24h))
+
+    def predict_batch(self, rows: Sequence[Dict[str, float]]) -> List[Tuple[str, int]]:
+        return [self._score(row.get('rainfall_24h', 0.0)) for row in rows]
+
+    def predict_flood_risk(self, region_id: int, weather_data: Dict) -> Dict:
+        rainfall_24h = weather_data.get('rainfall_24h', random.uniform(0, 150))
+        risk_level, risk_score = self._score(rainfall_24h)
+        return {
+            'region_id': region_id,
+            'risk_level': risk_level,
+            'risk_score': risk_score,
+            'factors': {
+                'rainfall_24h': rainfall_24h,
+                'prediction_method': 'simple_rules'
+            },
+            'valid_until': date.today() + timedelta(days=1)
+        }
+
+
+class LogisticModel(PredictionEngine):
+    def __init__(self, artifact: dict):
+        self.name = artifact['name']
+        self.version = str(artifact['version'])
+        self.features = tuple(artifact['features'])
+        self.thresholds = {**DEFAULT_THRESHOLDS, **artifact.get('thresholds', {})}
+        weights = artifact['weights']
+        means = artifact.get('means') or [0.0] * len(weights)
+        scales = artifact.get('scales') or [1.0] * len(weights)
+        if not (len(weights) == len(means) == len(scales) == len(self.features)):
+            raise ValueError("weights, means, scales and features must have the same length")
+        # Fold standardization into the weights once: w·(x-m)/s + b == (w/s)·x + (b - Σ w·m/s)
+        self.coef = [w / s for w, s in zip(weights, scales)]
+        self.intercept = artifact.get('bias', 0.0) - sum(w * m / s for w, m, s in zip(weights, means, scales))
+
+    def predict_batch(self, rows: Sequence[Dict[str, float]]) -> List[Tuple[str, int]]:
+        coef, intercept, features = self.coef, self.intercept, self.features
+        results = []
+        for row in rows:
+            z = intercept
+            for c, f in zip(coef, features):
+                z += c * row.get(f, 0.0)
+            score = int(round(100 * _sigmoid(z)))
+            results.append((risk_level_for(score, self.thresholds), score))
+        return results
+
+
+class GradientBoostedModel(PredictionEngine):
+    """
+    Binary-logistic tree ensemble.
+
+    Each tree is a set of parallel arrays (feature, threshold, left, right,
+    value); a node with left == -1 is a leaf and `value` holds its output.
+    """
+    def __init__(self, artifact: dict):
+        self.name = artifact['name']
+        self.version = str(artifact['version'])
+        self.features = tuple(artifact['features'])
+        self.thresholds = {**DEFAULT_THRESHOLDS, **artifact.get('thresholds', {})}
+        self.base_score = artifact.get('base_score', 0.0)
+        self.learning_rate = artifact.get('learning_rate', 1.0)
+        self.trees = [
+            (t['feature'], t['threshold'], t['left'], t['right'], t['value'])
+            for t in artifact['trees']
+        ]
+
+    def predict_batch(self, rows: Sequence[Dict[str, float]]) -> List[Tuple[str, int]]:
+        vectors = [[row.get(f, 0.0) for f in self.features] for row in rows]
+        margins = [self.base_score] * len(rows)
+        # Tree-major order keeps one tree's arrays hot across the whole batch
+        for feature, threshold, left, right, value in self.trees:
+            for i, x in enumerate(vectors):
+                node = 0
+                while left[node] != -1:
+                    node = left[node] if x[feature[node]] < threshold[node] else right[node]
+                margins[i] += self.learning_rate * value[node]
+        results = []
+        for margin in margins:
+            score = int(round(100 * _sigmoid(margin)))
+            results.append((risk_level_for(score, self.thresholds), score))
+        return results
+
+
+MODEL_TYPES = {'logistic': LogisticModel, 'gbdt': GradientBoostedModel}
+
+
+class FeatureCache:
+    """
+    Per-region model inputs, cached for FEATURE_CACHE_TTL_SECONDS.
+
+    There is no weather feed yet, so features are synthesized (the MVP drew
+    random rainfall too); fetch() is the seam for a real source.
+    """
+    def __init__(self, ttl: float = FEATURE_CACHE_TTL_SECONDS):
+        self.ttl = ttl
+        self._entries: Dict[int, Tuple[float, Dict[str, float]]] = {}
+        self._lock = threading.Lock()
+
+    def fetch(self, region_ids: Sequence[int]) -> Dict[int, Dict[str, float]]:
+        rng = random.Random()
+        features = {}
+        for region_id in region_ids:
+            rainfall_24h = rng.uniform(0, 150)
+            rainfall_72h = rainfall_24h + rng.uniform(0, 150)
+            features[region_id] = {
+                'rainfall_1h': round(rainfall_24h * rng.uniform(0, 0.2), 2),
+                'rainfall_24h': round(rainfall_24h, 2),
+                'rainfall_72h': round(rainfall_72h, 2),
+                'soil_moisture': round(min(1.0, 0.2 + rainfall_72h / 400 + rng.uniform(-0.05, 0.05)), 3),
+                'river_level': round(rainfall_72h / 100 + rng.uniform(-0.3, 0.3), 2),
+                'temperature': round(rng.uniform(20, 35), 1),
+            }
+        return features
+
+    def get_many(self, region_ids: Sequence[int]) -> Dict[int, Dict[str, float]]:
+        now = time.monotonic()
+        found: Dict[int, Dict[str, float]] = {}
+        with self._lock:
+            for region_id in region_ids:
+                entry = self._entries.get(region_id)
+                if entry is not None and now - entry[0] < self.ttl:
+                    found[region_id] = entry[1]
+        missing = [r for r in region_ids if r not in found]
+        if missing:
+            fetched = self.fetch(missing)
+            with self._lock:
+                for region_id, values in fetched.items():
+                    self._entries[region_id] = (now, values)
+            found.update(fetched)
+        return found
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class ModelRegistry:
+    def __init__(self):
+        rules = SimplePredictionEngine()
+        self._models: Dict[str, PredictionEngine] = {rules.key: rules}
+        self.active_key = rules.key
+        self.candidate_key: Optional[str] = None
+        self.candidate_percent = 0
+        self._lock = threading.Lock()
+
+    @property
+    def models(self) -> List[str]:
+        return sorted(self._models)
+
+    def load(
+        self,
+        model_dir: str = MODEL_DIR,
+        active: str = PREDICTION_MODEL,
+        candidate: Optional[str] = PREDICTION_CANDIDATE_MODEL,
+        candidate_percent: int = PREDICTION_CANDIDATE_PERCENT,
+    ) -> int:
+        """Load every *.json artifact in `model_dir` and select the active/candidate models."""
+        rules = SimplePredictionEngine()
+        models: Dict[str, PredictionEngine] = {rules.key: rules}
+        path = Path(model_dir)
+        for artifact_path in sorted(path.glob('*.json')) if path.is_dir() else []:
+            try:
+                artifact = json.loads(artifact_path.read_text(encoding='utf-8'))
+                model = MODEL_TYPES[artifact['type']](artifact)
+            except (OSError, ValueError, KeyError, TypeError, IndexError) as e:
+                logger.warning("Skipping model artifact %s: %s", artifact_path.name, e)
+                continue
+            models[model.key] = model
+
+        if active not in models:
+            logger.warning("Prediction model %s not found; using %s", active, rules.key)
+            active = rules.key
+        if candidate and candidate not in models:
+            logger.warning("Candidate model %s not found; A/B rollout disabled", candidate)
+            candidate = None
+        with self._lock:
+            self._models = models
+            self.active_key = active
+            self.candidate_key = candidate
+            self.candidate_percent = max(0, min(100, candidate_percent)) if candidate else 0
+        logger.info(
+            "Model registry loaded %d models; active %s, candidate %s (%d%%)",
+            len(models), active, candidate, self.candidate_percent,
+        )
+        return len(models)
+
+    def get(self, key: str) -> Optional[PredictionEngine]:
+        return self._models.get(key)
+
+    def engine_for(self, region_id: int) -> PredictionEngine:
+        """Serving model for a region; a fixed hash bucket of regions gets the candidate."""
+        if self.candidate_key and (region_id * 2654435761) % 4294967296 % 100 < self.candidate_percent:
+            return self._models[self.candidate_key]
+        return self._models[self.active_key]
+
+    def predict(self, features: Dict[int, Dict[str, float]]) -> Dict[int, Dict]:
+        """
+        Score every region in one batch per serving model.
+
+        Returns region_id -> {risk_level, risk_score, model, inference_ms}.
+        """
+        groups: Dict[str, List[int]] = {}
+        engines: Dict[str, PredictionEngine] = {}
+        for region_id in features:
+            engine = self.engine_for(region_id)
+            engines[engine.key] = engine
+            groups.setdefault(engine.key, []).append(region_id)
+
+        results: Dict[int, Dict] = {}
+        for key, region_ids in groups.items():
+            start = time.perf_counter()
+            scores = engines[key].predict_batch([features[r] for r in region_ids])
+            elapsed = time.perf_counter() - start
+            MODEL_INFERENCE_SECONDS.observe(elapsed, (key,))
+            per_row_ms = round(elapsed * 1000 / len(region_ids), 4)
+            for region_id, (risk_level, risk_score) in zip(region_ids, scores):
+                results[region_id] = {
+                    'risk_level': risk_level,
+                    'risk_score': max(0, min(100, risk_score)),
+                    'model': key,
+                    'inference_ms': per_row_ms,
+                }
+        return results
+
+
+# Global instances
+model_registry = ModelRegistry()
+feature_cache = FeatureCache()
@@ -0,0 +1,435 @@
+"""
+Prediction history retention.
+
+Raw flood_predictions rows are folded into per-region hourly and daily
+rollups (count, min/max/sum of score, peak risk level) incrementally from an
+id watermark. The watermark only moves past rows older than
+ROLLUP_SETTLE_SECONDS, so a prediction whose id was allocated earlier but
+committed later is still visible when the rollup reaches it. Raw rows older
+than the retention age that are already rolled up are then deleted in
+batches and, optionally, appended to a gzip NDJSON archive once each delete
+has committed. The latest prediction of each region is always kept.
+
+Every worker runs the scheduler, so a run first claims a lease row in
+maintenance_state; workers that find it held skip the run.
+"""
+import os
+import gzip
+import json
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from ..database import SessionLocal
+from ..models import FloodPrediction, MaintenanceState, PredictionRollup
+from .alert_coalescer import RISK_RANK
+
+logger = logging.getLogger(__name__)
+
+PREDICTION_RETENTION_DAYS = int(os.getenv('PREDICTION_RETENTION_DAYS', '30'))
+ROLLUP_HOURLY_RETENTION_DAYS = int(os.getenv('ROLLUP_HOURLY_RETENTION_DAYS', '180'))
+PREDICTION_RETENTION_BATCH_SIZE = int(os.getenv('PREDICTION_RETENTION_BATCH_SIZE', '5000'))
+PREDICTION_RETENTION_INTERVAL_SECONDS = float(os.getenv('PREDICTION_RETENTION_INTERVAL_SECONDS', '3600'))
+# Rows younger than this may still have uncommitted predecessors and are left for the next run
+ROLLUP_SETTLE_SECONDS = int(os.getenv('ROLLUP_SETTLE_SECONDS', '300'))
+PREDICTION_RETENTION_LEASE_SECONDS = int(os.getenv('PREDICTION_RETENTION_LEASE_SECONDS', '600'))
+PREDICTION_RETENTION_ENABLED = os.getenv('PREDICTION_RETENTION_ENABLED', 'true').lower() == 'true'
+# Unset: pruned rows are deleted without an archive copy
+PREDICTION_ARCHIVE_DIR = os.getenv('PREDICTION_ARCHIVE_DIR')
+
+GRANULARITIES = ('hour', 'day')
+
+_WATERMARK_KEY = 'prediction_rollup_watermark'
+_LEASE_KEY = 'prediction_retention_lease'
+
+_BucketKey = Tuple[int, str, datetime]
+
+
+def bucket_start(moment: datetime, granularity: str) -> datetime:
+    if granularity == 'hour':
+        return moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _peak(a: str, b: str) -> str:
+    return a if RISK_RANK.get(a, -1) >= RISK_RANK.get(b, -1) else b
+
+
+def _fold(buckets: Dict, key, level: str, score: int) -> None:
+    """Add one prediction to its bucket's [count, min, max, sum, peak level]."""
+    agg = buckets.get(key)
+    if agg is None:
+        buckets[key] = [1, score, score, score, level]
+    else:
+        agg[0] += 1
+        agg[1] = min(agg[1], score)
+        agg[2] = max(agg[2], score)
+        agg[3] += score
+        agg[4] = _peak(agg[4], level)
+
+
+def merge_bucket(agg: List, other: List) -> List:
+    """Combine two [count, min, max, sum, peak level] aggregates of the same bucket."""
+    return [
+        agg[0] + other[0], min(agg[1], other[1]), max(agg[2], other[2]),
+        agg[3] + other[3], _peak(agg[4], other[4]),
+    ]
+
+
+def _get_state(db: Session, key: str) -> int:
+    state = db.get(MaintenanceState, key)
+    if state is not None:
+        return state.value
+    try:
+        db.add(MaintenanceState(key=key, value=0))
+        db.commit()
+    except IntegrityError:
+        db.rollback()  # another worker created it first
+    return db.get(MaintenanceState, key).value
+
+
+def _get_watermark(db: Session) -> int:
+    return _get_state(db, _WATERMARK_KEY)
+
+
+def _compare_and_set(db: Session, key: str, old: int, new: int) -> bool:
+    result = db.execute(
+        update(MaintenanceState)
+        .where(MaintenanceState.key == key, MaintenanceState.value == old)
+        .values(value=new)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+class RetentionLease:
+    """
+    Cross-worker mutex for a retention run, held as an expiry time in maintenance_state.
+
+    The row's value is the epoch second the lease runs out; a worker claims
+    it by compare-and-set once it has expired, so a crashed holder blocks
+    others for at most `ttl` seconds. Long runs renew it between batches.
+    """
+    def __init__(self, db: Session, ttl: int = PREDICTION_RETENTION_LEASE_SECONDS):
+        self.db = db
+        self.ttl = ttl
+        self._expires: Optional[int] = None
+
+    def claim(self) -> bool:
+        db = self.db
+        current = _get_state(db, _LEASE_KEY)
+        now = int(time.time())
+        if current > now:
+            return False
+        expires = now + self.ttl
+        if not _compare_and_set(db, _LEASE_KEY, current, expires):
+            db.rollback()
+            return False
+        db.commit()
+        self._expires = expires
+        return True
+
+    def renew(self) -> bool:
+        """Extend the lease; False once another worker has taken it over."""
+        if self._expires is None:
+            return False
+        expires = max(self._expires, int(time.time()) + self.ttl)
+        if expires != self._expires:
+            if not _compare_and_set(self.db, _LEASE_KEY, self._expires, expires):
+                self.db.rollback()
+                self._expires = None
+                return False
+            self.db.commit()
+            self._expires = expires
+        return True
+
+    def release(self) -> None:
+        if self._expires is None:
+            return
+        try:
+            _compare_and_set(self.db, _LEASE_KEY, self._expires, 0)
+            self.db.commit()
+        except SQLAlchemyError as e:
+            self.db.rollback()
+            logger.warning("Could not release the retention lease; it expires on its own: %s", e)
+        self._expires = None
+
+
+def _advance_watermark(db: Session, old: int, new: int) -> bool:
+    """Compare-and-set so concurrent workers never fold the same rows twice."""
+    return _compare_and_set(db, _WATERMARK_KEY, old, new)
+
+
+def _merge_rollups(db: Session, buckets: Dict[_BucketKey, List]) -> None:
+    for granularity in GRANULARITIES:
+        keys = [k for k in buckets if k[1] == granularity]
+        if not keys:
+            continue
+        existing = (
+            db.query(PredictionRollup)
+            .filter(
+                PredictionRollup.granularity == granularity,
+                PredictionRollup.region_id.in_(sorted({k[0] for k in keys})),
+                PredictionRollup.bucket_start.in_(sorted({k[2] for k in keys})),
+            )
+            .all()
+        )
+        found = {(r.region_id, r.granularity, r.bucket_start): r for r in existing}
+        new_rows = []
+        for key in keys:
+            count, low, high, total, peak = buckets[key]
+            row = found.get(key)
+            if row is None:
+                new_rows.append({
+                    'region_id': key[0], 'granularity': granularity, 'bucket_start': key[2],
+                    'count': count, 'min_score': low, 'max_score': high,
+                    'sum_score': total, 'peak_level': peak,
+                })
+            else:
+                row.count += count
+                row.min_score = min(row.min_score, low)
+                row.max_score = max(row.max_score, high)
+                row.sum_score += total
+                row.peak_level = _peak(row.peak_level, peak)
+        if new_rows:
+            db.execute(insert(PredictionRollup), new_rows)
+
+
+def rollup_predictions(
+    db: Session,
+    batch_size: int = PREDICTION_RETENTION_BATCH_SIZE,
+    now: Optional[datetime] = None,
+    settle_seconds: int = ROLLUP_SETTLE_SECONDS,
+) -> int:
+    """Fold settled raw predictions above the watermark into rollups; returns rows processed."""
+    settled_before = (now or datetime.utcnow()) - timedelta(seconds=settle_seconds)
+    processed = 0
+    while True:
+        watermark = _get_watermark(db)
+        rows = (
+            db.query(
+                FloodPrediction.id,
+                FloodPrediction.region_id,
+                FloodPrediction.risk_level,
+                FloodPrediction.risk_score,
+                FloodPrediction.created_at,
+            )
+            .filter(FloodPrediction.id > watermark)
+            .order_by(FloodPrediction.id)
+            .limit(batch_size)
+            .all()
+        )
+        fetched = len(rows)
+        # Stop at the first unsettled row so the watermark cannot pass an id that is not yet committed
+        for index, row in enumerate(rows):
+            if row.created_at >= settled_before:
+                rows = rows[:index]
+                break
+        if not rows:
+            break
+
+        buckets: Dict[_BucketKey, List] = {}
+        for _, region_id, level, score, created_at in rows:
+            for granularity in GRANULARITIES:
+                _fold(buckets, (region_id, granularity, bucket_start(created_at, granularity)), level, score)
+
+        try:
+            _merge_rollups(db, buckets)
+            if not _advance_watermark(db, watermark, rows[-1].id):
+                db.rollback()
+                logger.info("Rollup watermark moved by another worker; stopping this run")
+                break
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            logger.info("Concurrent rollup detected; stopping this run")
+            break
+        processed += len(rows)
+        if len(rows) < fetched or fetched < batch_size:
+            break
+    return processed
+
+
+def pending_buckets(db: Session, region_id: int, granularity: str, start: datetime, end: datetime) -> Dict[datetime, List]:
+    """
+    A region's raw predictions not yet folded into rollups (above the
+    watermark), aggregated like rollups by bucket start in [start, end).
+
+    Read it after the rollups: a rollup committing in between can then only
+    leave rows out of this view, never count them twice.
+    """
+    watermark = (
+        select(func.coalesce(func.max(MaintenanceState.value), 0))
+        .where(MaintenanceState.key == _WATERMARK_KEY)
+        .scalar_subquery()
+    )
+    rows = db.query(FloodPrediction.risk_level, FloodPrediction.risk_score, FloodPrediction.created_at).filter(
+        FloodPrediction.region_id == region_id,
+        FloodPrediction.id > watermark,
+        FloodPrediction.created_at >= start,
+    )
+    buckets: Dict[datetime, List] = {}
+    for level, score, created_at in rows:
+        key = bucket_start(created_at, granularity)
+        # Same bounds as the rollup query: whole buckets starting inside [start, end)
+        if start <= key < end:
+            _fold(buckets, key, level, score)
+    return buckets
+
+
+def _archive_record(r: FloodPrediction) -> dict:
+    return {
+        'id': r.id,
+        'region_id': r.region_id,
+        'prediction_date': r.prediction_date.isoformat() if r.prediction_date else None,
+        'risk_level': r.risk_level,
+        'risk_score': r.risk_score,
+        'weather_data': r.weather_data,
+        'created_at': r.created_at.isoformat() if r.created_at else None,
+    }
+
+
+def _archive(records: List[dict], archive_dir: Path, now: datetime) -> None:
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    path = archive_dir / f"flood_predictions-{now:%Y%m%d}.ndjson.gz"
+    # Appending opens a new gzip member; readers (zcat, gzip.open) see one stream
+    with gzip.open(path, 'at', encoding='utf-8') as fh:
+        for record in records:
+            fh.write(json.dumps(record) + '\n')
+
+
+def prune_predictions(
+    db: Session,
+    now: Optional[datetime] = None,
+    retention_days: int = PREDICTION_RETENTION_DAYS,
+    batch_size: int = PREDICTION_RETENTION_BATCH_SIZE,
+    archive_dir: Optional[str] = PREDICTION_ARCHIVE_DIR,
+    lease: Optional[RetentionLease] = None,
+) -> int:
+    """
+    Delete (and optionally archive) rolled-up raw rows older than the retention age.
+
+    With a `lease`, it is renewed before every batch and the run stops if it
+    has been lost. Rows are archived only after their delete commits, and
+    only those this run deleted, so archives never hold a row twice.
+    """
+    now = now or datetime.utcnow()
+    cutoff = now - timedelta(days=retention_days)
+    watermark = _get_watermark(db)
+    latest_ids = {
+        latest for (latest,) in db.query(func.max(FloodPrediction.id)).group_by(FloodPrediction.region_id)
+    }
+
+    deleted = 0
+    last_id = 0
+    while True:
+        if lease is not None and not lease.renew():
+            logger.warning("Retention lease lost; stopping prune after %d rows", deleted)
+            return deleted
+        query = db.query(FloodPrediction) if archive_dir else db.query(FloodPrediction.id)
+        batch = (
+            query
+            .filter(
+                FloodPrediction.id > last_id,
+                FloodPrediction.id <= watermark,
+                FloodPrediction.created_at < cutoff,
+            )
+            .order_by(FloodPrediction.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not batch:
+            break
+        last_id = batch[-1].id
+        victims = [r for r in batch if r.id not in latest_ids]
+        if victims:
+            # Copied out before the commit expires the rows; written only once the delete has
+            # committed, so a failed or lost batch is retried without duplicate archive entries
+            records = [_archive_record(r) for r in victims] if archive_dir else []
+            removed = set(db.execute(
+                delete(FloodPrediction)
+                .where(FloodPrediction.id.in_([r.id for r in victims]))
+                .returning(FloodPrediction.id)
+                .execution_options(synchronize_session=False)
+            ).scalars())
+            db.commit()
+            deleted += len(removed)
+            # Only rows this run deleted; another worker that got to them archives its own
+            records = [record for record in records if record['id'] in removed]
+            if records:
+                try:
+                    _archive(records, Path(archive_dir), now)
+                except OSError as e:
+                    logger.error(
+                        "Pruned predictions %d-%d could not be archived: %s",
+                        records[0]['id'], records[-1]['id'], e,
+                    )
+        if len(batch) < batch_size:
+            break
+
+    hourly_cutoff = now - timedelta(days=ROLLUP_HOURLY_RETENTION_DAYS)
+    db.query(PredictionRollup).filter(
+        PredictionRollup.granularity == 'hour',
+        PredictionRollup.bucket_start < hourly_cutoff,
+    ).delete(synchronize_session=False)
+    db.commit()
+    return deleted
+
+
+def run_retention(db: Session) -> Dict[str, int]:
+    """Roll up new predictions, then prune expired raw rows, unless another worker is running it."""
+    lease = RetentionLease(db)
+    if not lease.claim():
+        logger.info("Prediction retention is running on another worker; skipping")
+        return {'rolled_up': 0, 'pruned': 0}
+    try:
+        rolled_up = rollup_predictions(db)
+        pruned = prune_predictions(db, lease=lease)
+    finally:
+        lease.release()
+    logger.info("Prediction retention: %d rows rolled up, %d rows pruned", rolled_up, pruned)
+    return {'rolled_up': rolled_up, 'pruned': pruned}
+
+
+class RetentionScheduler:
+    """Runs run_retention() every `interval` seconds on a daemon thread."""
+    def __init__(self, interval: float = PREDICTION_RETENTION_INTERVAL_SECONDS):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is not None or not PREDICTION_RETENTION_ENABLED:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="prediction-retention", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout=5)
+        self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            db = SessionLocal()
+            try:
+                run_retention(db)
+            except SQLAlchemyError as e:
+                db.rollback()
+                logger.error("Prediction retention failed: %s", e, exc_info=True)
+            finally:
+                db.close()
+
+
+# Global instance
+retention_scheduler = RetentionScheduler()
@@ -0,0 +1,77 @@
+"""
+Recipient set helpers for multi-region alert fan-out.
+
+Region memberships are read as sorted user-ID arrays and merged into one
+deduplicated array, so a citizen following several targeted regions is sent
+the alert once. A compact bitmap records who was reached, which lets
+per-region counts be computed afterwards without another query.
+"""
+import heapq
+from array import array
+from typing import Iterable, Iterator, List
+
+from sqlalchemy import select, union
+from sqlalchemy.orm import Session
+
+from ..models import User, UserRegion
+
+
+def region_member_ids(db: Session, region_id: int) -> array:
+    """
+    Sorted user IDs following a region or last located inside it.
+
+    Served from the (region_id, user_id) and users.location_region_id indexes.
+    """
+    members = union(
+        select(UserRegion.user_id.label("user_id")).where(UserRegion.region_id == region_id),
+        select(User.id.label("user_id")).where(User.location_region_id == region_id),
+    ).subquery()
+    rows = db.execute(
+        select(members.c.user_id).order_by(members.c.user_id).execution_options(yield_per=10000)
+    )
+    return array('q', (user_id for (user_id,) in rows))
+
+
+def union_sorted(arrays: Iterable[array]) -> array:
+    """Deduplicated union of sorted ID arrays (k-way merge, O(n log k))."""
+    merged = array('q')
+    last = None
+    for user_id in heapq.merge(*arrays):
+        if user_id != last:
+            merged.append(user_id)
+            last = user_id
+    return merged
+
+
+def difference_sorted(ids: array, exclude: array) -> array:
+    """IDs in sorted `ids` that are not in sorted `exclude` (linear merge)."""
+    kept = array('q')
+    j, n = 0, len(exclude)
+    for user_id in ids:
+        while j < n and exclude[j] < user_id:
+            j += 1
+        if j == n or exclude[j] != user_id:
+            kept.append(user_id)
+    return kept
+
+
+def chunked(ids: array, size: int) -> Iterator[List[int]]:
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size].tolist()
+
+
+class IdBitmap:
+    """Fixed-size bitset over non-negative integer IDs."""
+    def __init__(self, max_id: int):
+        self._bits = bytearray((max_id >> 3) + 1)
+
+    def add(self, user_id: int) -> None:
+        self._bits[user_id >> 3] |= 1 << (user_id & 7)
+
+    def __contains__(self, user_id: int) -> bool:
+        byte = user_id >> 3
+        return byte < len(self._bits) and bool(self._bits[byte] & (1 << (user_id & 7)))
+
+    def count_in(self, ids: Iterable[int]) -> int:
+        """How many of `ids` are set."""
+        return sum(1 for user_id in ids if user_id in self)
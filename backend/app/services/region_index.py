@@ -0,0 +1,191 @@
+"""
+In-memory region name index.
+
+Region names are normalized (case, accents, punctuation) and kept in a
+sorted key array for prefix lookups, plus a trigram index for substring
+matches. The whole index is rebuilt from the regions table at startup and
+on every 'regions' invalidation event (the regions loader publishes one), and
+swapped in atomically so lookups never take a lock or touch the database.
+"""
+import bisect
+import heapq
+import logging
+import re
+import threading
+import unicodedata
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from ..models import Region
+
+logger = logging.getLogger(__name__)
+
+_NON_ALNUM = re.compile(r'[^0-9a-z]+')
+
+# Candidate cap for a single prefix; short prefixes like "a" can match thousands.
+# The best-ranked ones are kept, not the first ones alphabetically.
+_MAX_PREFIX_CANDIDATES = 1000
+
+
+def normalize(text: Optional[str]) -> str:
+    """Lowercase, strip accents and collapse punctuation/whitespace to single spaces."""
+    if not text:
+        return ""
+    decomposed = unicodedata.normalize('NFKD', text)
+    ascii_text = ''.join(c for c in decomposed if not unicodedata.combining(c)).lower()
+    return _NON_ALNUM.sub(' ', ascii_text).strip()
+
+
+def _trigrams(text: str) -> set:
+    padded = f" {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class RegionEntry:
+    __slots__ = ('id', 'name', 'state', 'population', 'norm_name', 'norm_state')
+
+    def __init__(self, id: int, name: str, state: Optional[str], population: Optional[int]):
+        self.id = id
+        self.name = name
+        self.state = state
+        self.population = population
+        self.norm_name = normalize(name)
+        self.norm_state = normalize(state)
+
+
+class _IndexData:
+    """Immutable snapshot of the index; replaced as a whole on reload."""
+    def __init__(self, entries: List[RegionEntry]):
+        self.entries: Dict[int, RegionEntry] = {e.id: e for e in entries}
+        self.by_name: Dict[str, List[int]] = {}
+        keyed: List[Tuple[str, int, int]] = []  # (key, is_word_key, region_id)
+        trigrams: Dict[str, List[int]] = {}
+        for e in entries:
+            self.by_name.setdefault(e.norm_name, []).append(e.id)
+            keyed.append((e.norm_name, 0, e.id))
+            words = e.norm_name.split(' ')
+            for i in range(1, len(words)):
+                keyed.append((' '.join(words[i:]), 1, e.id))
+            for gram in _trigrams(e.norm_name):
+                trigrams.setdefault(gram, []).append(e.id)
+        keyed.sort()
+        self.keys = [k for k, _, _ in keyed]
+        self.key_is_word = [w for _, w, _ in keyed]
+        self.key_ids = [i for _, _, i in keyed]
+        self.trigrams = {g: sorted(set(ids)) for g, ids in trigrams.items()}
+
+
+class RegionIndex:
+    def __init__(self):
+        self._data = _IndexData([])
+        self._load_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data.entries)
+
+    def load(self, db: Session) -> int:
+        """Rebuild the index from the regions table; returns the number of regions indexed."""
+        with self._load_lock:
+            rows = db.query(Region.id, Region.name, Region.state, Region.population).all()
+            self._data = _IndexData([RegionEntry(*row) for row in rows])
+        logger.info("Region index loaded with %d regions", len(rows))
+        return len(rows)
+
+    def get(self, region_id: int) -> Optional[RegionEntry]:
+        return self._data.entries.get(region_id)
+
+    def search(self, query: str, state: Optional[str] = None, limit: int = 10) -> List[RegionEntry]:
+        """
+        Typeahead lookup ranked exact > name prefix > word prefix > substring,
+        then by population. "Name, State" narrows by state.
+        """
+        data = self._data
+        name_part, state_part = self._split(query, state)
+        q = normalize(name_part)
+        if not q or limit <= 0:
+            return []
+
+        ranked: Dict[int, int] = {}
+        for region_id in data.by_name.get(q, []):
+            ranked[region_id] = 0
+        for region_id, is_word in self._prefix(data, q):
+            ranked.setdefault(region_id, 2 if is_word else 1)
+        if len(ranked) < limit and len(q) >= 3:
+            for region_id in self._substring(data, q):
+                ranked.setdefault(region_id, 3)
+
+        results = [data.entries[i] for i in ranked if self._state_ok(data.entries[i], state_part)]
+        return heapq.nsmallest(limit, results, key=lambda e: (ranked[e.id], -(e.population or 0), e.norm_name, e.id))
+
+    def resolve(self, query: str, state: Optional[str] = None) -> Optional[RegionEntry]:
+        """
+        Resolve free text to exactly one region, or None if it is unknown or
+        ambiguous (e.g. two districts with the same name and no state given).
+        """
+        data = self._data
+        name_part, state_part = self._split(query, state)
+        q = normalize(name_part)
+        if not q:
+            return None
+
+        tiers = (
+            data.by_name.get(q, []),
+            [region_id for region_id, is_word in self._prefix(data, q) if not is_word],
+            self._substring(data, q) if len(q) >= 3 else [],
+        )
+        for candidates in tiers:
+            matches = {i for i in candidates if self._state_ok(data.entries[i], state_part)}
+            if len(matches) == 1:
+                return data.entries[matches.pop()]
+            if len(matches) > 1:
+                logger.warning("Ambiguous region %r matches %d regions", query, len(matches))
+                return None
+        return None
+
+    @staticmethod
+    def _split(query: str, state: Optional[str]) -> Tuple[str, Optional[str]]:
+        name_part, _, state_part = (query or "").partition(',')
+        state_part = state or state_part
+        return name_part, normalize(state_part) or None
+
+    @staticmethod
+    def _state_ok(entry: RegionEntry, norm_state: Optional[str]) -> bool:
+        return norm_state is None or entry.norm_state.startswith(norm_state)
+
+    @staticmethod
+    def _prefix(data: _IndexData, q: str) -> List[Tuple[int, int]]:
+        # Keys starting with q form one contiguous run of the sorted array
+        start = bisect.bisect_left(data.keys, q)
+        end = bisect.bisect_left(data.keys, q + '\uffff', start)
+        if end - start <= _MAX_PREFIX_CANDIDATES:
+            return [(data.key_ids[i], data.key_is_word[i]) for i in range(start, end)]
+        # Rank before truncating: name prefixes first, then by population, as search() orders them
+        best = heapq.nsmallest(
+            _MAX_PREFIX_CANDIDATES,
+            range(start, end),
+            key=lambda i: (data.key_is_word[i], -(data.entries[data.key_ids[i]].population or 0), data.keys[i]),
+        )
+        return [(data.key_ids[i], data.key_is_word[i]) for i in best]
+
+    @staticmethod
+    def _substring(data: _IndexData, q: str) -> List[int]:
+        # Interior trigrams only, so "hati" matches "guwahati"; verify each candidate
+        grams = [q[i:i + 3] for i in range(len(q) - 2)]
+        postings = []
+        for gram in grams:
+            ids = data.trigrams.get(gram)
+            if not ids:
+                return []
+            postings.append(ids)
+        postings.sort(key=len)
+        candidates = set(postings[0])
+        for ids in postings[1:]:
+            candidates.intersection_update(ids)
+            if not candidates:
+                return []
+        return [i for i in candidates if q in data.entries[i].norm_name]
+
+
+# Global instance
+region_index = RegionIndex()
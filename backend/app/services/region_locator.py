@@ -0,0 +1,112 @@
+"""
+Point-in-region lookup for citizen locations.
+
+Region polygons (Region.geometry) are parsed once and bucketed by bounding
+box into a fixed grid of _CELL_DEGREES cells, so a lookup tests only the few
+regions whose box overlaps the point's cell. Callers pass the region the
+point was last in as a hint; a point that has not crossed a boundary is
+answered by a single polygon test. Like the region index, the whole
+structure is rebuilt on load and swapped in atomically.
+"""
+import logging
+import math
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from ..models import Region
+from .geometry_cache import parse_geometry
+
+logger = logging.getLogger(__name__)
+
+_CELL_DEGREES = 0.25
+
+Ring = List[Tuple[float, float]]
+
+
+def _ring_contains(ring: Ring, x: float, y: float) -> bool:
+    inside = False
+    x1, y1 = ring[-1]
+    for x2, y2 in ring:
+        if (y1 > y) != (y2 > y) and x < (x2 - x1) * (y - y1) / (y2 - y1) + x1:
+            inside = not inside
+        x1, y1 = x2, y2
+    return inside
+
+
+class _Area:
+    __slots__ = ('id', 'polygons', 'bbox')
+
+    def __init__(self, id: int, geometry: dict):
+        self.id = id
+        polygons = [geometry['coordinates']] if geometry['type'] == 'Polygon' else geometry['coordinates']
+        # Each polygon is a list of rings (outer first, then holes); even-odd crossing handles the holes
+        self.polygons = [[[(float(p[0]), float(p[1])) for p in ring] for ring in polygon if ring] for polygon in polygons]
+        xs = [x for polygon in self.polygons for ring in polygon for x, _ in ring]
+        ys = [y for polygon in self.polygons for ring in polygon for _, y in ring]
+        self.bbox = (min(xs), min(ys), max(xs), max(ys))
+
+    def contains(self, x: float, y: float) -> bool:
+        x1, y1, x2, y2 = self.bbox
+        if x < x1 or x > x2 or y < y1 or y > y2:
+            return False
+        for polygon in self.polygons:
+            inside = False
+            for ring in polygon:
+                if _ring_contains(ring, x, y):
+                    inside = not inside
+            if inside:
+                return True
+        return False
+
+
+def _cell(value: float) -> int:
+    return math.floor(value / _CELL_DEGREES)
+
+
+class RegionLocator:
+    def __init__(self):
+        # (areas by region id, grid cell -> region ids), replaced as a whole on load
+        self._data: Tuple[Dict[int, _Area], Dict[Tuple[int, int], List[int]]] = ({}, {})
+
+    def __len__(self) -> int:
+        return len(self._data[0])
+
+    def load(self, db: Session) -> int:
+        """Rebuild from the regions table; returns the number of regions with usable geometry."""
+        areas: Dict[int, _Area] = {}
+        grid: Dict[Tuple[int, int], List[int]] = {}
+        rows = db.query(Region.id, Region.geometry).filter(Region.geometry.isnot(None))
+        for region_id, raw in rows:
+            try:
+                geometry = parse_geometry(raw)
+                if geometry is None:
+                    continue
+                area = _Area(region_id, geometry)
+            except (ValueError, TypeError, KeyError, IndexError) as e:
+                logger.warning("Skipping invalid geometry for region %s: %s", region_id, e)
+                continue
+            areas[region_id] = area
+            x1, y1, x2, y2 = area.bbox
+            for cx in range(_cell(x1), _cell(x2) + 1):
+                for cy in range(_cell(y1), _cell(y2) + 1):
+                    grid.setdefault((cx, cy), []).append(region_id)
+        self._data = (areas, grid)
+        logger.info("Region locator loaded %d regions into %d grid cells", len(areas), len(grid))
+        return len(areas)
+
+    def locate(self, lat: float, lon: float, hint: Optional[int] = None) -> Optional[int]:
+        """Region containing the point, or None; `hint` is checked first."""
+        areas, grid = self._data
+        if hint is not None:
+            area = areas.get(hint)
+            if area is not None and area.contains(lon, lat):
+                return hint
+        for region_id in grid.get((_cell(lon), _cell(lat)), ()):
+            if region_id != hint and areas[region_id].contains(lon, lat):
+                return region_id
+        return None
+
+
+# Global instance
+region_locator = RegionLocator()
@@ -0,0 +1,208 @@
+"""
+River-network risk propagation.
+
+Regions form a directed graph along river basins (river_links, with travel
+times). A region's effective score is the larger of its own model score and
+the scores of its upstream regions attenuated by travel time:
+
+    effective(v) = max(local(v), max over u->v of effective(u) * exp(-hours(u, v) / decay))
+
+Nodes are stored densely and numbered in topological order once at load.
+An update seeds a min-heap with the changed regions and only walks their
+downstream closure in topological order. Branches whose effective score
+does not change are cut off, so a rainfall tick touching a few regions costs
+far less than a pass over the whole network. preview() runs the same walk
+without applying it, so callers can store results before the state moves.
+"""
+import heapq
+import logging
+import math
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from ..models import FloodPrediction, RiverLink
+
+logger = logging.getLogger(__name__)
+
+RIVER_RISK_DECAY_HOURS = float(os.getenv('RIVER_RISK_DECAY_HOURS', '48'))
+
+
+class RiverNetwork:
+    def __init__(self, decay_hours: float = RIVER_RISK_DECAY_HOURS):
+        self.decay_hours = decay_hours
+        self._lock = threading.Lock()
+        self._index: Dict[int, int] = {}  # region id -> dense node, numbered in topological order
+        self._regions: List[int] = []
+        self._downstream: List[List[int]] = []
+        self._upstream: List[List[Tuple[int, float]]] = []  # (node, attenuation factor)
+        self._local: List[float] = []
+        self._effective: List[float] = []
+
+    def __len__(self) -> int:
+        return len(self._regions)
+
+    def build(self, links: List[Tuple[int, int, float]], local_scores: Optional[Dict[int, float]] = None) -> None:
+        """Build the graph from (upstream, downstream, travel_hours) edges and seed local scores."""
+        nodes = sorted({r for u, d, _ in links for r in (u, d)})
+        position = {r: i for i, r in enumerate(nodes)}
+        out_edges: List[List[Tuple[int, float]]] = [[] for _ in nodes]
+        indegree = [0] * len(nodes)
+        for upstream, downstream, hours in links:
+            if upstream == downstream:
+                continue
+            out_edges[position[upstream]].append((position[downstream], hours))
+            indegree[position[downstream]] += 1
+
+        # Kahn's algorithm; nodes left over sit on a cycle and their in-cycle edges are dropped
+        order = [i for i, d in enumerate(indegree) if d == 0]
+        head = 0
+        while head < len(order):
+            node = order[head]
+            head += 1
+            for target, _ in out_edges[node]:
+                indegree[target] -= 1
+                if indegree[target] == 0:
+                    order.append(target)
+        if len(order) < len(nodes):
+            cyclic = [nodes[i] for i, d in enumerate(indegree) if d > 0]
+            logger.warning("River network has cycles through regions %s; ignoring back edges", cyclic[:10])
+            order.extend(i for i, d in enumerate(indegree) if d > 0)
+
+        rank = {old: new for new, old in enumerate(order)}
+        regions = [nodes[old] for old in order]
+        downstream: List[List[int]] = [[] for _ in nodes]
+        upstream: List[List[Tuple[int, float]]] = [[] for _ in nodes]
+        for old, edges in enumerate(out_edges):
+            source = rank[old]
+            for target_old, hours in edges:
+                target = rank[target_old]
+                if target <= source:
+                    continue  # back edge on a cycle
+                factor = math.exp(-max(0.0, hours) / self.decay_hours) if self.decay_hours > 0 else 1.0
+                downstream[source].append(target)
+                upstream[target].append((source, factor))
+
+        local_scores = local_scores or {}
+        local = [float(local_scores.get(r, 0.0)) for r in regions]
+        with self._lock:
+            self._index = {r: i for i, r in enumerate(regions)}
+            self._regions = regions
+            self._downstream = downstream
+            self._upstream = upstream
+            self._local = local
+            self._effective = list(local)
+            # Full pass once; topological order means every upstream value is final when read
+            for node in range(len(regions)):
+                self._effective[node] = self._combine(node)
+        logger.info("River network loaded: %d regions, %d links", len(regions), sum(len(d) for d in downstream))
+
+    def load(self, db: Session) -> int:
+        links = [(u, d, h) for u, d, h in db.query(
+            RiverLink.upstream_region_id, RiverLink.downstream_region_id, RiverLink.travel_hours
+        )]
+        latest = (
+            db.query(FloodPrediction.region_id, func.max(FloodPrediction.id).label("latest_id"))
+            .group_by(FloodPrediction.region_id)
+            .subquery()
+        )
+        scores = {}
+        for region_id, score, weather in (
+            db.query(FloodPrediction.region_id, FloodPrediction.risk_score, FloodPrediction.weather_data)
+            .join(latest, FloodPrediction.id == latest.c.latest_id)
+        ):
+            # Stored scores include upstream risk; the model's own score is kept alongside
+            scores[region_id] = (weather or {}).get('local_score', score)
+        self.build(links, scores)
+        return len(self._regions)
+
+    def _combine(self, node: int) -> float:
+        value = self._local[node]
+        effective = self._effective
+        for source, factor in self._upstream[node]:
+            carried = effective[source] * factor
+            if carried > value:
+                value = carried
+        return value
+
+    def _propagate(self, local_scores: Dict[int, float]) -> Tuple[Dict[int, float], Dict[int, float]]:
+        """
+        Propagate new local scores without touching the stored state.
+
+        Called with the lock held. Returns (local, effective) overlays keyed by
+        node, holding only the nodes whose values change.
+        """
+        local: Dict[int, float] = {}
+        effective: Dict[int, float] = {}
+        heap: List[int] = []
+        queued = set()
+        for region_id, score in local_scores.items():
+            node = self._index.get(region_id)
+            if node is None:
+                continue
+            local[node] = float(score)
+            if node not in queued:
+                queued.add(node)
+                heap.append(node)
+        heapq.heapify(heap)
+        stored = self._effective
+        while heap:
+            node = heapq.heappop(heap)
+            value = local.get(node, self._local[node])
+            for source, factor in self._upstream[node]:
+                carried = effective.get(source, stored[source]) * factor
+                if carried > value:
+                    value = carried
+            if value == stored[node]:
+                continue
+            effective[node] = value
+            for target in self._downstream[node]:
+                if target not in queued:
+                    queued.add(target)
+                    heapq.heappush(heap, target)
+        return local, effective
+
+    def preview(self, local_scores: Dict[int, float]) -> Dict[int, float]:
+        """
+        What update() would return, without applying it.
+
+        Lets callers store the propagated scores first and only update() once
+        the write has committed, so a rollback leaves the network untouched.
+        """
+        with self._lock:
+            _, effective = self._propagate(local_scores)
+            return {self._regions[node]: value for node, value in effective.items()}
+
+    def update(self, local_scores: Dict[int, float]) -> Dict[int, float]:
+        """
+        Set new local scores and propagate downstream.
+
+        Returns region id -> new effective score for every node whose
+        effective score changed (including downstream regions not in the input).
+        """
+        with self._lock:
+            local, effective = self._propagate(local_scores)
+            for node, value in local.items():
+                self._local[node] = value
+            for node, value in effective.items():
+                self._effective[node] = value
+            return {self._regions[node]: value for node, value in effective.items()}
+
+    def effective(self, region_id: int, local_score: float) -> float:
+        """Effective score for a region, or `local_score` if it is not on the network."""
+        with self._lock:
+            node = self._index.get(region_id)
+            return self._effective[node] if node is not None else local_score
+
+    def downstream_of(self, region_id: int) -> List[int]:
+        """Direct downstream neighbours of a region."""
+        with self._lock:
+            node = self._index.get(region_id)
+            return [self._regions[t] for t in self._downstream[node]] if node is not None else []
+
+
+# Global instance
+river_network = RiverNetwork()
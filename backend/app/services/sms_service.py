@@ -1,16 +1,32 @@
 import os
+import time
+import uuid
 import logging
 from typing import Optional
 from twilio.rest import Client
 from twilio.base.exceptions import TwilioException
 
+from ..metrics import NOTIFICATIONS_SENT, NOTIFICATION_SEND_SECONDS
+
 logger = logging.getLogger(__name__)
 
+
+def _observe(channel: str, start: float, sid: Optional[str]) -> Optional[str]:
+    NOTIFICATION_SEND_SECONDS.observe(time.perf_counter() - start, (channel,))
+    NOTIFICATIONS_SENT.inc((channel, 'sent' if sid else 'failed'))
+    return sid
+
+
+def _callback_kwargs(status_callback: Optional[str]) -> dict:
+    """Extra Twilio create() kwargs so delivery receipts reach /alerts/delivery-status."""
+    return {'status_callback': status_callback} if status_callback else {}
+
 class SMSService:
     def __init__(self):
         self.account_sid = os.getenv('TWILIO_ACCOUNT_SID')
         self.auth_token = os.getenv('TWILIO_AUTH_TOKEN')
         self.phone_number = os.getenv('TWILIO_PHONE_NUMBER')
+        self.status_callback = os.getenv('TWILIO_STATUS_CALLBACK_URL')
         self.mock_enabled = os.getenv('MOCK_SMS_ENABLED', 'true').lower() == 'true'
         
         if not self.mock_enabled and (self.account_sid and self.auth_token and self.phone_number):
@@ -19,35 +35,52 @@ class SMSService:
             self.client = None
             logger.info("SMS service initialized in mock mode")
 
+    @property
+    def reports_status(self) -> bool:
+        """True when the provider will post status callbacks for sent messages."""
+        return self.client is not None and bool(self.status_callback)
+
     def send_sms(self, to_number: str, message: str) -> bool:
         """
         Send SMS using Twilio or mock mode
         """
+        return self.send_sms_tracked(to_number, message) is not None
+
+    def send_sms_tracked(self, to_number: str, message: str) -> Optional[str]:
+        """
+        Send SMS and return the provider message SID (None on failure)
+        """
+        start = time.perf_counter()
+        return _observe('sms', start, self._send(to_number, message))
+
+    def _send(self, to_number: str, message: str) -> Optional[str]:
         try:
             if self.mock_enabled or not self.client:
                 logger.info(f"[MOCK SMS] To: {to_number}, Message: {message}")
-                return True
+                return f"MOCK{uuid.uuid4().hex}"
             
             message = self.client.messages.create(
                 body=message,
                 from_=self.phone_number,
-                to=to_number
+                to=to_number,
+                **_callback_kwargs(self.status_callback)
             )
             logger.info(f"SMS sent successfully. SID: {message.sid}")
-            return True
+            return message.sid
             
         except TwilioException as e:
             logger.error(f"Twilio SMS error: {e}")
-            return False
+            return None
         except Exception as e:
             logger.error(f"SMS service error: {e}")
-            return False
+            return None
 
 class WhatsAppService:
     def __init__(self):
         self.account_sid = os.getenv('TWILIO_ACCOUNT_SID')
         self.auth_token = os.getenv('TWILIO_AUTH_TOKEN')
         self.whatsapp_number = os.getenv('TWILIO_WHATSAPP_PHONE_NUMBER')
+        self.status_callback = os.getenv('TWILIO_STATUS_CALLBACK_URL')
         self.mock_enabled = os.getenv('MOCK_WHATSAPP_ENABLED', 'true').lower() == 'true'
         
         if not self.mock_enabled and (self.account_sid and self.auth_token and self.whatsapp_number):
@@ -56,14 +89,29 @@ class WhatsAppService:
             self.client = None
             logger.info("WhatsApp service initialized in mock mode")
 
+    @property
+    def reports_status(self) -> bool:
+        """True when the provider will post status callbacks for sent messages."""
+        return self.client is not None and bool(self.status_callback)
+
     def send_whatsapp(self, to_number: str, message: str) -> bool:
         """
         Send WhatsApp message using Twilio or mock mode
         """
+        return self.send_whatsapp_tracked(to_number, message) is not None
+
+    def send_whatsapp_tracked(self, to_number: str, message: str) -> Optional[str]:
+        """
+        Send WhatsApp message and return the provider message SID (None on failure)
+        """
+        start = time.perf_counter()
+        return _observe('whatsapp', start, self._send(to_number, message))
+
+    def _send(self, to_number: str, message: str) -> Optional[str]:
         try:
             if self.mock_enabled or not self.client:
                 logger.info(f"[MOCK WhatsApp] To: {to_number}, Message: {message}")
-                return True
+                return f"MOCK{uuid.uuid4().hex}"
             
             # Format number for WhatsApp
             if not to_number.startswith('whatsapp:'):
@@ -72,17 +120,18 @@ class WhatsAppService:
             message = self.client.messages.create(
                 body=message,
                 from_=self.whatsapp_number,
-                to=to_number
+                to=to_number,
+                **_callback_kwargs(self.status_callback)
             )
             logger.info(f"WhatsApp message sent successfully. SID: {message.sid}")
-            return True
+            return message.sid
             
         except TwilioException as e:
             logger.error(f"Twilio WhatsApp error: {e}")
-            return False
+            return None
         except Exception as e:
             logger.error(f"WhatsApp service error: {e}")
-            return False
+            return None
 
 # Global instances
 sms_service = SMSService()
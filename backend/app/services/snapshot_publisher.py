@@ -0,0 +1,268 @@
+"""
+Static risk snapshots for surge traffic.
+
+Writes "all regions with latest risk" and "active alerts" as JSON files
+(plus .gz siblings for nginx gzip_static / CDN upload) into SNAPSHOT_DIR,
+so public read traffic can be served without touching the API workers.
+Files are named by content hash and never change once written; a small
+manifest.json maps each dataset to its current file for cache busting.
+Every file is written to a temp file and renamed into place, and the
+manifest is written last, so readers never see a partial or mixed version.
+
+Workers sharing SNAPSHOT_DIR take an exclusive lock on it for the whole
+publish, database read included, so a manifest built from an older read can
+never replace a newer one. The manifest also records when each file stopped
+being current; files are pruned SNAPSHOT_GRACE_SECONDS after that moment, so
+clients holding the previous manifest can still fetch what it names.
+
+Changes only mark the publisher dirty. A background thread rebuilds at most
+once per SNAPSHOT_DEBOUNCE_SECONDS, so an ingest burst costs one publish.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterator, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from sqlalchemy import func
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from ..database import SessionLocal
+from ..models import Alert, FloodPrediction, Region
+
+logger = logging.getLogger(__name__)
+
+# Unset: publishing is disabled
+SNAPSHOT_DIR = os.getenv('SNAPSHOT_DIR')
+SNAPSHOT_DEBOUNCE_SECONDS = float(os.getenv('SNAPSHOT_DEBOUNCE_SECONDS', '2'))
+SNAPSHOT_ACTIVE_ALERT_HOURS = float(os.getenv('SNAPSHOT_ACTIVE_ALERT_HOURS', '24'))
+# Superseded files stay this long so clients holding an older manifest can still fetch them
+SNAPSHOT_GRACE_SECONDS = float(os.getenv('SNAPSHOT_GRACE_SECONDS', '600'))
+
+MANIFEST_NAME = 'manifest.json'
+LOCK_NAME = '.publish.lock'
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def write_atomic(path: Path, data: bytes) -> None:
+    """Write via a temp file in the same directory, fsync, then rename over `path`."""
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as fh:
+            fh.write(data)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+@contextmanager
+def _directory_lock(directory: Path) -> Iterator[None]:
+    """Exclusive cross-process lock on a snapshot directory."""
+    with open(directory / LOCK_NAME, 'a+b') as fh:
+        if fcntl is not None:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_EX)
+        else:
+            fh.seek(0)
+            msvcrt.locking(fh.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+            else:
+                fh.seek(0)
+                msvcrt.locking(fh.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _read_manifest(directory: Path) -> Dict:
+    try:
+        return json.loads((directory / MANIFEST_NAME).read_bytes())
+    except (OSError, ValueError):
+        return {}
+
+
+def regions_snapshot(db: Session) -> list:
+    latest = (
+        db.query(FloodPrediction.region_id, func.max(FloodPrediction.id).label("latest_id"))
+        .group_by(FloodPrediction.region_id)
+        .subquery()
+    )
+    rows = (
+        db.query(
+            Region.id, Region.name, Region.state,
+            FloodPrediction.risk_level, FloodPrediction.risk_score, FloodPrediction.created_at,
+        )
+        .outerjoin(latest, latest.c.region_id == Region.id)
+        .outerjoin(FloodPrediction, FloodPrediction.id == latest.c.latest_id)
+        .order_by(Region.id)
+    )
+    return [
+        {
+            'id': region_id, 'name': name, 'state': state,
+            'risk_level': level, 'risk_score': score, 'predicted_at': predicted_at,
+        }
+        for region_id, name, state, level, score, predicted_at in rows
+    ]
+
+
+def alerts_snapshot(db: Session, now: Optional[datetime] = None) -> list:
+    cutoff = (now or datetime.utcnow()) - timedelta(hours=SNAPSHOT_ACTIVE_ALERT_HOURS)
+    rows = (
+        db.query(Alert.id, Alert.region, Alert.message, Alert.risk_level, Alert.created_at)
+        .filter(Alert.created_at >= cutoff)
+        .order_by(Alert.created_at.desc())
+        .limit(1000)
+    )
+    return [
+        {'id': alert_id, 'region': region, 'message': message, 'risk_level': level, 'created_at': created_at}
+        for alert_id, region, message, level, created_at in rows
+    ]
+
+
+class SnapshotPublisher:
+    def __init__(self, directory: Optional[str] = SNAPSHOT_DIR, debounce: float = SNAPSHOT_DEBOUNCE_SECONDS):
+        self.directory = Path(directory) if directory else None
+        self.debounce = debounce
+        self.version = 0
+        self._dirty = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._publish_lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.directory is not None
+
+    def mark_dirty(self) -> None:
+        """Request a rebuild; cheap enough to call on every prediction or alert write."""
+        if self.enabled:
+            self._dirty.set()
+
+    def publish(self, db: Session) -> Dict:
+        """Build and write all snapshots now; returns the manifest."""
+        with self._publish_lock:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            with _directory_lock(self.directory):
+                return self._publish_locked(db)
+
+    def _publish_locked(self, db: Session) -> Dict:
+        previous = _read_manifest(self.directory)
+        now = datetime.utcnow()
+        datasets = {
+            'regions': regions_snapshot(db),
+            'alerts': alerts_snapshot(db, now),
+        }
+        # Milliseconds keep versions increasing across restarts; the previous manifest covers other workers
+        self.version = max(self.version + 1, int(time.time() * 1000), previous.get('version', 0) + 1)
+        manifest = {'version': self.version, 'generated_at': now.isoformat() + 'Z', 'files': {}}
+        for name, payload in datasets.items():
+            # No timestamp in the body: unchanged data hashes to the same, already cached file
+            body = json.dumps({'items': payload}, separators=(',', ':'), default=_json_default).encode()
+            digest = hashlib.sha256(body).hexdigest()[:16]
+            filename = f"{name}.{digest}.json"
+            path = self.directory / filename
+            if not path.exists():
+                compressed = gzip.compress(body, compresslevel=9, mtime=0)
+                # .gz first: a reader that sees the plain file can rely on its sibling
+                write_atomic(self.directory / f"{filename}.gz", compressed)
+                write_atomic(path, body)
+            manifest['files'][name] = {
+                'path': filename,
+                'sha256': digest,
+                'bytes': len(body),
+                'count': len(payload),
+            }
+
+        # Files the previous manifest named that are no longer current start their grace period now
+        current = {entry['path'] for entry in manifest['files'].values()}
+        superseded = {
+            path: at for path, at in previous.get('superseded', {}).items()
+            if path not in current and at >= time.time() - SNAPSHOT_GRACE_SECONDS
+        }
+        for entry in previous.get('files', {}).values():
+            if entry['path'] not in current:
+                superseded.setdefault(entry['path'], time.time())
+        manifest['superseded'] = superseded
+
+        manifest_body = json.dumps(manifest, separators=(',', ':')).encode()
+        write_atomic(self.directory / MANIFEST_NAME, manifest_body)
+        self._prune(current | set(superseded))
+        return manifest
+
+    def _prune(self, keep: set) -> None:
+        """Delete snapshot files no manifest needs any more."""
+        # Files named by neither manifest were never published (e.g. a crash before the manifest
+        # write); they are left alone for a grace period in case a build is still writing them
+        cutoff = time.time() - SNAPSHOT_GRACE_SECONDS
+        for path in self.directory.glob('*.json*'):
+            name = path.name[:-3] if path.name.endswith('.gz') else path.name
+            if name == MANIFEST_NAME or name in keep:
+                continue
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+            except OSError:
+                pass
+
+    def start(self) -> None:
+        if self._thread is not None or not self.enabled:
+            return
+        self._stop.clear()
+        self._dirty.set()  # publish once at startup
+        self._thread = threading.Thread(target=self._run, name="snapshot-publisher", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._dirty.set()
+        self._thread.join(timeout=10)
+        self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._dirty.wait()
+            if self._stop.is_set():
+                break
+            # Let the burst settle; changes arriving meanwhile are folded into this publish
+            self._stop.wait(self.debounce)
+            self._dirty.clear()
+            db = SessionLocal()
+            try:
+                manifest = self.publish(db)
+                logger.debug("Published snapshot version %d", manifest['version'])
+            except (SQLAlchemyError, OSError) as e:
+                logger.error("Snapshot publish failed: %s", e, exc_info=True)
+            finally:
+                db.close()
+
+
+# Global instance
+snapshot_publisher = SnapshotPublisher()
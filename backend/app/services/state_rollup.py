@@ -0,0 +1,143 @@
+"""
+Per-state risk rollups for the authority dashboard.
+
+For every Region.state it keeps the number of regions at each risk level,
+the population of regions at high or critical risk, and the maximum current
+score. Rollups are built once from the latest prediction per region. After
+that, each prediction write adjusts them by the difference between the old
+and new values. A per-state score histogram keeps the maximum correct even
+when the top region's score drops. The serialized response is cached until
+the next change, so GET /dashboard/states costs the same whether there are
+ten regions or a hundred thousand.
+"""
+import json
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from ..models import FloodPrediction, Region
+
+logger = logging.getLogger(__name__)
+
+LEVELS = ('low', 'medium', 'high', 'critical')
+AT_RISK_LEVELS = frozenset({'high', 'critical'})
+UNKNOWN_STATE = 'Unknown'
+
+
+class _StateTotals:
+    __slots__ = ('regions', 'levels', 'unscored', 'population_at_risk', 'score_counts')
+
+    def __init__(self):
+        self.regions = 0
+        self.levels = {level: 0 for level in LEVELS}
+        self.unscored = 0
+        self.population_at_risk = 0
+        self.score_counts = [0] * 101
+
+    def max_score(self) -> Optional[int]:
+        for score in range(100, -1, -1):
+            if self.score_counts[score]:
+                return score
+        return None
+
+
+class StateRollups:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loaded = False
+        # region id -> (state, population, risk level, score)
+        self._regions: Dict[int, Tuple[str, int, Optional[str], Optional[int]]] = {}
+        self._states: Dict[str, _StateTotals] = {}
+        self._body: Optional[bytes] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def load(self, db: Session) -> int:
+        latest = (
+            db.query(FloodPrediction.region_id, func.max(FloodPrediction.id).label("latest_id"))
+            .group_by(FloodPrediction.region_id)
+            .subquery()
+        )
+        risk = {
+            region_id: (level, score)
+            for region_id, level, score in db.query(
+                FloodPrediction.region_id, FloodPrediction.risk_level, FloodPrediction.risk_score
+            ).join(latest, FloodPrediction.id == latest.c.latest_id)
+        }
+        regions: Dict[int, Tuple[str, int, Optional[str], Optional[int]]] = {}
+        states: Dict[str, _StateTotals] = {}
+        for region_id, state, population in db.query(Region.id, Region.state, Region.population):
+            state = state or UNKNOWN_STATE
+            level, score = risk.get(region_id, (None, None))
+            regions[region_id] = (state, population or 0, level, score)
+            totals = states.get(state)
+            if totals is None:
+                totals = states[state] = _StateTotals()
+            totals.regions += 1
+            self._add(totals, population or 0, level, score, 1)
+        with self._lock:
+            self._regions = regions
+            self._states = states
+            self._body = None
+            self._loaded = True
+        logger.info("State rollups loaded: %d regions in %d states", len(regions), len(states))
+        return len(states)
+
+    @staticmethod
+    def _add(totals: _StateTotals, population: int, level: Optional[str], score: Optional[int], sign: int) -> None:
+        if level is None:
+            totals.unscored += sign
+            return
+        if level in totals.levels:
+            totals.levels[level] += sign
+        if level in AT_RISK_LEVELS:
+            totals.population_at_risk += sign * population
+        totals.score_counts[max(0, min(100, score))] += sign
+
+    def update(self, region_id: int, risk_level: str, risk_score: int) -> None:
+        """Apply a region's new latest risk; O(1) per call."""
+        with self._lock:
+            entry = self._regions.get(region_id)
+            if entry is None:
+                return  # not loaded yet, or a region added after load; picked up on the next load
+            state, population, old_level, old_score = entry
+            if (old_level, old_score) == (risk_level, risk_score):
+                return
+            totals = self._states[state]
+            self._add(totals, population, old_level, old_score, -1)
+            self._add(totals, population, risk_level, risk_score, 1)
+            self._regions[region_id] = (state, population, risk_level, risk_score)
+            self._body = None
+
+    def snapshot(self) -> List[dict]:
+        with self._lock:
+            return self._snapshot()
+
+    def _snapshot(self) -> List[dict]:
+        return [
+            {
+                'state': state,
+                'region_count': totals.regions,
+                **totals.levels,
+                'unscored': totals.unscored,
+                'population_at_risk': totals.population_at_risk,
+                'max_score': totals.max_score(),
+            }
+            for state, totals in sorted(self._states.items())
+        ]
+
+    def render(self) -> bytes:
+        """Serialized snapshot, rebuilt only after a change."""
+        with self._lock:
+            if self._body is None:
+                self._body = json.dumps(self._snapshot(), separators=(',', ':')).encode()
+            return self._body
+
+
+# Global instance
+state_rollups = StateRollups()
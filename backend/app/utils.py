@@ -1,8 +1,19 @@
 """
 Utility functions for input validation and sanitization.
 """
+import ipaddress
+import os
 import re
-from typing import Optional
+from typing import List, Optional, Union
+
+from fastapi import Request
+
+# Reverse proxies (nginx, CDN edges) whose X-Forwarded-For is believed; addresses or CIDR ranges
+TRUSTED_PROXIES = os.getenv('TRUSTED_PROXIES', '127.0.0.1,::1')
+
+_trusted_networks: List[Union[ipaddress.IPv4Network, ipaddress.IPv6Network]] = [
+    ipaddress.ip_network(spec.strip(), strict=False) for spec in TRUSTED_PROXIES.split(',') if spec.strip()
+]
 
 
 def sanitize_phone(phone: str) -> Optional[str]:
@@ -55,3 +66,62 @@ def validate_language_code(code: str) -> bool:
     if not code:
         return False
     return bool(re.match(r'^[a-z]{2}(-[A-Z]{2})?$', code.strip()))
+
+
+def _is_trusted_proxy(address: str) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in _trusted_networks)
+
+
+def client_ip(request: Request) -> Optional[str]:
+    """
+    Address of the client that made the request.
+
+    When the direct peer is a trusted proxy, X-Forwarded-For is walked from
+    the right past the trusted hops; the first other address is the client.
+    Hops added by untrusted peers are ignored, so the header cannot be
+    spoofed to dodge per-IP limits.
+    """
+    peer = request.client.host if request.client else None
+    if peer is None or not _is_trusted_proxy(peer):
+        return peer
+    forwarded = request.headers.get('x-forwarded-for')
+    if not forwarded:
+        return peer
+    hops = [hop.strip() for hop in forwarded.split(',') if hop.strip()]
+    for hop in reversed(hops):
+        if not _is_trusted_proxy(hop):
+            return hop
+    return hops[0] if hops else peer
+
+
+def _qvalue(params: List[str]) -> float:
+    for param in params:
+        name, _, value = param.partition('=')
+        if name.strip().lower() == 'q':
+            try:
+                return float(value.strip())
+            except ValueError:
+                return 0.0
+    return 1.0
+
+
+def accepts_encoding(request: Request, coding: str) -> bool:
+    """
+    Whether Accept-Encoding allows `coding` (e.g. 'gzip').
+
+    q-values are honoured: "gzip;q=0" refuses gzip, and "*" covers codings
+    not listed by name.
+    """
+    wildcard = None
+    for item in request.headers.get('accept-encoding', '').split(','):
+        name, *params = item.split(';')
+        name = name.strip().lower()
+        if name == coding:
+            return _qvalue(params) > 0
+        if name == '*':
+            wildcard = _qvalue(params) > 0
+    return bool(wildcard)
@@ -0,0 +1,77 @@
+"""
+Alert fan-out throughput: request thread versus the sender process pool.
+
+Sends one all-citizen alert per setting with the SMS/WhatsApp services in
+mock mode against the current DATABASE_URL (populate it first with
+synthetic.py), and reports recipients per second. Setting 0 runs every
+partition in this process, the way fan-out works without
+ALERT_FANOUT_PROCESSES. Delivery rows written by each run are deleted again.
+
+    PYTHONPATH=. python backend/benchmarks/bench_fanout.py --processes 0,1,2,4 [-o results.jsonl]
+"""
+import argparse
+import os
+import time
+
+os.environ["MOCK_SMS_ENABLED"] = "true"
+os.environ["MOCK_WHATSAPP_ENABLED"] = "true"
+
+from backend.app.database import SessionLocal  # noqa: E402
+from backend.app.models import Alert, AlertDelivery  # noqa: E402
+from backend.app.services.alert_fanout import FanoutPool, citizen_partitions, send_partition  # noqa: E402
+from backend.benchmarks.common import emit  # noqa: E402
+
+
+def run(processes: int, partition_size: int) -> dict:
+    db = SessionLocal()
+    try:
+        alert = Alert(region="Benchmark", message="fan-out benchmark", risk_level="high", created_by="bench")
+        db.add(alert)
+        db.commit()
+        recipients, partitions = citizen_partitions(db, partition_size)
+        message = f"FLOOD ALERT: {alert.message} - Risk Level: {alert.risk_level}"
+
+        start = time.perf_counter()
+        if processes:
+            pool = FanoutPool(processes=processes, partition_size=partition_size, min_recipients=0)
+            pool.start(wait_ready=True)
+            try:
+                started = time.perf_counter()
+                sent = pool.run(alert.id, message, partitions)
+                elapsed = time.perf_counter() - started
+            finally:
+                pool.stop()
+            startup = started - start
+        else:
+            sent = sum(send_partition(alert.id, message, p, False)["sent"] for p in partitions)
+            elapsed, startup = time.perf_counter() - start, 0.0
+
+        db.query(AlertDelivery).filter(AlertDelivery.alert_id == alert.id).delete(synchronize_session=False)
+        db.delete(alert)
+        db.commit()
+    finally:
+        db.close()
+    return {
+        "benchmark": "alert_fanout",
+        "processes": processes,
+        "recipients": recipients,
+        "partitions": len(partitions),
+        "sent": sent,
+        "seconds": round(elapsed, 3),
+        "pool_startup_seconds": round(startup, 3),
+        "recipients_per_second": round(recipients / elapsed, 1) if elapsed else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Alert fan-out throughput by process count.")
+    parser.add_argument("--processes", default="0,1,2,4", help="comma-separated pool sizes; 0 = in-process")
+    parser.add_argument("--partition-size", type=int, default=5000)
+    parser.add_argument("--output", "-o")
+    args = parser.parse_args(argv)
+
+    emit([run(int(p), args.partition_size) for p in args.processes.split(",")], args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+List endpoint serialization: per-request ORM/Pydantic encoding versus cached JSON fragments.
+
+Times GET /alerts and GET /dashboard/regions as handler calls against the
+current DATABASE_URL (populate it first with synthetic.py). "baseline" is
+the previous path: load ORM rows, validate them into response models and
+let FastAPI encode the list. "cold" is the fragment path with an empty
+cache and "warm" the steady state. Alerts are inserted when fewer than the
+largest requested size exist and are deleted again afterwards.
+
+    PYTHONPATH=. python backend/benchmarks/bench_list_endpoints.py --sizes 20,100,500 [-o results.jsonl]
+"""
+import argparse
+import json
+
+from fastapi.encoders import jsonable_encoder
+
+from backend.app.admin import list_regions
+from backend.app.alerts import get_alerts
+from backend.app.database import SessionLocal
+from backend.app.models import Alert, FloodPrediction, Region
+from backend.app.schemas import AlertResponse, RegionSummary
+from backend.app.services.json_fragments import alert_fragments, region_fragments
+from backend.benchmarks.common import bench, emit
+
+
+def _encode(items) -> bytes:
+    # What FastAPI's serialize_response + JSONResponse do for a response_model list
+    return json.dumps(jsonable_encoder(items), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def baseline_alerts(db, limit: int) -> bytes:
+    alerts = db.query(Alert).order_by(Alert.created_at.desc()).limit(limit).all()
+    return _encode([AlertResponse.model_validate(a) for a in alerts])
+
+
+def baseline_regions(db, limit: int) -> bytes:
+    items = []
+    for r in db.query(Region).limit(limit).all():
+        latest = (
+            db.query(FloodPrediction)
+            .filter(FloodPrediction.region_id == r.id)
+            .order_by(FloodPrediction.created_at.desc())
+            .first()
+        )
+        items.append(RegionSummary(
+            id=r.id,
+            name=r.name,
+            state=r.state,
+            latest_risk_level=latest.risk_level if latest else None,
+            latest_risk_score=latest.risk_score if latest else None,
+        ))
+    return _encode(items)
+
+
+def _cold(cache, fn):
+    def call():
+        cache.clear()
+        return fn()
+    return call
+
+
+def measure(name: str, size: int, baseline, fragments, cache, iterations: int) -> list:
+    cases = {"baseline": baseline, "cold": _cold(cache, fragments), "warm": fragments}
+    fragments()  # fill the cache for the warm case
+    results = []
+    for path, fn in cases.items():
+        results.append({"benchmark": f"list_{name}", "path": path, "rows": size, **bench(fn, iterations)})
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="List endpoint serialization paths.")
+    parser.add_argument("--sizes", default="20,100,500", help="comma-separated row limits (alerts cap at 100)")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--output", "-o")
+    args = parser.parse_args(argv)
+    sizes = [int(s) for s in args.sizes.split(",")]
+
+    db = SessionLocal()
+    inserted = []
+    try:
+        missing = min(max(sizes), 100) - db.query(Alert).count()
+        if missing > 0:
+            inserted = [
+                Alert(region=f"Region {i}", message="list benchmark", risk_level="medium", created_by="bench")
+                for i in range(missing)
+            ]
+            db.add_all(inserted)
+            db.commit()
+
+        results = []
+        for size in sizes:
+            if size <= 100:
+                results += measure(
+                    "alerts", size,
+                    lambda: baseline_alerts(db, size),
+                    lambda: get_alerts(limit=size, db=db, current_user=None).body,
+                    alert_fragments, args.iterations,
+                )
+            results += measure(
+                "regions", size,
+                lambda: baseline_regions(db, size),
+                lambda: list_regions(limit=size, db=db, current_user=None).body,
+                region_fragments, args.iterations,
+            )
+        emit(results, args.output)
+    finally:
+        for alert in inserted:
+            db.delete(alert)
+        db.commit()
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
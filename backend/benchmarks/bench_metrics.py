@@ -0,0 +1,66 @@
+"""
+Overhead of MetricsMiddleware and the metric primitives.
+
+Drives a minimal ASGI app directly (no sockets) with and without the
+middleware; the difference is the per-request cost of leaving metrics on.
+
+    PYTHONPATH=. python backend/benchmarks/bench_metrics.py [-o results.jsonl]
+"""
+import argparse
+import asyncio
+
+from backend.app.metrics import Counter, Histogram, MetricsMiddleware
+from backend.benchmarks.common import bench, emit
+
+
+class _Route:
+    path = "/predictions/{region_id}"
+
+
+async def _app(scope, receive, send):
+    scope["route"] = _Route
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+async def _receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def _send(message):
+    pass
+
+
+def _request_loop(app, iterations: int):
+    scope = {"type": "http", "method": "GET", "path": "/predictions/1"}
+
+    async def run():
+        for _ in range(iterations):
+            await app(dict(scope), _receive, _send)
+
+    return lambda: asyncio.run(run())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--output", "-o")
+    args = parser.parse_args(argv)
+    n = args.iterations
+
+    bare = bench(_request_loop(_app, n), 1)
+    wrapped = bench(_request_loop(MetricsMiddleware(_app), n), 1)
+    overhead = (wrapped["ns_per_op_best"] - bare["ns_per_op_best"]) / n
+
+    counter = Counter("bench_total", "bench", ("route",))
+    histogram = Histogram("bench_seconds", "bench", ("route",))
+    results = [
+        {"benchmark": "metrics.middleware_overhead", "ns_per_request": round(overhead, 1), "iterations": n},
+        {"benchmark": "metrics.counter_inc", **bench(lambda: counter.inc(("/x",)), n)},
+        {"benchmark": "metrics.histogram_observe", **bench(lambda: histogram.observe(0.0123, ("/x",)), n)},
+    ]
+    emit(results, args.output)
+
+
+if __name__ == "__main__":
+    main()
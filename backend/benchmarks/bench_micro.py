@@ -0,0 +1,86 @@
+"""
+Micro-benchmarks for hot helpers: the prediction engines, phone sanitizing and
+response serialization (the same validate -> jsonable_encoder -> json.dumps
+path FastAPI takes for a response_model).
+
+    PYTHONPATH=. python backend/benchmarks/bench_micro.py [-o results.jsonl]
+"""
+import argparse
+import json
+from datetime import date, datetime
+from pathlib import Path
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from backend.app.services.prediction_engine import FEATURES, GradientBoostedModel, LogisticModel, SimplePredictionEngine
+from backend.app.schemas import AlertResponse, PredictionResponse, RegionSummary
+from backend.app.utils import sanitize_phone
+from backend.benchmarks.common import bench, emit
+
+
+def _fastapi_path(adapter: TypeAdapter, content):
+    return json.dumps(jsonable_encoder(adapter.validate_python(content, from_attributes=True))).encode()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for prediction, validation and serialization.")
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--output", "-o")
+    args = parser.parse_args(argv)
+    n = args.iterations
+
+    engine = SimplePredictionEngine()
+    weather = {"rainfall_24h": 87.5, "temperature": 28.0}
+
+    prediction = {
+        "region_id": 1, "risk_level": "medium", "risk_score": 67,
+        "factors": {"rainfall_24h": 87.5, "prediction_method": "simple_rules"},
+        "valid_until": date.today(),
+    }
+    regions = [
+        {"id": i, "name": f"Region {i}", "state": "Assam", "latest_risk_level": "low", "latest_risk_score": i % 100}
+        for i in range(500)
+    ]
+    alerts = [
+        {"id": i, "region": f"Region {i}", "message": "Flood warning", "risk_level": "high",
+         "created_by": "admin:admin", "created_at": datetime(2024, 7, 1, 12, 0)}
+        for i in range(100)
+    ]
+    artifacts = Path(__file__).resolve().parent.parent / "data" / "models"
+    logistic = LogisticModel(json.loads((artifacts / "flood-logistic-1.json").read_text()))
+    gbdt = GradientBoostedModel(json.loads((artifacts / "flood-gbdt-1.json").read_text()))
+    rows = [{f: (i * 7 + j * 13) % 100 * 1.5 for j, f in enumerate(FEATURES)} for i in range(1000)]
+
+    prediction_adapter = TypeAdapter(PredictionResponse)
+    regions_adapter = TypeAdapter(list[RegionSummary])
+    alerts_adapter = TypeAdapter(list[AlertResponse])
+    small = max(1, n // 100)
+
+    results = [
+        {"benchmark": "prediction.simple_engine", "iterations": n,
+         **bench(lambda: engine.predict_flood_risk(1, weather), n)},
+        {"benchmark": "prediction.rules_batch_1000", "iterations": small,
+         **bench(lambda: engine.predict_batch(rows), small)},
+        {"benchmark": "prediction.logistic_batch_1000", "iterations": small,
+         **bench(lambda: logistic.predict_batch(rows), small)},
+        {"benchmark": "prediction.gbdt_batch_1000", "iterations": small,
+         **bench(lambda: gbdt.predict_batch(rows), small)},
+        {"benchmark": "utils.sanitize_phone.valid", "iterations": n,
+         **bench(lambda: sanitize_phone("+91 98765-43210"), n)},
+        {"benchmark": "utils.sanitize_phone.invalid", "iterations": n,
+         **bench(lambda: sanitize_phone("12-ab"), n)},
+        {"benchmark": "serialize.prediction_response", "iterations": n,
+         **bench(lambda: _fastapi_path(prediction_adapter, prediction), n)},
+        {"benchmark": "serialize.region_summaries_500", "iterations": small,
+         **bench(lambda: _fastapi_path(regions_adapter, regions), small)},
+        {"benchmark": "serialize.region_summaries_500.dump_json", "iterations": small,
+         **bench(lambda: regions_adapter.dump_json(regions_adapter.validate_python(regions)), small)},
+        {"benchmark": "serialize.alerts_100", "iterations": small,
+         **bench(lambda: _fastapi_path(alerts_adapter, alerts), small)},
+    ]
+    emit(results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Incremental river-network propagation versus a full recompute.
+
+Builds a synthetic basin forest (every region drains into one region further
+downstream, so river paths run tens of hops long), then times single-region
+updates and ingest ticks that touch a share of the regions.
+
+    PYTHONPATH=. python backend/benchmarks/bench_river_network.py --nodes 50000 [-o results.jsonl]
+"""
+import argparse
+import random
+import time
+
+from backend.app.services.river_network import RiverNetwork
+from backend.benchmarks.common import bench, emit
+
+
+def basin_links(nodes: int, rng: random.Random):
+    # Node i drains into a node with a higher id within a short window: long, branching rivers
+    links = []
+    for i in range(1, nodes):
+        if rng.random() < 0.02:
+            continue  # river mouth
+        links.append((i, min(nodes, i + rng.randint(1, 50)), rng.uniform(2, 24)))
+    return links
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="River-network propagation benchmark.")
+    parser.add_argument("--nodes", type=int, default=50000)
+    parser.add_argument("--tick-share", type=float, default=0.01, help="share of regions updated per tick")
+    parser.add_argument("--output", "-o")
+    args = parser.parse_args(argv)
+
+    rng = random.Random(7)
+    links = basin_links(args.nodes, rng)
+    scores = {r: rng.uniform(0, 60) for r in range(1, args.nodes + 1)}
+
+    network = RiverNetwork()
+    start = time.perf_counter()
+    network.build(links, scores)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    region_ids = list(scores)
+    tick_size = max(1, int(len(region_ids) * args.tick_share))
+
+    def single():
+        region_id = rng.choice(region_ids)
+        scores[region_id] = rng.uniform(0, 100)
+        network.update({region_id: scores[region_id]})
+
+    def tick():
+        changes = {r: rng.uniform(0, 100) for r in rng.sample(region_ids, tick_size)}
+        scores.update(changes)
+        network.update(changes)
+
+    # Incremental results must match a from-scratch build
+    tick()
+    check = RiverNetwork()
+    check.build(links, scores)
+    assert all(abs(network.effective(r, 0) - check.effective(r, 0)) < 1e-9 for r in region_ids)
+
+    emit([
+        {"benchmark": "river_network.build", "nodes": args.nodes, "links": len(links), "ms": round(build_ms, 1)},
+        {"benchmark": "river_network.update_single", "nodes": args.nodes, **bench(single, 200)},
+        {"benchmark": "river_network.update_tick", "nodes": args.nodes, "tick_size": tick_size, **bench(tick, 5)},
+    ], args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+Shared helpers for the benchmark scripts.
+
+Every benchmark prints one JSON object per result so runs can be diffed
+across commits:
+
+    PYTHONPATH=. python backend/benchmarks/<name>.py -o results.jsonl
+"""
+import json
+import platform
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, List, Optional
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def bench(fn: Callable[[], object], iterations: int, repeat: int = 5) -> Dict[str, float]:
+    """Best-of-`repeat` and median nanoseconds per call of `fn`."""
+    samples: List[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        for _ in range(iterations):
+            fn()
+        samples.append((time.perf_counter_ns() - start) / iterations)
+    samples.sort()
+    return {"ns_per_op_best": round(samples[0], 1), "ns_per_op_median": round(samples[len(samples) // 2], 1)}
+
+
+def emit(results: List[Dict], output: Optional[str] = None) -> None:
+    """Write results as JSON lines, each tagged with the git revision and interpreter."""
+    meta = {"revision": git_revision(), "python": platform.python_version(), "timestamp": time.time()}
+    lines = [json.dumps({**meta, **r}, sort_keys=True) for r in results]
+    if output:
+        with open(output, "a", encoding="utf-8") as fh:
+            fh.write("\n".join(lines) + "\n")
+    else:
+        sys.stdout.write("\n".join(lines) + "\n")
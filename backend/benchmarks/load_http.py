@@ -0,0 +1,204 @@
+"""
+HTTP load harness for the main API paths.
+
+Each scenario runs for --duration seconds on --concurrency threads, each
+with its own keep-alive connection, and reports throughput, latency
+percentiles and status counts as JSON lines (see common.emit). Point it at a
+running server whose SMS/WhatsApp services are in mock mode, or pass
+--spawn to start one with MOCK_SMS_ENABLED=true against the current
+DATABASE_URL (populate it first with synthetic.py). All load comes from one
+address, so the spawned server's per-IP OTP throttle is lifted; against an
+external server set OTP_IP_RATE accordingly.
+
+    PYTHONPATH=. python backend/benchmarks/load_http.py --spawn --duration 20 -o results.jsonl
+"""
+import argparse
+import http.client
+import itertools
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from backend.benchmarks.common import emit
+
+SCENARIOS = ("register", "prediction", "dashboard_regions", "create_alert")
+
+# (method, path, body) produced per request by a scenario
+Request = Tuple[str, str, Optional[dict]]
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class Client:
+    def __init__(self, base_url: str, token: Optional[str] = None):
+        parts = urlsplit(base_url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.headers = {"Content-Type": "application/json"}
+        if token:
+            self.headers["Authorization"] = f"Bearer {token}"
+        self.conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+
+    def request(self, method: str, path: str, body: Optional[dict] = None) -> Tuple[int, bytes]:
+        payload = json.dumps(body).encode() if body is not None else None
+        try:
+            self.conn.request(method, path, body=payload, headers=self.headers)
+            response = self.conn.getresponse()
+            return response.status, response.read()
+        except (OSError, http.client.HTTPException):
+            # Reconnect once; the server may have closed an idle keep-alive connection
+            self.conn.close()
+            self.conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+            self.conn.request(method, path, body=payload, headers=self.headers)
+            response = self.conn.getresponse()
+            return response.status, response.read()
+
+
+def _scenario_requests(name: str, regions: List[dict]) -> Callable[[int, random.Random], Request]:
+    counter = itertools.count()
+    region_ids = [r["id"] for r in regions]
+    region_names = [r["name"] for r in regions]
+
+    if name == "register":
+        base = random.randint(0, 10_000) * 100_000
+
+        def make(worker, rng):
+            phone = f"6{(base + next(counter)) % 10**9:09d}"
+            return "POST", "/auth/register", {"phone_number": phone, "language": "en", "sms_alerts": True}
+    elif name == "prediction":
+        def make(worker, rng):
+            return "GET", f"/predictions/{rng.choice(region_ids)}", None
+    elif name == "dashboard_regions":
+        def make(worker, rng):
+            return "GET", "/dashboard/regions?limit=200", None
+    elif name == "create_alert":
+        def make(worker, rng):
+            # Alternate levels so consecutive alerts for a region escalate instead of coalescing
+            level = ("low", "medium", "high", "critical")[next(counter) % 4]
+            return "POST", "/alerts/", {"region": rng.choice(region_names), "message": "Benchmark alert", "risk_level": level}
+    else:
+        raise ValueError(f"unknown scenario {name!r}")
+    return make
+
+
+def run_scenario(base_url: str, token: str, name: str, regions: List[dict], concurrency: int, duration: float) -> Dict:
+    make = _scenario_requests(name, regions)
+    latencies: List[List[float]] = [[] for _ in range(concurrency)]
+    statuses: List[Dict[int, int]] = [{} for _ in range(concurrency)]
+    errors = [0] * concurrency
+    deadline = time.perf_counter() + duration
+
+    def worker(index: int):
+        client = Client(base_url, token)
+        rng = random.Random(index)
+        while time.perf_counter() < deadline:
+            method, path, body = make(index, rng)
+            start = time.perf_counter()
+            try:
+                status, _ = client.request(method, path, body)
+            except (OSError, http.client.HTTPException):
+                errors[index] += 1
+                continue
+            latencies[index].append(time.perf_counter() - start)
+            statuses[index][status] = statuses[index].get(status, 0) + 1
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    merged = sorted(itertools.chain.from_iterable(latencies))
+    status_counts: Dict[str, int] = {}
+    for per_worker in statuses:
+        for status, count in per_worker.items():
+            status_counts[str(status)] = status_counts.get(str(status), 0) + count
+    return {
+        "benchmark": f"http.{name}",
+        "concurrency": concurrency,
+        "duration_s": round(elapsed, 2),
+        "requests": len(merged),
+        "rps": round(len(merged) / elapsed, 1) if elapsed else 0.0,
+        "latency_ms_p50": round(_percentile(merged, 0.50) * 1000, 2),
+        "latency_ms_p90": round(_percentile(merged, 0.90) * 1000, 2),
+        "latency_ms_p99": round(_percentile(merged, 0.99) * 1000, 2),
+        "latency_ms_max": round((merged[-1] if merged else 0.0) * 1000, 2),
+        "status": status_counts,
+        "errors": sum(errors),
+    }
+
+
+def _spawn(port: int) -> subprocess.Popen:
+    env = {**os.environ, "MOCK_SMS_ENABLED": "true", "OTP_IP_RATE": os.getenv("OTP_IP_RATE", "1000000/1")}
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.app.main:app", "--port", str(port), "--log-level", "warning"],
+        env=env,
+    )
+    for _ in range(100):
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/health")
+            if conn.getresponse().status == 200:
+                return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.terminate()
+    raise RuntimeError("server did not start")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="HTTP load harness for the AegisFlood API.")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--spawn", action="store_true", help="start a mock-SMS uvicorn server on --port")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--output", "-o")
+    args = parser.parse_args(argv)
+
+    proc = None
+    base_url = args.base_url
+    if args.spawn:
+        proc = _spawn(args.port)
+        base_url = f"http://127.0.0.1:{args.port}"
+    try:
+        admin = Client(base_url)
+        status, body = admin.request("POST", "/auth/admin/login", {
+            "username": os.getenv("ADMIN_USERNAME", "admin"),
+            "password": os.getenv("ADMIN_PASSWORD", "admin123"),
+        })
+        if status != 200:
+            raise SystemExit(f"admin login failed: {status} {body[:200]!r}")
+        token = json.loads(body)["access_token"]
+        status, body = Client(base_url, token).request("GET", "/dashboard/regions?limit=500")
+        regions = json.loads(body) if status == 200 else []
+        if not regions:
+            raise SystemExit("no regions found; load data with synthetic.py first")
+
+        results = []
+        for name in args.scenarios.split(","):
+            result = run_scenario(base_url, token, name.strip(), regions, args.concurrency, args.duration)
+            print(f"{result['benchmark']}: {result['rps']} req/s, p99 {result['latency_ms_p99']} ms", file=sys.stderr)
+            results.append(result)
+        emit(results, args.output)
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""
+Synthetic data generator for benchmarks and load tests.
+
+Populates regions (with irregular GeoJSON polygons), users (assigned to a
+region through user_regions), flood_predictions and alert_history at a
+configurable scale, using multi-row Core inserts in fixed-size batches.
+Output is deterministic for a given --seed.
+
+    PYTHONPATH=. python backend/benchmarks/synthetic.py --users 1000000 --regions 10000
+"""
+import argparse
+import json
+import math
+import random
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Iterator, List
+
+from dotenv import load_dotenv
+
+# Load environment variables from backend/.env BEFORE importing database engine
+load_dotenv(Path(__file__).parent.parent / ".env")
+
+from sqlalchemy import func, insert, text  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+from backend.app.database import Base, SessionLocal, engine  # noqa: E402
+from backend.app.models import AlertHistory, FloodPrediction, Region, User, UserRegion  # noqa: E402
+
+BATCH_SIZE = 10000
+
+STATES = (
+    "Assam", "Bihar", "West Bengal", "Odisha", "Uttar Pradesh", "Kerala", "Maharashtra",
+    "Gujarat", "Andhra Pradesh", "Tamil Nadu", "Karnataka", "Uttarakhand", "Himachal Pradesh",
+)
+RISK_LEVELS = ("low", "medium", "high")
+LANGUAGES = ("en", "hi", "as", "bn", "ta")
+
+# Rough bounding box of India (lon/lat)
+_LON_RANGE = (68.5, 96.5)
+_LAT_RANGE = (8.5, 34.5)
+
+
+def polygon(rng: random.Random, lon: float, lat: float, radius: float) -> dict:
+    """Irregular star-shaped polygon around (lon, lat), closed, 16-96 vertices."""
+    n = rng.randint(16, 96)
+    angles = sorted(rng.uniform(0, 2 * math.pi) for _ in range(n))
+    # Low-frequency wobble so the outline looks like a boundary rather than noise
+    phase, lobes = rng.uniform(0, 2 * math.pi), rng.randint(2, 5)
+    ring = []
+    for a in angles:
+        r = radius * (0.75 + 0.2 * math.sin(lobes * a + phase) + rng.uniform(-0.05, 0.05))
+        ring.append([round(lon + r * math.cos(a), 5), round(lat + r * math.sin(a), 5)])
+    ring.append(ring[0])
+    return {"type": "Polygon", "coordinates": [ring]}
+
+
+def _risk(score: int) -> str:
+    return "high" if score > 60 else "medium" if score > 30 else "low"
+
+
+def _batches(rows: Iterator[dict], size: int) -> Iterator[List[dict]]:
+    batch: List[dict] = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _insert(db: Session, model, rows: Iterator[dict], batch_size: int = BATCH_SIZE) -> int:
+    total = 0
+    for batch in _batches(rows, batch_size):
+        db.execute(insert(model), batch)
+        db.commit()
+        total += len(batch)
+    return total
+
+
+def _next_id(db: Session, model) -> int:
+    return (db.query(func.max(model.id)).scalar() or 0) + 1
+
+
+def _sync_sequences(db: Session) -> None:
+    # Explicit ids leave Postgres serial sequences behind
+    if engine.dialect.name != "postgresql":
+        return
+    for table in ("regions", "users", "flood_predictions", "alert_history"):
+        db.execute(text(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT COALESCE(MAX(id), 1) FROM {table}))"))
+    db.commit()
+
+
+def generate(
+    db: Session,
+    users: int,
+    regions: int,
+    predictions_per_region: int,
+    alerts: int,
+    seed: int = 42,
+) -> dict:
+    rng = random.Random(seed)
+    now = datetime.utcnow().replace(microsecond=0)
+    counts = {}
+
+    first_region = _next_id(db, Region)
+    centers = []
+    region_rows = []
+    for i in range(regions):
+        lon, lat = rng.uniform(*_LON_RANGE), rng.uniform(*_LAT_RANGE)
+        centers.append((lon, lat))
+        region_rows.append({
+            "id": first_region + i,
+            "name": f"Synthetic {first_region + i:06d}",
+            "state": rng.choice(STATES),
+            "population": rng.randint(5_000, 3_000_000),
+            "geometry": json.dumps(polygon(rng, lon, lat, rng.uniform(0.05, 0.4)), separators=(",", ":")),
+        })
+    counts["regions"] = _insert(db, Region, iter(region_rows), 1000)
+    region_ids = [r["id"] for r in region_rows] or [r for (r,) in db.query(Region.id)]
+    del region_rows
+
+    first_user = _next_id(db, User)
+    assignment = [rng.randrange(len(region_ids)) for _ in range(users)] if region_ids else []
+
+    def user_rows():
+        for i in range(users):
+            row = {
+                "id": first_user + i,
+                "phone_number": f"7{first_user + i:09d}",
+                "name": None,
+                "language": rng.choice(LANGUAGES),
+                "role": "citizen",
+                "sms_alerts": rng.random() < 0.9,
+                "whatsapp_alerts": rng.random() < 0.4,
+                "is_active": rng.random() < 0.97,
+                "location_lat": None,
+                "location_lon": None,
+                "location_region_id": None,
+            }
+            if centers and i % 4:
+                # Three in four users share a location near their region's center
+                lon, lat = centers[assignment[i]]
+                row["location_lon"] = round(lon + rng.uniform(-0.1, 0.1), 5)
+                row["location_lat"] = round(lat + rng.uniform(-0.1, 0.1), 5)
+                row["location_region_id"] = region_ids[assignment[i]]
+            yield row
+
+    counts["users"] = _insert(db, User, user_rows())
+    if assignment:
+        counts["user_regions"] = _insert(db, UserRegion, (
+            {"user_id": first_user + i, "region_id": region_ids[assignment[i]]} for i in range(users)
+        ))
+
+    def prediction_rows():
+        next_id = _next_id(db, FloodPrediction)
+        for region_id in region_ids:
+            score = rng.randint(5, 60)
+            for h in range(predictions_per_region, 0, -1):
+                score = max(0, min(100, score + rng.randint(-8, 8)))
+                created = now - timedelta(hours=h)
+                yield {
+                    "id": next_id,
+                    "region_id": region_id,
+                    "prediction_date": created.date(),
+                    "risk_level": _risk(score),
+                    "risk_score": score,
+                    "weather_data": {"rainfall_24h": round(score * 1.5, 1), "temperature": round(rng.uniform(20, 35), 1)},
+                    "created_at": created,
+                }
+                next_id += 1
+
+    counts["flood_predictions"] = _insert(db, FloodPrediction, prediction_rows())
+
+    def alert_rows():
+        next_id = _next_id(db, AlertHistory)
+        for i in range(alerts):
+            level = rng.choice(RISK_LEVELS)
+            yield {
+                "id": next_id + i,
+                "region_id": rng.choice(region_ids),
+                "message": f"Synthetic {level} flood alert",
+                "risk_level": level,
+                "sent_to_count": rng.randint(0, max(1, users // max(1, len(region_ids)))),
+                "sent_at": now - timedelta(seconds=rng.randint(0, 90 * 86400)),
+                "created_by": "admin:synthetic",
+            }
+
+    if region_ids:
+        counts["alert_history"] = _insert(db, AlertHistory, alert_rows())
+    _sync_sequences(db)
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Populate the database with synthetic data.")
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--regions", type=int, default=100)
+    parser.add_argument("--predictions-per-region", type=int, default=24)
+    parser.add_argument("--alerts", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        start = time.perf_counter()
+        counts = generate(db, args.users, args.regions, args.predictions_per_region, args.alerts, args.seed)
+        elapsed = time.perf_counter() - start
+    finally:
+        db.close()
+    print(json.dumps({"inserted": counts, "seconds": round(elapsed, 2)}))
+
+
+if __name__ == "__main__":
+    main()
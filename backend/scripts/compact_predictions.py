@@ -0,0 +1,19 @@
+import os
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+# Load environment variables from backend/.env BEFORE importing database engine
+load_dotenv(Path(__file__).parent.parent / ".env")
+
+from backend.app.database import SessionLocal
+from backend.app.services.prediction_retention import run_retention
+
+
+if __name__ == "__main__":
+    db = SessionLocal()
+    try:
+        stats = run_retention(db)
+        print(f"Rolled up {stats['rolled_up']} predictions, pruned {stats['pruned']}.")
+    finally:
+        db.close()
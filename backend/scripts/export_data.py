@@ -0,0 +1,37 @@
+import argparse
+import sys
+from datetime import datetime
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+# Load environment variables from backend/.env BEFORE importing database engine
+load_dotenv(Path(__file__).parent.parent / ".env")
+
+from backend.app.services.export_service import DATASETS, EXPORT_FORMATS, export_rows, supports_region_filter
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stream an AegisFlood table export as NDJSON or CSV.")
+    parser.add_argument("dataset", choices=sorted(DATASETS))
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="ndjson")
+    parser.add_argument("--start", type=datetime.fromisoformat, help="inclusive ISO timestamp")
+    parser.add_argument("--end", type=datetime.fromisoformat, help="exclusive ISO timestamp")
+    parser.add_argument("--region-id", type=int)
+    parser.add_argument("--output", "-o", help="file path (default: stdout)")
+    args = parser.parse_args(argv)
+
+    if args.region_id is not None and not supports_region_filter(args.dataset):
+        parser.error(f"--region-id is not supported for {args.dataset}")
+
+    out = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        for chunk in export_rows(args.dataset, args.format, start=args.start, end=args.end, region_id=args.region_id):
+            out.write(chunk)
+    finally:
+        if args.output:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -6,7 +6,14 @@ from dotenv import load_dotenv
 from sqlalchemy.orm import Session
 
 from backend.app.database import SessionLocal
-from backend.app.models import Region
+from backend.app.models import Region, RiverLink
+from backend.app.services.region_index import region_index
+from backend.app.services.region_locator import region_locator
+from backend.app.services.geometry_cache import map_cache
+from backend.app.services.invalidation_bus import invalidation_bus
+from backend.app.services.json_fragments import region_fragments
+from backend.app.services.river_network import river_network
+from backend.app.services.state_rollup import state_rollups
 
 
 def load_regions(db: Session, path: Path):
@@ -24,6 +31,33 @@ def load_regions(db: Session, path: Path):
         db.add(region)
     db.commit()
 
+    # River links reference regions by name: {"downstream": [{"name": ..., "travel_hours": ...}]}
+    ids = {name: region_id for region_id, name in db.query(Region.id, Region.name)}
+    for item in data:
+        for link in item.get("downstream", []):
+            upstream, downstream = ids.get(item["name"]), ids.get(link["name"])
+            if upstream is None or downstream is None:
+                print(f"Skipping river link {item['name']} -> {link['name']}: unknown region")
+                continue
+            existing = db.get(RiverLink, (upstream, downstream))
+            if existing:
+                existing.travel_hours = link["travel_hours"]
+            else:
+                db.add(RiverLink(upstream_region_id=upstream, downstream_region_id=downstream, travel_hours=link["travel_hours"]))
+    db.commit()
+    # Keep in-process caches in sync when loading from a running app
+    region_index.load(db)
+    region_locator.load(db)
+    river_network.load(db)
+    state_rollups.load(db)
+    map_cache.invalidate()
+    region_fragments.clear()
+    # ...and in the API workers, which reload their region caches on this event
+    if invalidation_bus.mode == 'off':
+        print("INVALIDATION_BUS is off: restart running API workers to pick up the new regions")
+    else:
+        invalidation_bus.publish('regions')
+
 
 if __name__ == "__main__":
     load_dotenv(Path(__file__).parent.parent / ".env")
@@ -0,0 +1,20 @@
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+# Load environment variables from backend/.env BEFORE importing database engine
+load_dotenv(Path(__file__).parent.parent / ".env")
+
+from backend.app.database import SessionLocal
+from backend.app.services.snapshot_publisher import snapshot_publisher
+
+
+if __name__ == "__main__":
+    if not snapshot_publisher.enabled:
+        raise SystemExit("SNAPSHOT_DIR is not set.")
+    db = SessionLocal()
+    try:
+        manifest = snapshot_publisher.publish(db)
+        print(f"Published snapshot version {manifest['version']} to {snapshot_publisher.directory}.")
+    finally:
+        db.close()
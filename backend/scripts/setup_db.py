@@ -9,7 +9,7 @@ load_dotenv(Path(__file__).parent.parent / ".env")
 from sqlalchemy import text
 from sqlalchemy.exc import OperationalError
 from backend.app.database import engine, Base
-from backend.app.models import User, Region, FloodPrediction, AlertHistory # Explicitly import all models
+from backend.app.models import User, UserRegion, Region, RiverLink, FloodPrediction, PredictionRollup, MaintenanceState, Alert, AlertHistory, AlertDelivery # Explicitly import all models
 
 
 def ensure_postgis():
@@ -0,0 +1,70 @@
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+# Load environment variables from backend/.env BEFORE importing database engine
+load_dotenv(Path(__file__).parent.parent / ".env")
+
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import AddConstraint, CreateColumn
+from backend.app.database import engine, Base
+import backend.app.models  # noqa: F401  (registers every table on Base.metadata)
+
+
+def add_missing_columns(conn):
+    """
+    ALTER existing tables to add the columns the models gained since they were
+    created (create_all only creates missing tables). Safe to re-run.
+    """
+    inspector = inspect(conn)
+    existing_tables = set(inspector.get_table_names())
+    added = []
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            if not column.nullable and column.server_default is None:
+                raise RuntimeError(f"{table.name}.{column.name} is NOT NULL without a server default; add it by hand")
+            ddl = CreateColumn(column).compile(dialect=conn.dialect)
+            conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {ddl}"))
+            if column.unique:
+                conn.execute(text(
+                    f"CREATE UNIQUE INDEX IF NOT EXISTS uq_{table.name}_{column.name} ON {table.name} ({column.name})"
+                ))
+            # SQLite cannot add a foreign key to an existing table; the column still works without it
+            if conn.dialect.name == "postgresql":
+                for foreign_key in column.foreign_keys:
+                    conn.execute(AddConstraint(foreign_key.constraint))
+            added.append(f"{table.name}.{column.name}")
+    return added
+
+
+def create_missing_indexes(conn):
+    created = []
+    inspector = inspect(conn)
+    for table in Base.metadata.sorted_tables:
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(conn)
+                created.append(index.name)
+    return created
+
+
+def upgrade():
+    with engine.begin() as conn:
+        # New tables (and their indexes) first, so added columns can reference them
+        Base.metadata.create_all(bind=conn)
+        added = add_missing_columns(conn)
+        created = create_missing_indexes(conn)
+    return added, created
+
+
+if __name__ == "__main__":
+    added, created = upgrade()
+    print(f"Added columns: {', '.join(added) or 'none'}")
+    print(f"Created indexes: {', '.join(created) or 'none'}")
+    print("Database upgraded.")
@@ -0,0 +1,54 @@
+"""
+Shared fixtures: the app on a throwaway SQLite database with a small seed.
+
+Environment overrides must be in place before backend.app is imported, so
+they are applied at module import time.
+"""
+import os
+import tempfile
+
+_tmp = tempfile.mkdtemp(prefix="aegisflood-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp}/test.db"
+os.environ["INVALIDATION_BUS"] = "off"
+os.environ["PREDICTION_RETENTION_ENABLED"] = "false"
+os.environ["ALERT_FANOUT_PROCESSES"] = "0"
+os.environ["OTP_FIXED_CODE"] = "000000"
+os.environ["MOCK_SMS_ENABLED"] = "true"
+os.environ["MOCK_WHATSAPP_ENABLED"] = "true"
+os.environ.pop("SNAPSHOT_DIR", None)
+
+import pytest  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+from backend.app.database import Base, SessionLocal, engine  # noqa: E402
+from backend.app.main import app  # noqa: E402
+from backend.app.models import Region, User  # noqa: E402
+
+REGIONS = [("Guwahati", "Assam"), ("Patna", "Bihar"), ("Silchar", "Assam"), ("Dibrugarh", "Assam")]
+CITIZENS = 20
+
+
+def _seed() -> None:
+    Base.metadata.create_all(engine)
+    db = SessionLocal()
+    try:
+        for i, (name, state) in enumerate(REGIONS):
+            db.add(Region(name=name, state=state, population=1000 * (i + 1)))
+        for i in range(CITIZENS):
+            db.add(User(phone_number=f"9100000{i:04d}", role="citizen", sms_alerts=True, whatsapp_alerts=i % 2 == 0))
+        db.commit()
+    finally:
+        db.close()
+
+
+@pytest.fixture(scope="session")
+def client():
+    _seed()
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture(scope="session")
+def authority(client):
+    token = client.post("/auth/admin/login", json={"username": "admin", "password": "admin123"}).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
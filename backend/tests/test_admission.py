@@ -0,0 +1,90 @@
+"""Admission classes, priority queueing and 503 + Retry-After shedding."""
+import asyncio
+
+from backend.app.admission import DEFAULT_LIMITS, AdmissionController, AdmissionMiddleware, classify
+
+
+def _limits(**overrides):
+    return {**DEFAULT_LIMITS, **overrides}
+
+
+def test_classify():
+    assert classify("POST", "/alerts/") == "alerts"
+    assert classify("POST", "/alerts/multi-region") == "alerts"
+    assert classify("POST", "/alerts/7/confirm") == "public"
+    assert classify("GET", "/alerts/") == "dashboard"
+    assert classify("POST", "/auth/verify") == "auth"
+    assert classify("POST", "/auth/me/location") == "public"
+    assert classify("GET", "/exports/predictions") == "exports"
+    assert classify("GET", "/alerts/stream") is None
+    assert classify("GET", "/health") is None
+
+
+def test_freed_slot_goes_to_highest_priority_waiter():
+    async def scenario():
+        controller = AdmissionController(_limits(), max_concurrency=1)
+        assert await controller.acquire("public") is None
+        order = []
+
+        async def wait(name):
+            assert await controller.acquire(name) is None
+            order.append(name)
+            controller.release(name)
+
+        # The public request queued first, the alert write second
+        waiting = [asyncio.create_task(wait("public")), asyncio.create_task(wait("alerts"))]
+        await asyncio.sleep(0.01)
+        assert order == []
+        controller.release("public")
+        await asyncio.gather(*waiting)
+        return order
+
+    assert asyncio.run(scenario()) == ["alerts", "public"]
+
+
+def test_full_queue_and_timeout_are_shed():
+    async def scenario():
+        controller = AdmissionController(_limits(public=(1, 1, 0.05, 5)))
+        assert await controller.acquire("public") is None
+        queued = asyncio.create_task(controller.acquire("public"))
+        await asyncio.sleep(0.01)
+        full = await controller.acquire("public")
+        return full, await queued, controller.in_flight
+
+    # Shed requests never hold a slot
+    assert asyncio.run(scenario()) == ("queue_full", "timeout", 1)
+
+
+def test_middleware_sheds_with_503_and_retry_after():
+    async def scenario():
+        release = asyncio.Event()
+
+        async def app(scope, receive, send):
+            await release.wait()
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": b"{}"})
+
+        middleware = AdmissionMiddleware(app, limits=_limits(exports=(1, 0, 0.05, 30)))
+        scope = {"type": "http", "method": "GET", "path": "/exports/predictions", "headers": []}
+
+        async def request():
+            sent = []
+
+            async def send(message):
+                sent.append(message)
+
+            await middleware(scope, None, send)
+            return sent
+
+        first = asyncio.create_task(request())
+        await asyncio.sleep(0.01)
+        shed = await request()
+        release.set()
+        await first
+        return shed, (await first)[0]["status"], middleware.controller.in_flight
+
+    shed, first_status, in_flight = asyncio.run(scenario())
+    assert shed[0]["status"] == 503
+    assert dict(shed[0]["headers"])[b"retry-after"] == b"30"
+    assert first_status == 200
+    assert in_flight == 0
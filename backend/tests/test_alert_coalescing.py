@@ -0,0 +1,161 @@
+"""Per-region alert coalescing, supersede/replay and Idempotency-Key replay."""
+import time
+from datetime import datetime
+
+import pytest
+from sqlalchemy import func
+
+from backend.app.database import SessionLocal
+from backend.app.models import Alert, AlertHistory
+from backend.app.services.alert_coalescer import AlertCoalescer, alert_coalescer
+
+
+@pytest.fixture(autouse=True)
+def fresh_window(client):
+    """Each test starts with empty windows; its alerts are aged out of the window afterwards."""
+    db = SessionLocal()
+    try:
+        last_alert = db.query(func.max(Alert.id)).scalar() or 0
+    finally:
+        db.close()
+    alert_coalescer._windows.clear()
+    alert_coalescer._idempotency.clear()
+    yield
+    alert_coalescer._windows.clear()
+    alert_coalescer._idempotency.clear()
+    db = SessionLocal()
+    try:
+        db.query(Alert).filter(Alert.id > last_alert).update({Alert.created_at: datetime(2000, 1, 1)})
+        db.commit()
+    finally:
+        db.close()
+
+
+def _multi(client, authority, region_ids, risk_level="high", **headers):
+    return client.post(
+        "/alerts/multi-region",
+        json={"region_ids": region_ids, "message": "Basin", "risk_level": risk_level},
+        headers={**authority, **headers},
+    )
+
+
+def _single(client, authority, region, risk_level="high", **headers):
+    return client.post(
+        "/alerts/",
+        json={"region": region, "message": "Rising water", "risk_level": risk_level},
+        headers={**authority, **headers},
+    )
+
+
+def _history_regions(alert_message):
+    db = SessionLocal()
+    try:
+        return sorted(r for (r,) in db.query(AlertHistory.region_id).filter(AlertHistory.message == alert_message))
+    finally:
+        db.close()
+
+
+def test_reserve_many_covers_overlapping_regions():
+    coalescer = AlertCoalescer(window_seconds=60, overrides={})
+    replayed, covered, own = coalescer.reserve_many(["guwahati", "patna"], 2)
+    assert replayed is None and not covered and set(own) == {"guwahati", "patna"}
+
+    replayed, covered, own = coalescer.reserve_many(["patna", "silchar"], 2)
+    assert list(covered) == ["patna"] and list(own) == ["silchar"]
+    # A higher risk escalates the region instead of merging into it
+    replayed, covered, own = coalescer.reserve_many(["patna"], 3)
+    assert not covered and list(own) == ["patna"]
+
+
+def test_escalation_supersedes_only_once_published():
+    coalescer = AlertCoalescer(window_seconds=60, overrides={})
+    _, low = coalescer.reserve("guwahati", 1)
+    _, high = coalescer.reserve("guwahati", 2)
+    assert not low.superseded.is_set()
+
+    coalescer.abandon("guwahati", high)
+    assert not low.superseded.is_set()
+    assert coalescer.reserve("guwahati", 1) == (low, None)
+
+    _, high = coalescer.reserve("guwahati", 2)
+    coalescer.publish(high, {"id": 1})
+    assert low.superseded.is_set()
+
+
+def test_idempotency_key_replays_slot():
+    coalescer = AlertCoalescer(window_seconds=60, overrides={})
+    _, own = coalescer.reserve("guwahati", 1, "key-1")
+    # Same key, even for another region and a higher risk, returns the original slot
+    assert coalescer.reserve("patna", 3, "key-1") == (own, None)
+    replayed, covered, reserved = coalescer.reserve_many(["silchar"], 3, "key-1")
+    assert replayed is own and not reserved
+
+
+def test_merge_wait_is_bounded():
+    coalescer = AlertCoalescer(window_seconds=60, overrides={})
+    _, own = coalescer.reserve("guwahati", 1)
+    start = time.monotonic()
+    assert own.wait(timeout=0.05) is None
+    assert time.monotonic() - start < 1
+
+
+def test_multi_region_alert_skips_regions_already_alerted(client, authority):
+    first = _multi(client, authority, [1, 2])
+    assert first.status_code == 200, first.text
+
+    second = client.post(
+        "/alerts/multi-region",
+        json={"region_ids": [2, 3], "message": "Overlap", "risk_level": "high"},
+        headers=authority,
+    )
+    assert second.status_code == 200, second.text
+    assert second.json()["id"] != first.json()["id"]
+    assert second.headers["X-Alert-Coalesced-Regions"] == "2"
+    assert second.json()["region"] == "Silchar"
+    assert _history_regions("Overlap") == [3]
+
+
+def test_single_region_alert_merges_into_multi_region_alert(client, authority):
+    first = _multi(client, authority, [1, 2], risk_level="critical")
+    assert first.status_code == 200, first.text
+
+    merged = _single(client, authority, "Patna", risk_level="high")
+    assert merged.status_code == 200, merged.text
+    assert merged.headers["X-Alert-Coalesced"] == "true"
+    assert merged.json()["id"] == first.json()["id"]
+
+
+def test_committed_alert_coalesces_without_the_window(client, authority):
+    first = _single(client, authority, "Silchar")
+    assert first.status_code == 200, first.text
+    # Another worker (or a restart) has no in-memory window, only the committed row
+    alert_coalescer._windows.clear()
+
+    merged = _multi(client, authority, [3])
+    assert merged.status_code == 200, merged.text
+    assert merged.headers["X-Alert-Coalesced"] == "true"
+    assert merged.json()["id"] == first.json()["id"]
+
+
+def test_idempotency_key_replays_alert(client, authority):
+    first = _multi(client, authority, [1, 4], **{"Idempotency-Key": "basin-42"})
+    assert first.status_code == 200, first.text
+    alert_coalescer._windows.clear()
+    alert_coalescer._idempotency.clear()
+
+    replay = _multi(client, authority, [1, 4], risk_level="critical", **{"Idempotency-Key": "basin-42"})
+    assert replay.status_code == 200, replay.text
+    assert replay.headers["X-Alert-Coalesced"] == "true"
+    assert replay.json()["id"] == first.json()["id"]
+
+
+def test_request_merged_into_inflight_alert_gets_202(client, authority):
+    _, inflight = alert_coalescer.reserve("dibrugarh", 3)
+    start = time.monotonic()
+    response = _single(client, authority, "Dibrugarh", risk_level="high")
+    assert time.monotonic() - start < 2
+    assert response.status_code == 202
+    assert response.headers["Retry-After"] == "1"
+
+    alert_coalescer.abandon("dibrugarh", inflight)
+    assert _single(client, authority, "Dibrugarh", risk_level="high").status_code == 200
@@ -0,0 +1,115 @@
+"""Fan-out partition resume and retry after a worker fails mid-partition."""
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from backend.app.database import SessionLocal
+from backend.app.models import Alert, AlertDelivery
+from backend.app.services import alert_fanout
+from backend.app.services.alert_fanout import FanoutIncomplete, FanoutPool, id_partitions, resume_partition
+from backend.app.services.recipients import IdBitmap
+
+
+def _alert_id(client):
+    db = SessionLocal()
+    try:
+        alert = Alert(region="Guwahati", message="Fan-out", risk_level="low")
+        db.add(alert)
+        db.commit()
+        return alert.id
+    finally:
+        db.close()
+
+
+def _deliver(alert_id, statuses):
+    db = SessionLocal()
+    try:
+        db.add_all([
+            AlertDelivery(alert_id=alert_id, user_id=user_id, channel="sms", status=status)
+            for user_id, status in statuses.items()
+        ])
+        db.commit()
+    finally:
+        db.close()
+
+
+def _ids(raw):
+    ids = array('q')
+    ids.frombytes(raw)
+    return ids.tolist()
+
+
+@pytest.fixture
+def thread_pool():
+    # Threads stand in for sender processes; run() only needs an executor
+    pool = FanoutPool(processes=2, partition_size=5, min_recipients=1)
+    pool._executor = ThreadPoolExecutor(max_workers=2)
+    yield pool
+    pool._executor.shutdown(wait=True)
+
+
+def test_resume_range_partition_after_last_committed_user(client):
+    alert_id = _alert_id(client)
+    _deliver(alert_id, {1: "queued", 2: "sent", 3: "failed", 4: "queued"})
+    rest, reached = resume_partition(alert_id, (1, 11, None))
+    assert rest == (5, 11, None)
+    assert reached == [1, 2, 4]
+    assert resume_partition(alert_id, (1, 5, None)) == (None, [1, 2, 4])
+
+
+def test_resume_explicit_partition_keeps_remaining_ids(client):
+    alert_id = _alert_id(client)
+    partition = id_partitions(array('q', [2, 4, 6, 8]), size=10)[0]
+    assert resume_partition(alert_id, partition) == (partition, [])
+
+    _deliver(alert_id, {2: "queued", 4: "queued"})
+    rest, reached = resume_partition(alert_id, partition)
+    assert reached == [2, 4]
+    assert rest[:2] == (6, 9) and _ids(rest[2]) == [6, 8]
+
+
+def test_failed_partition_is_resumed_not_resent(client, thread_pool, monkeypatch):
+    alert_id = _alert_id(client)
+    recipients = array('q', range(1, 11))
+    real_send = alert_fanout.send_partition
+    attempts = []
+
+    def flaky_send(alert_id, message, partition, track_reached):
+        attempts.append(_ids(partition[2]))
+        if attempts.count(_ids(partition[2])) == 1 and partition[0] == 1:
+            # Commit the first two users' deliveries, then die mid-partition
+            real_send(alert_id, message, id_partitions(array('q', _ids(partition[2])[:2]))[0], track_reached)
+            raise RuntimeError("worker crashed")
+        return real_send(alert_id, message, partition, track_reached)
+
+    monkeypatch.setattr(alert_fanout, "send_partition", flaky_send)
+    reached = IdBitmap(recipients[-1])
+    sent = thread_pool.run(alert_id, "Fan-out", id_partitions(recipients, 5), reached=reached, retries=1)
+
+    assert sent == 10
+    assert reached.count_in(recipients) == 10
+    # The retry only covers what the failed worker had not committed
+    assert sorted(attempts) == [[1, 2, 3, 4, 5], [3, 4, 5], [6, 7, 8, 9, 10]]
+    assert attempts[-1] == [3, 4, 5]
+    db = SessionLocal()
+    try:
+        users = [u for (u,) in db.query(AlertDelivery.user_id).filter(
+            AlertDelivery.alert_id == alert_id, AlertDelivery.channel == "sms"
+        )]
+    finally:
+        db.close()
+    assert sorted(users) == list(recipients)
+
+
+def test_partition_still_failing_after_retries_is_reported(client, thread_pool, monkeypatch):
+    alert_id = _alert_id(client)
+
+    def broken_send(alert_id, message, partition, track_reached):
+        raise RuntimeError("provider down")
+
+    monkeypatch.setattr(alert_fanout, "send_partition", broken_send)
+    with pytest.raises(FanoutIncomplete) as error:
+        thread_pool.run(alert_id, "Fan-out", id_partitions(array('q', range(1, 11)), 5), retries=1)
+    assert error.value.sent == 0
+    assert error.value.failed_partitions == 2
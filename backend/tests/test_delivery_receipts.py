@@ -0,0 +1,90 @@
+"""Delivery rows are committed batch by batch and early receipts are retried."""
+from sqlalchemy import func
+
+from backend.app.database import SessionLocal
+from backend.app.models import Alert, AlertDelivery
+from backend.app.services.delivery_service import DeliveryReceiptBuffer, DeliveryRecorder
+
+
+def _alert_id(client):
+    db = SessionLocal()
+    try:
+        alert = Alert(region="Guwahati", message="Receipts", risk_level="low")
+        db.add(alert)
+        db.commit()
+        return alert.id
+    finally:
+        db.close()
+
+
+def _status(sid):
+    db = SessionLocal()
+    try:
+        return db.query(AlertDelivery.status).filter(AlertDelivery.provider_message_id == sid).scalar()
+    finally:
+        db.close()
+
+
+def test_recorder_commits_each_batch_on_a_user_boundary(client):
+    alert_id = _alert_id(client)
+    recorder = DeliveryRecorder(alert_id, batch_size=2)
+    recorder.record(1, "sms", "SMbatch1", True)
+    recorder.record(1, "whatsapp", "SMbatch2", True)
+    recorder.record(2, "sms", "SMbatch3", True)
+    recorder.record(2, "whatsapp", "SMbatch4", True)
+    db = SessionLocal()
+    try:
+        committed = db.query(func.count(AlertDelivery.id)).filter(AlertDelivery.alert_id == alert_id).scalar()
+    finally:
+        db.close()
+    # User 1's rows are visible to other sessions before the send finishes; user 2's are not split
+    assert committed == 2
+    recorder.flush()
+    assert recorder.written == 4
+
+
+def test_receipt_before_row_commit_is_retried(client):
+    alert_id = _alert_id(client)
+    buffer = DeliveryReceiptBuffer(retry_seconds=60)
+    buffer.add_nowait("SMearly", "delivered")
+    assert buffer.flush() == 0
+    assert buffer.pending_count() == 1
+
+    recorder = DeliveryRecorder(alert_id)
+    recorder.record(3, "sms", "SMearly", True)
+    recorder.flush()
+    assert _status("SMearly") == "queued"
+
+    assert buffer.flush() == 1
+    assert buffer.pending_count() == 0
+    assert _status("SMearly") == "delivered"
+
+
+def test_unmatched_receipts_expire(client):
+    buffer = DeliveryReceiptBuffer(retry_seconds=0)
+    buffer.add_nowait("SMnever", "sent")
+    buffer.flush()
+    assert buffer.pending_count() == 0
+
+
+def test_unmatched_receipts_are_capped(client):
+    buffer = DeliveryReceiptBuffer(retry_seconds=60, retry_max=1)
+    buffer.add_nowait("SMcap1", "sent")
+    buffer.add_nowait("SMcap2", "sent")
+    buffer.flush()
+    assert buffer.pending_count() == 1
+
+
+def test_matched_late_receipt_is_not_retried(client):
+    alert_id = _alert_id(client)
+    recorder = DeliveryRecorder(alert_id)
+    recorder.record(4, "sms", "SMlate", True)
+    recorder.flush()
+    buffer = DeliveryReceiptBuffer(retry_seconds=60)
+    buffer.add_nowait("SMlate", "delivered")
+    buffer.flush()
+    # A "sent" after "delivered" matches the row without changing it, so it is not kept
+    buffer.add_nowait("SMlate", "sent")
+    assert buffer.flush() == 0
+    assert buffer.pending_count() == 0
+    assert _status("SMlate") == "delivered"
@@ -0,0 +1,67 @@
+"""Invalidation bus message signing."""
+import json
+import os
+import time
+
+import pytest
+
+from backend.app.services import invalidation_bus as bus_module
+from backend.app.services.invalidation_bus import InvalidationBus, _encode, _sign
+
+
+@pytest.fixture
+def buses(tmp_path, monkeypatch):
+    monkeypatch.setattr(bus_module, "INVALIDATION_BUS_DIR", str(tmp_path / "bus"))
+    sender, receiver = InvalidationBus("local"), InvalidationBus("local")
+    received = []
+    receiver.subscribe("alert", lambda entity_id, payload: received.append(entity_id))
+    return sender, receiver, received
+
+
+def _message(sender, event=("alert", 7, None)):
+    return _sign(sender._signing_key(), _encode(sender.origin, [event])[0])
+
+
+def test_workers_share_the_local_key(buses):
+    sender, receiver, received = buses
+    assert sender._signing_key() == receiver._signing_key()
+    receiver._dispatch(_message(sender))
+    assert received == [7]
+
+
+def test_unsigned_and_forged_messages_are_dropped(buses):
+    sender, receiver, received = buses
+    receiver._signing_key()
+    body = _encode(sender.origin, [("alert", 7, None)])[0]
+    receiver._dispatch(body)
+    receiver._dispatch(_sign(b"guessed", body))
+    receiver._dispatch(_message(sender).replace('"e":[["alert",7', '"e":[["alert",8'))
+    assert received == []
+
+
+def test_stale_and_replayed_messages_are_dropped(buses):
+    sender, receiver, received = buses
+    receiver._signing_key()
+    message = _message(sender)
+    receiver._dispatch(message)
+    receiver._dispatch(message)
+    stale = json.loads(_encode(sender.origin, [("alert", 9, None)])[0])
+    stale["t"] = time.time() - bus_module.INVALIDATION_MAX_AGE_SECONDS - 1
+    receiver._dispatch(_sign(sender._signing_key(), json.dumps(stale)))
+    assert received == [7]
+
+
+@pytest.mark.skipif(not hasattr(os, "getuid"), reason="POSIX permissions")
+def test_shared_directory_disables_the_bus(tmp_path, monkeypatch):
+    directory = tmp_path / "bus"
+    directory.mkdir(mode=0o777)
+    directory.chmod(0o777)
+    monkeypatch.setattr(bus_module, "INVALIDATION_BUS_DIR", str(directory))
+    bus = InvalidationBus("local")
+    assert bus._signing_key() is None
+    assert bus.mode == "off"
+
+
+def test_postgres_mode_requires_a_secret(monkeypatch):
+    monkeypatch.setattr(bus_module, "INVALIDATION_SECRET", None)
+    assert InvalidationBus("postgres").mode == "off"
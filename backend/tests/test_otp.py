@@ -0,0 +1,112 @@
+"""OTP expiry, throttling, single use and the shared attempt budget."""
+import time
+
+import pytest
+
+from backend.app.database import SessionLocal, get_db
+from backend.app.main import app
+from backend.app.services import otp_service as otp_module
+from backend.app.services.otp_service import EXPIRED, INVALID, LOCKED, VERIFIED, OtpService
+
+CODE = otp_module.OTP_FIXED_CODE  # conftest pins it
+
+
+class RecordingSender:
+    def __init__(self):
+        self.messages = []
+
+    def enqueue(self, phone, message):
+        self.messages.append((phone, message))
+
+
+def _service(**kwargs):
+    kwargs.setdefault("replicate", False)
+    return OtpService(RecordingSender(), **kwargs)
+
+
+def test_code_is_single_use():
+    service = _service()
+    assert service.request_code("9100000001") == 0
+    assert service.sender.messages and CODE in service.sender.messages[0][1]
+    assert service.verify("9100000001", CODE) == VERIFIED
+    assert service.verify("9100000001", CODE) == EXPIRED
+
+
+def test_code_expires():
+    service = _service(ttl=0.05)
+    service.request_code("9100000002")
+    time.sleep(0.1)
+    assert service.verify("9100000002", CODE) == EXPIRED
+    assert service.pending_codes() == 0
+
+
+def test_phone_and_ip_throttles():
+    service = _service(phone_rate="2/600", ip_rate="4/600")
+    assert service.request_code("9100000003", "10.0.0.1") == 0
+    assert service.request_code("9100000003", "10.0.0.1") == 0
+    assert service.request_code("9100000003", "10.0.0.1") > 0
+    assert service.request_code("9100000004", "10.0.0.1") == 0
+    # Throttled requests still spend an IP token, so the fifth is refused although this phone has tokens
+    assert service.request_code("9100000005", "10.0.0.1") > 0
+    assert len(service.sender.messages) == 3
+
+
+def test_wrong_guesses_lock_the_code():
+    service = _service(max_attempts=3)
+    service.request_code("9100000006")
+    assert service.verify("9100000006", "111111") == INVALID
+    assert service.verify("9100000006", "111111") == INVALID
+    assert service.verify("9100000006", "111111") == LOCKED
+    assert service.verify("9100000006", CODE) == EXPIRED
+
+
+def test_attempt_budget_is_shared_across_workers(monkeypatch):
+    first, second = _service(max_attempts=3, replicate=True), _service(max_attempts=3, replicate=True)
+    peers = {id(first): second, id(second): first}
+    current = []
+
+    def publish(entity, entity_id=None, payload=None):
+        peers[id(current[-1])].apply_remote(entity_id, payload)
+
+    monkeypatch.setattr(otp_module.invalidation_bus, "publish", publish)
+
+    def on(service, call, *args):
+        current.append(service)
+        return call(*args)
+
+    on(first, first.request_code, "9100000007")
+    assert second.pending_codes() == 1
+    assert on(first, first.verify, "9100000007", "111111") == INVALID
+    assert on(second, second.verify, "9100000007", "222222") == INVALID
+    # Third wrong guess overall, on either worker, locks the code everywhere
+    assert on(first, first.verify, "9100000007", "333333") == LOCKED
+    assert first.pending_codes() == second.pending_codes() == 0
+
+
+def test_register_sends_no_code_when_the_user_write_fails(client, monkeypatch):
+    issued = []
+    monkeypatch.setattr(otp_module.otp_service, "issue_code", issued.append)
+
+    def failing_db():
+        db = SessionLocal()
+
+        def commit():
+            from sqlalchemy.exc import OperationalError
+            raise OperationalError("COMMIT", {}, Exception("disk full"))
+
+        db.commit = commit
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = failing_db
+    try:
+        response = client.post("/auth/register", json={"phone_number": "9188888888"})
+    finally:
+        app.dependency_overrides.pop(get_db)
+    assert response.status_code == 500
+    assert issued == []
+
+    assert client.post("/auth/register", json={"phone_number": "9188888888"}).status_code == 200
+    assert issued == ["9188888888"]
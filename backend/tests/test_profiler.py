@@ -0,0 +1,38 @@
+"""Per-request profiles of long streaming responses are capped."""
+import asyncio
+
+from backend.app import profiler
+
+
+async def _stream(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"text/event-stream")]})
+    for _ in range(6):
+        await asyncio.sleep(0.05)
+        await send({"type": "http.response.body", "body": b"data: tick\n\n", "more_body": True})
+    await send({"type": "http.response.body", "body": b""})
+
+
+def test_streaming_request_profile_is_capped(monkeypatch):
+    monkeypatch.setattr(profiler, "PROFILE_REQUEST_TOKEN", "secret")
+    monkeypatch.setattr(profiler, "PROFILE_MAX_SECONDS", 0.1)
+    middleware = profiler.ProfileRequestMiddleware(_stream)
+    sent = []
+    released_mid_stream = []
+
+    async def send(message):
+        sent.append(message)
+        if len(sent) == 5:
+            # Past the cap, with the stream still open
+            released_mid_stream.append(profiler._active.acquire(blocking=False))
+            profiler._active.release()
+
+    async def receive():
+        return {"type": "http.disconnect"}
+
+    scope = {"type": "http", "method": "GET", "path": "/alerts/stream", "headers": [(b"x-profile", b"secret")]}
+    asyncio.run(middleware(scope, receive, send))
+
+    assert released_mid_stream == [True]
+    profile_id = dict(sent[0]["headers"])[b"x-profile-id"].decode()
+    assert profiler.stored_profile(profile_id) is not None
+    assert len(profiler._stored) <= profiler._MAX_STORED_PROFILES
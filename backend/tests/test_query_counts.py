@@ -0,0 +1,110 @@
+"""
+Pinned SQL statement budgets per endpoint.
+
+A failure here means an endpoint now issues more statements than it did;
+the assertion message lists them. Raise a budget only when the extra
+statements are intended.
+"""
+from backend.app.query_stats import QueryStats, assert_max_queries
+
+
+def _create_alert(client, authority, region="Guwahati", risk_level="high"):
+    response = client.post(
+        "/alerts/", json={"region": region, "message": "Rising water", "risk_level": risk_level}, headers=authority
+    )
+    assert response.status_code == 200, response.text
+    return response.json()["id"]
+
+
+def test_single_prediction(client):
+    with assert_max_queries(2):
+        assert client.get("/predictions/1").status_code == 200
+
+
+def test_batch_prediction_is_one_insert(client):
+    with assert_max_queries(2) as stats:
+        response = client.post("/predictions/batch", json={"region_ids": [1, 2, 3, 4]})
+    assert response.status_code == 200
+    assert len(response.json()) == 4
+    assert stats.repeated(2) == {}
+
+
+def test_prediction_history(client):
+    # Rollups, then raw rows above the rollup watermark
+    with assert_max_queries(2):
+        assert client.get("/predictions/1/history").status_code == 200
+
+
+def test_create_alert_does_not_scale_with_recipients(client, authority):
+    with assert_max_queries(10):
+        _create_alert(client, authority, region="Patna")
+
+
+def test_create_multi_region_alert(client, authority):
+    with assert_max_queries(11):
+        response = client.post(
+            "/alerts/multi-region",
+            json={"region_ids": [1, 2], "message": "Basin", "risk_level": "critical"},
+            headers=authority,
+        )
+    assert response.status_code == 200, response.text
+
+
+def test_list_alerts(client, authority):
+    _create_alert(client, authority, region="Silchar")
+    # Alerts written outside the API are serialized on first read
+    client.get("/alerts/", headers=authority)
+    with assert_max_queries(1):
+        assert client.get("/alerts/", headers=authority).status_code == 200
+
+
+def test_delivery_endpoints(client, authority):
+    alert_id = _create_alert(client, authority, region="Dibrugarh")
+    with assert_max_queries(1):
+        assert client.get(f"/alerts/{alert_id}/deliveries/summary", headers=authority).status_code == 200
+    with assert_max_queries(1):
+        assert client.get(f"/alerts/{alert_id}/deliveries", headers=authority).status_code == 200
+
+
+def test_dashboard_regions(client, authority):
+    # Cold: key query plus one query each for region and prediction rows
+    with assert_max_queries(3):
+        assert client.get("/dashboard/regions", headers=authority).status_code == 200
+    with assert_max_queries(1):
+        assert client.get("/dashboard/regions", headers=authority).status_code == 200
+
+
+def test_dashboard_stats(client, authority):
+    with assert_max_queries(3):
+        assert client.get("/dashboard/stats", headers=authority).status_code == 200
+
+
+def test_in_memory_views(client, authority):
+    client.get("/dashboard/map", headers=authority)
+    with assert_max_queries(0):
+        assert client.get("/dashboard/states", headers=authority).status_code == 200
+        assert client.get("/dashboard/map", headers=authority).status_code == 200
+        assert client.get("/regions/search", params={"q": "gu"}).status_code == 200
+
+
+def test_register_and_verify(client):
+    with assert_max_queries(2):
+        assert client.post("/auth/register", json={"phone_number": "9199999999"}).status_code == 200
+    with assert_max_queries(1):
+        assert client.post("/auth/verify", json={"phone_number": "9199999999", "otp": "000000"}).status_code == 200
+
+
+def test_export(client, authority):
+    with assert_max_queries(1):
+        assert client.get("/exports/predictions", headers=authority).status_code == 200
+
+
+def test_n_plus_one_ignores_inserts():
+    stats = QueryStats()
+    for _ in range(10):
+        stats.record("INSERT INTO flood_predictions (region_id) VALUES (?)", 0.001)
+    stats.record("INSERT INTO alert_deliveries (alert_id, user_id) VALUES (?, ?)", 0.001, executemany=True)
+    for _ in range(10):
+        stats.record("SELECT * FROM users WHERE users.id = ?", 0.001)
+    assert stats.count == 21
+    assert list(stats.repeated(5)) == ["SELECT * FROM users WHERE users.id = ?"]
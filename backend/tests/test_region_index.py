@@ -0,0 +1,18 @@
+"""Region name index ranking."""
+from backend.app.services import region_index as region_index_module
+from backend.app.services.region_index import RegionEntry, RegionIndex, _IndexData
+
+
+def test_prefix_cap_keeps_most_populous(monkeypatch):
+    monkeypatch.setattr(region_index_module, "_MAX_PREFIX_CANDIDATES", 5)
+    index = RegionIndex()
+    # Alphabetically first regions are the smallest; a scan cap would keep only them
+    index._data = _IndexData([RegionEntry(i, f"Bar{i:03d}", "Assam", i) for i in range(50)])
+    assert [e.id for e in index.search("bar", limit=3)] == [49, 48, 47]
+
+
+def test_name_prefix_outranks_word_prefix(monkeypatch):
+    monkeypatch.setattr(region_index_module, "_MAX_PREFIX_CANDIDATES", 1)
+    index = RegionIndex()
+    index._data = _IndexData([RegionEntry(1, "North Barpeta", "Assam", 900000), RegionEntry(2, "Barpeta", "Assam", 10)])
+    assert [e.id for e in index.search("barp", limit=1)] == [2]
@@ -0,0 +1,53 @@
+"""Risk map cache concurrency and Accept-Encoding negotiation."""
+import threading
+import time
+
+from backend.app.services.geometry_cache import MapCache, RegionShape
+
+SQUARE = {"type": "Polygon", "coordinates": [[[90, 26], [91, 26], [91, 27], [90, 27], [90, 26]]]}
+
+
+class SlowMapCache(MapCache):
+    def __init__(self):
+        super().__init__()
+        self.reads = 0
+
+    def _read(self, db):
+        self.reads += 1
+        time.sleep(0.2)
+        return {1: RegionShape(1, "Guwahati", "Assam", SQUARE)}, {1: ("high", 70)}
+
+
+def test_concurrent_misses_build_once():
+    cache = SlowMapCache()
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.render(None, 5))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert cache.reads == 1
+    assert len(set(results)) == 1
+
+
+def test_build_does_not_block_risk_updates():
+    cache = SlowMapCache()
+    builder = threading.Thread(target=cache.render, args=(None, 5))
+    builder.start()
+    time.sleep(0.05)
+    started = time.monotonic()
+    cache.update_risk(1, "critical", 95)
+    assert time.monotonic() - started < 0.1
+    builder.join()
+    # The build raced the update, so it was not cached; the next render sees the new risk
+    body, _ = cache.render(None, 5)
+    assert b'"critical"' in body
+
+
+def test_gzip_only_when_accepted(client, authority):
+    cases = {"gzip": "gzip", "br, gzip;q=0.5": "gzip", "gzip;q=0": None, "*": "gzip", "*;q=0": None, "identity": None}
+    for accept, expected in cases.items():
+        response = client.get("/dashboard/map", headers={**authority, "Accept-Encoding": accept})
+        assert response.status_code == 200
+        assert response.headers.get("content-encoding") == expected, accept
+        assert response.json()["type"] == "FeatureCollection"
@@ -0,0 +1,64 @@
+"""Incremental river-network propagation and its ordering with the prediction commit."""
+import math
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from backend.app.database import SessionLocal
+from backend.app.prediction import predict_regions
+from backend.app.services.river_network import RiverNetwork, river_network
+
+# 1 -> 2 -> 3 and 4 -> 3, travel times in hours
+LINKS = [(1, 2, 0.0), (2, 3, 24.0), (4, 3, 0.0)]
+
+
+def _network():
+    network = RiverNetwork(decay_hours=48)
+    network.build(LINKS, {1: 10.0, 2: 20.0, 3: 5.0, 4: 0.0})
+    return network
+
+
+def test_build_propagates_attenuated_upstream_risk():
+    network = _network()
+    assert network.effective(2, 0) == 20.0
+    assert network.effective(3, 0) == pytest.approx(20.0 * math.exp(-24 / 48))
+    # Not on the network: the caller's own score
+    assert network.effective(99, 7.0) == 7.0
+
+
+def test_update_walks_only_changed_downstream_closure():
+    network = _network()
+    # Region 1 stays below region 2's own score, so nothing downstream of it moves
+    assert network.update({1: 15.0}) == {1: 15.0}
+
+    changed = network.update({1: 80.0})
+    assert changed == {1: 80.0, 2: 80.0, 3: pytest.approx(80.0 * math.exp(-24 / 48))}
+    # A side branch joins without raising the maximum
+    assert network.update({4: 1.0}) == {4: 1.0}
+
+
+def test_preview_does_not_apply():
+    network = _network()
+    preview = network.preview({1: 80.0})
+    assert preview[3] == pytest.approx(80.0 * math.exp(-24 / 48))
+    assert network.effective(1, 0) == 10.0
+    assert network.effective(3, 0) == pytest.approx(20.0 * math.exp(-24 / 48))
+    assert network.update({1: 80.0}) == preview
+
+
+def test_failed_prediction_write_leaves_network_untouched(client, monkeypatch):
+    river_network.build([(1, 2, 0.0)], {1: 1000.0, 2: 0.0})
+    db = SessionLocal()
+    try:
+        def fail():
+            raise OperationalError("COMMIT", {}, Exception("disk full"))
+
+        monkeypatch.setattr(db, "commit", fail)
+        with pytest.raises(OperationalError):
+            predict_regions(db, [1])
+        assert river_network.effective(1, 0) == 1000.0
+        assert river_network.effective(2, 0) == 1000.0
+    finally:
+        db.rollback()
+        db.close()
+        river_network.build([], {})
@@ -3,7 +3,7 @@ import { useNavigate, Link } from 'react-router-dom'
 import Card from '../components/shared/Card'
 import Button from '../components/shared/Button'
 import { useAuth } from '../context/AuthContext'
-import api from '../services/api'
+import api, { subscribeToAlerts } from '../services/api'
 
 type RiskLocation = {
   name: string
@@ -48,7 +48,7 @@ function formatTimeAgo(iso: string): string {
 
 export default function Dashboard() {
   const navigate = useNavigate()
-  const { role, logout } = useAuth()
+  const { token, role, logout } = useAuth()
   const [isDarkMode, setIsDarkMode] = useState(true)
   const [selectedLanguage, setSelectedLanguage] = useState('English')
   const [showLanguageDropdown, setShowLanguageDropdown] = useState(false)
@@ -118,6 +118,22 @@ export default function Dashboard() {
     }
   }, [])
 
+  // New alerts arrive over the push stream instead of re-polling GET /alerts
+  useEffect(() => {
+    if (!token) return
+    return subscribeToAlerts(token, (a) => {
+      const next: AlertData = {
+        id: a.id,
+        type: 'flood',
+        message: a.message,
+        location: a.region,
+        timestamp: formatTimeAgo(a.created_at),
+        severity: a.risk_level,
+      }
+      setAlerts((prev) => [next, ...prev.filter((p) => p.id !== a.id && p.id > 0)].slice(0, 10))
+    })
+  }, [token])
+
   const languages = [
     'English', 'Hindi', 'Bengali', 'Tamil', 'Telugu',
     'Marathi', 'Gujarati', 'Kannada', 'Malayalam', 'Punjabi'
@@ -81,6 +81,35 @@ if (DEMO_MODE) {
   }
 }
 
+export type StreamedAlert = {
+  id: number
+  region: string
+  message: string
+  risk_level: string
+  created_by?: string | null
+  created_at: string
+}
+
+// Push channel for new alerts (SSE). EventSource cannot send headers, so the token goes in the query string.
+export function subscribeToAlerts(
+  token: string,
+  onAlert: (alert: StreamedAlert) => void,
+  regionIds?: number[],
+): () => void {
+  if (DEMO_MODE || typeof EventSource === 'undefined') return () => {}
+  const params = new URLSearchParams({ token })
+  if (regionIds?.length) params.set('region_ids', regionIds.join(','))
+  const source = new EventSource(`${api.defaults.baseURL}/alerts/stream?${params.toString()}`)
+  source.addEventListener('alert', (event) => {
+    try {
+      onAlert(JSON.parse((event as MessageEvent).data))
+    } catch (err) {
+      console.error('Bad alert event:', err)
+    }
+  })
+  return () => source.close()
+}
+
 export function setAuthToken(token?: string | null) {
   if (token) {
     api.defaults.headers.common['Authorization'] = `Bearer ${token}`